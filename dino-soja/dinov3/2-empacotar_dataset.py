@@ -0,0 +1,33 @@
+import argparse
+
+from dinov3.data.datasets import Soja
+
+
+def empacotar_dataset_soja(root, extra, splits, shard_size_mb):
+    """
+    Empacota os splits do dataset de soja em shards grandes com índice mmap.
+
+    - root é o diretório organizado por 1-organizar_dataset.py (train/soja, val/soja).
+    - extra é o diretório dos arquivos auxiliares (entries-*.npy), onde também
+      ficam os shards (shards-TRAIN/shard-00000.bin, ...) e o índice (packed-TRAIN.npy).
+
+    Depois disso o Soja lê os bytes direto dos shards, sem abrir um arquivo por amostra.
+    """
+    for split in splits:
+        dataset = Soja(split=Soja.Split[split], root=root, extra=extra)
+        if dataset.is_packed:
+            print(f"Split {split} já empacotado. Pulando...")
+            continue
+        print(f"Empacotando {len(dataset)} patches do split {split}...")
+        dataset.pack_shards(shard_size=shard_size_mb << 20)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Empacotar dataset de soja em shards")
+    parser.add_argument("--root", type=str, default="/media/lades/DISCO_01/soja_patches/dataset_soja_dinov3", help="Diretório do dataset organizado")
+    parser.add_argument("--extra", type=str, default=None, help="Diretório dos arquivos extras (padrão: <root>/extra)")
+    parser.add_argument("--splits", nargs="+", default=["TRAIN", "VAL"], help="Splits a empacotar")
+    parser.add_argument("--shard_size_mb", type=int, default=1024, help="Tamanho máximo de cada shard (MB)")
+    args = parser.parse_args()
+
+    empacotar_dataset_soja(args.root, args.extra or f"{args.root}/extra", args.splits, args.shard_size_mb)
@@ -0,0 +1,166 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This software may be used and distributed in accordance with
+# the terms of the DINOv3 License Agreement.
+
+"""
+Segmentation (M2F) or depth (DPT) head on a backbone in mixed precision (bf16 by default, on the CPU if
+supported) compared to float32: difference of the outputs, and throughput. Fails if the mean relative error
+is above `--max-rel-error`, or for segmentation if the class of too many pixels changes:
+
+    python -m dinov3.benchmarks.dense_autocast segmentation dinov3_vitl16=/path/to/dinov3_vitl16.pth \
+        --head-weights /path/to/m2f_head.pth --images field/*.png
+"""
+
+import argparse
+import sys
+from typing import Any, Dict, List, Optional
+
+import torch
+
+from dinov3.benchmarks.utils import check, images_per_second, load_backbone, load_images, parse_entry_point
+from dinov3.utils import is_autocast_dtype_supported
+
+_AUTOCAST_DTYPES = {"bf16": torch.bfloat16, "fp16": torch.float16}
+
+
+def _build_dense_model(
+    task: str, entry_point: str, weights: Optional[str], pretrained: bool, head_weights: Optional[str]
+):
+    backbone = load_backbone(entry_point, weights, pretrained)
+    if task == "segmentation":
+        from dinov3.eval.segmentation.models import build_segmentation_decoder
+
+        model = build_segmentation_decoder(backbone, entry_point, "m2f", autocast_dtype=None)
+        if head_weights is not None:
+            state_dict = torch.load(head_weights, map_location="cpu")
+            missing_keys, unexpected_keys = model.load_state_dict(state_dict, strict=False)
+            assert len([k for k in missing_keys if "backbone" not in k]) == 0 and len(unexpected_keys) == 0
+    else:
+        from dinov3.eval.dense.depth.models import build_depther
+
+        model = build_depther(
+            backbone,
+            backbone_out_layers=[m * backbone.n_blocks // 4 - 1 for m in range(1, 5)],
+            n_output_channels=256,
+            use_backbone_norm=True,
+            use_batchnorm=True,
+            head_type="dpt",
+            channels=512,
+            post_process_channels=[backbone.embed_dim] * 4,
+        )
+        if head_weights is not None:
+            model[0].decoder.load_state_dict(torch.load(head_weights, map_location="cpu"), strict=True)
+    return model.eval()
+
+
+def _dense_prediction(task: str, model, images, autocast_dtype):
+    """Class probabilities of each pixel for segmentation, depth map for depth"""
+    if task == "segmentation":
+        model.autocast_dtype = autocast_dtype
+        output = model.predict(images, rescale_to=images.shape[-2:])
+        class_probabilities = output["pred_logits"].float().softmax(dim=-1)[..., :-1]  # Without the "no object" class
+        return torch.einsum("bqc,bqhw->bchw", class_probabilities, output["pred_masks"].float().sigmoid())
+    model[0].autocast_dtype = autocast_dtype
+    with torch.inference_mode():
+        return model(images)
+
+
+def benchmark_dense_autocast(
+    task: str,
+    entry_point: str,
+    image_paths: List[str],
+    weights: Optional[str] = None,
+    pretrained: bool = True,
+    head_weights: Optional[str] = None,
+    dtype: str = "bf16",
+    device: str = "cpu",
+    image_size: int = 512,
+    num_iters: int = 3,
+) -> Dict[str, Any]:
+    """Outputs parity and throughput of a dense head on a backbone in mixed precision, compared to float32"""
+    autocast_dtype = _AUTOCAST_DTYPES[dtype]
+    torch.manual_seed(0)
+    model = _build_dense_model(task, entry_point, weights, pretrained, head_weights).to(device)
+    if image_paths:
+        images = load_images(image_paths, image_size)
+    else:
+        images = torch.randn(1, 3, image_size, image_size, generator=torch.Generator().manual_seed(0))
+    images = images.to(device)
+
+    reference = _dense_prediction(task, model, images, None)
+    prediction = _dense_prediction(task, model, images, autocast_dtype)
+    metrics = {
+        "supported": is_autocast_dtype_supported(images.device.type, autocast_dtype),
+        "max_abs_error": (prediction - reference).abs().max().item(),
+        "mean_rel_error": ((prediction - reference).abs().mean() / reference.abs().mean()).item(),
+        "fp32_images_s": images_per_second(lambda x: _dense_prediction(task, model, x, None), images, num_iters),
+        "autocast_images_s": images_per_second(
+            lambda x: _dense_prediction(task, model, x, autocast_dtype), images, num_iters
+        ),
+    }
+    if task == "segmentation":
+        metrics["pixel_agreement"] = (prediction.argmax(dim=1) == reference.argmax(dim=1)).float().mean().item()
+    return metrics
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("task", choices=["segmentation", "depth"])
+    parser.add_argument("entry_point", help="ViT backbone entry point, as NAME or NAME=WEIGHTS")
+    parser.add_argument("--head-weights", help="weights of the head, randomly initialized by default")
+    parser.add_argument("--images", nargs="*", default=[], help="image files, a random image by default")
+    parser.add_argument("--dtype", choices=sorted(_AUTOCAST_DTYPES), default="bf16")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--no-pretrained", action="store_true", help="use a randomly initialized backbone")
+    parser.add_argument("--image-size", type=int, default=512)
+    parser.add_argument("--num-iters", type=int, default=3)
+    parser.add_argument("--max-rel-error", type=float, default=0.02, help="maximum mean relative error")
+    parser.add_argument(
+        "--min-pixel-agreement", type=float, default=0.99, help="minimum fraction of pixels with the same class"
+    )
+    args = parser.parse_args(argv)
+
+    name, weights = parse_entry_point(args.entry_point)
+    metrics = benchmark_dense_autocast(
+        args.task,
+        name,
+        args.images,
+        weights=weights,
+        pretrained=not args.no_pretrained,
+        head_weights=args.head_weights,
+        dtype=args.dtype,
+        device=args.device,
+        image_size=args.image_size,
+        num_iters=args.num_iters,
+    )
+    num_images = len(args.images) or 1
+    print(
+        f"{args.task} on {name}, {args.device}, {torch.get_num_threads()} threads, "
+        f"{num_images} images of {args.image_size} pixels"
+    )
+    if not metrics["supported"]:
+        print(f"{args.dtype} autocast is not supported on {args.device}, the model runs in float32")
+    print(f"max abs error {metrics['max_abs_error']:.2e}, mean relative error {metrics['mean_rel_error']:.2e}")
+    if "pixel_agreement" in metrics:
+        print(f"pixels with the same class: {100 * metrics['pixel_agreement']:.2f}%")
+    speedup = metrics["autocast_images_s"] / metrics["fp32_images_s"]
+    print(
+        f"fp32: {metrics['fp32_images_s']:.2f} img/s, {args.dtype}: {metrics['autocast_images_s']:.2f} img/s, "
+        f"speedup {speedup:.2f}x"
+    )
+    check(
+        metrics["mean_rel_error"] <= args.max_rel_error,
+        f"mean relative error {metrics['mean_rel_error']:.2e} above {args.max_rel_error}",
+    )
+    if "pixel_agreement" in metrics:
+        check(
+            metrics["pixel_agreement"] >= args.min_pixel_agreement,
+            f"{100 * metrics['pixel_agreement']:.2f}% of the pixels keep their class, "
+            f"below {100 * args.min_pixel_agreement:.2f}%",
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
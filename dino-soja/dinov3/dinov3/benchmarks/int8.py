@@ -0,0 +1,95 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This software may be used and distributed in accordance with
+# the terms of the DINOv3 License Agreement.
+
+"""
+Dynamic INT8 CPU inference of ViT backbones compared to float32: cosine similarity of the patch features,
+and throughput. Fails if the mean similarity of a backbone is below `--min-cosine`:
+
+    python -m dinov3.benchmarks.int8 dinov3_vits16=/path/to/dinov3_vits16.pth --batch-size 8
+"""
+
+import argparse
+import sys
+from typing import Dict, Optional
+
+import torch
+
+from dinov3.benchmarks.utils import check, images_per_second, load_backbone, parse_entry_point, print_table
+
+
+def benchmark_int8(
+    entry_point: str,
+    weights: Optional[str] = None,
+    pretrained: bool = True,
+    batch_size: int = 8,
+    image_size: int = 224,
+    num_iters: int = 10,
+) -> Dict[str, float]:
+    """Patch features parity and throughput of the INT8 CPU inference of a backbone, compared to float32"""
+    torch.manual_seed(0)
+    model_fp32 = load_backbone(entry_point, weights, pretrained).eval()
+    torch.manual_seed(0)
+    model_int8 = load_backbone(entry_point, weights, pretrained, int8=True).eval()
+
+    images = torch.randn(batch_size, 3, image_size, image_size, generator=torch.Generator().manual_seed(0))
+    with torch.inference_mode():
+        patch_features_fp32 = model_fp32.forward_features(images)["x_norm_patchtokens"]
+        patch_features_int8 = model_int8.forward_features(images)["x_norm_patchtokens"]
+        cosine = torch.nn.functional.cosine_similarity(patch_features_fp32, patch_features_int8, dim=-1)
+        fp32_images_s = images_per_second(model_fp32, images, num_iters)
+        int8_images_s = images_per_second(model_int8, images, num_iters)
+    return {
+        "cosine_mean": cosine.mean().item(),
+        "cosine_min": cosine.min().item(),
+        "fp32_images_s": fp32_images_s,
+        "int8_images_s": int8_images_s,
+        "speedup": int8_images_s / fp32_images_s,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("entry_points", nargs="+", help="ViT backbone entry points, as NAME or NAME=WEIGHTS")
+    parser.add_argument("--no-pretrained", action="store_true", help="use randomly initialized models")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--image-size", type=int, default=224)
+    parser.add_argument("--num-iters", type=int, default=10)
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="minimum mean cosine similarity")
+    args = parser.parse_args(argv)
+
+    rows = []
+    for entry_point in args.entry_points:
+        name, weights = parse_entry_point(entry_point)
+        metrics = benchmark_int8(
+            name,
+            weights,
+            pretrained=not args.no_pretrained,
+            batch_size=args.batch_size,
+            image_size=args.image_size,
+            num_iters=args.num_iters,
+        )
+        rows.append({"entry_point": name, **metrics})
+    print(f"{torch.get_num_threads()} threads, batches of {args.batch_size} images of {args.image_size} pixels")
+    print_table(
+        rows,
+        [
+            ("entry_point", "entry point", ""),
+            ("cosine_mean", "cos mean", ".4f"),
+            ("cosine_min", "cos min", ".4f"),
+            ("fp32_images_s", "fp32 (img/s)", ".1f"),
+            ("int8_images_s", "int8 (img/s)", ".1f"),
+            ("speedup", "speedup", ".2f"),
+        ],
+    )
+    for row in rows:
+        check(
+            row["cosine_mean"] >= args.min_cosine,
+            f"{row['entry_point']}: mean cosine similarity {row['cosine_mean']:.4f} below {args.min_cosine}",
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
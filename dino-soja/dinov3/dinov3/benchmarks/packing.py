@@ -0,0 +1,88 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This software may be used and distributed in accordance with
+# the terms of the DINOv3 License Agreement.
+
+"""
+Inference of images of random sizes one at a time compared to their packed inference: throughput, and max
+difference of the patch features. Fails if the max difference is above `--max-error`:
+
+    python -m dinov3.benchmarks.packing dinov3_vits16=/path/to/dinov3_vits16.pth --num-images 256
+"""
+
+import argparse
+import sys
+import time
+from typing import Dict, Optional
+
+import torch
+
+from dinov3.benchmarks.utils import check, load_backbone, parse_entry_point
+
+
+def benchmark_packing(
+    entry_point: str,
+    weights: Optional[str] = None,
+    pretrained: bool = True,
+    num_images: int = 64,
+    min_size: int = 64,
+    max_size: int = 320,
+    max_tokens: int = 16384,
+) -> Dict[str, float]:
+    """Throughput of the inference of images of random sizes one at a time and packed, and max difference"""
+    model = load_backbone(entry_point, weights, pretrained).eval()
+    generator = torch.Generator().manual_seed(0)
+    patch_size = model.patch_size
+    sizes = torch.randint(min_size // patch_size, max_size // patch_size + 1, (num_images, 2), generator=generator)
+    images = [torch.randn(3, h * patch_size, w * patch_size, generator=generator) for h, w in sizes.tolist()]
+
+    with torch.inference_mode():
+        start = time.perf_counter()
+        outputs = [model.forward_features(image[None]) for image in images]
+        loop_s = time.perf_counter() - start
+        start = time.perf_counter()
+        packed_outputs = model.forward_features_packed(images, max_tokens=max_tokens)
+        packed_s = time.perf_counter() - start
+        max_error = max(
+            (output["x_norm_patchtokens"][0] - packed_output["x_norm_patchtokens"]).abs().max().item()
+            for output, packed_output in zip(outputs, packed_outputs)
+        )
+    return {"loop_images_s": num_images / loop_s, "packed_images_s": num_images / packed_s, "max_error": max_error}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("entry_point", help="ViT backbone entry point, as NAME or NAME=WEIGHTS")
+    parser.add_argument("--no-pretrained", action="store_true", help="use a randomly initialized model")
+    parser.add_argument("--num-images", type=int, default=64)
+    parser.add_argument("--min-size", type=int, default=64)
+    parser.add_argument("--max-size", type=int, default=320)
+    parser.add_argument("--max-tokens", type=int, default=16384, help="maximum number of tokens per pack")
+    parser.add_argument("--max-error", type=float, default=1e-4, help="maximum difference of the patch features")
+    args = parser.parse_args(argv)
+
+    name, weights = parse_entry_point(args.entry_point)
+    metrics = benchmark_packing(
+        name,
+        weights,
+        pretrained=not args.no_pretrained,
+        num_images=args.num_images,
+        min_size=args.min_size,
+        max_size=args.max_size,
+        max_tokens=args.max_tokens,
+    )
+    print(
+        f"{name}, {torch.get_num_threads()} threads, {args.num_images} images of {args.min_size} to "
+        f"{args.max_size} pixels, packs of at most {args.max_tokens} tokens"
+    )
+    print(f"one at a time: {metrics['loop_images_s']:.1f} img/s, packed: {metrics['packed_images_s']:.1f} img/s")
+    print(f"speedup {metrics['packed_images_s'] / metrics['loop_images_s']:.2f}x, max error {metrics['max_error']:.2e}")
+    check(
+        metrics["max_error"] <= args.max_error,
+        f"packed patch features differ by {metrics['max_error']:.2e}, above {args.max_error:.0e}",
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
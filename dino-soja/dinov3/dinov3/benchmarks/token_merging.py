@@ -0,0 +1,112 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This software may be used and distributed in accordance with
+# the terms of the DINOv3 License Agreement.
+
+"""
+Token merging inference of a ViT backbone compared to the full one, on a batch of images: cosine similarity
+of the patch and class features, and throughput, for each merge ratio. Fails if a merge ratio of 0 does not
+give the features of the full inference, or if the mean patch similarity is below `--min-cosine`:
+
+    python -m dinov3.benchmarks.token_merging dinov3_vits16=/path/to/dinov3_vits16.pth --images field/*.png
+"""
+
+import argparse
+import sys
+from typing import Dict, List, Optional
+
+import torch
+
+from dinov3.benchmarks.utils import check, images_per_second, load_backbone, load_images, parse_entry_point, print_table
+
+# Cosine similarity of features computed the same way, up to floating point rounding
+_EXACT_COSINE = 0.9999
+
+
+def benchmark_token_merging(
+    entry_point: str,
+    image_paths: List[str],
+    merge_ratios: List[float],
+    weights: Optional[str] = None,
+    pretrained: bool = True,
+    image_size: int = 512,
+    num_iters: int = 5,
+) -> Dict[float, Dict[str, float]]:
+    """Features fidelity and throughput of the token merging inference of a backbone, for each merge ratio"""
+    model = load_backbone(entry_point, weights, pretrained).eval()
+    images = load_images(image_paths, image_size)
+
+    results = {}
+    with torch.inference_mode():
+        reference = model.forward_features(images)
+        for merge_ratio in [0.0] + merge_ratios:
+            output = model.forward_features(images, merge_ratio=merge_ratio)
+            patch_cosine = torch.nn.functional.cosine_similarity(
+                output["x_norm_patchtokens"], reference["x_norm_patchtokens"], dim=-1
+            )
+            cls_cosine = torch.nn.functional.cosine_similarity(
+                output["x_norm_clstoken"], reference["x_norm_clstoken"], dim=-1
+            )
+            results[merge_ratio] = {
+                "merge_ratio": merge_ratio,
+                "patch_cosine_mean": patch_cosine.mean().item(),
+                "patch_cosine_min": patch_cosine.min().item(),
+                "cls_cosine_mean": cls_cosine.mean().item(),
+                "images_s": images_per_second(
+                    lambda x: model.forward_features(x, merge_ratio=merge_ratio), images, num_iters
+                ),
+            }
+    for metrics in results.values():
+        metrics["speedup"] = metrics["images_s"] / results[0.0]["images_s"]
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("entry_point", help="ViT backbone entry point, as NAME or NAME=WEIGHTS")
+    parser.add_argument("--images", nargs="+", required=True, help="image files, e.g. field imagery")
+    parser.add_argument("--ratios", nargs="+", type=float, default=[0.25, 0.5, 0.75], help="merge ratios")
+    parser.add_argument("--no-pretrained", action="store_true", help="use a randomly initialized model")
+    parser.add_argument("--image-size", type=int, default=512)
+    parser.add_argument("--num-iters", type=int, default=5)
+    parser.add_argument("--min-cosine", type=float, help="minimum mean patch cosine similarity of the merge ratios")
+    args = parser.parse_args(argv)
+
+    name, weights = parse_entry_point(args.entry_point)
+    results = benchmark_token_merging(
+        name,
+        args.images,
+        args.ratios,
+        weights=weights,
+        pretrained=not args.no_pretrained,
+        image_size=args.image_size,
+        num_iters=args.num_iters,
+    )
+    print(f"{name}, {torch.get_num_threads()} threads, {len(args.images)} images of {args.image_size} pixels")
+    print_table(
+        list(results.values()),
+        [
+            ("merge_ratio", "ratio", ".2f"),
+            ("patch_cosine_mean", "patch cos mean", ".4f"),
+            ("patch_cosine_min", "patch cos min", ".4f"),
+            ("cls_cosine_mean", "cls cos mean", ".4f"),
+            ("images_s", "img/s", ".2f"),
+            ("speedup", "speedup", ".2f"),
+        ],
+    )
+    check(
+        results[0.0]["patch_cosine_min"] >= _EXACT_COSINE and results[0.0]["cls_cosine_mean"] >= _EXACT_COSINE,
+        "a merge ratio of 0 does not give the features of the full inference",
+    )
+    if args.min_cosine is not None:
+        for merge_ratio, metrics in results.items():
+            check(
+                metrics["patch_cosine_mean"] >= args.min_cosine,
+                f"merge ratio {merge_ratio}: mean patch cosine similarity {metrics['patch_cosine_mean']:.4f} "
+                f"below {args.min_cosine}",
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
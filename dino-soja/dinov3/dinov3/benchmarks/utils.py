@@ -0,0 +1,56 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This software may be used and distributed in accordance with
+# the terms of the DINOv3 License Agreement.
+
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import torch
+
+
+def parse_entry_point(entry_point: str) -> Tuple[str, Optional[str]]:
+    """Backbone entry point given as NAME or NAME=WEIGHTS (path or URL)"""
+    name, _, weights = entry_point.partition("=")
+    return name, weights or None
+
+
+def load_backbone(name: str, weights: Optional[str] = None, pretrained: bool = True, **kwargs) -> torch.nn.Module:
+    from dinov3.hub import backbones
+
+    if weights is not None:
+        kwargs["weights"] = weights
+    return getattr(backbones, name)(pretrained=pretrained, **kwargs)
+
+
+def load_images(image_paths: List[str], image_size: int) -> torch.Tensor:
+    """Batch of images resized to `image_size` and normalized as for the evaluations"""
+    from PIL import Image
+
+    from dinov3.data.transforms import make_eval_transform
+
+    transform = make_eval_transform(resize_size=image_size, crop_size=None, resize_square=True)
+    return torch.stack([transform(Image.open(path).convert("RGB")) for path in image_paths])
+
+
+def images_per_second(fn: Callable, images, num_iters: int) -> float:
+    fn(images)  # Warmup
+    start = time.perf_counter()
+    for _ in range(num_iters):
+        fn(images)
+    return num_iters * len(images) / (time.perf_counter() - start)
+
+
+def print_table(rows: Sequence[Dict[str, Any]], columns: Sequence[Tuple[str, str, str]]) -> None:
+    """Prints a line per row, with a column per (key, header, format spec) of `columns`"""
+    cells = [[header for _, header, _ in columns]]
+    cells += [[format(row[key], spec) for key, _, spec in columns] for row in rows]
+    widths = [max(len(line[i]) for line in cells) for i in range(len(columns))]
+    for line in cells:
+        print("  ".join(cell.rjust(width) for cell, width in zip(line, widths)))
+
+
+def check(condition: bool, message: str) -> None:
+    """Parity check of a benchmark, kept under `python -O`"""
+    if not condition:
+        raise AssertionError(message)
@@ -4,6 +4,7 @@
 # the terms of the DINOv3 License Agreement.
 
 from .checkpointer import (
+    AsyncCheckpointSaver,
     CheckpointRetentionPolicy,
     cleanup_checkpoint,
     find_all_checkpoints,
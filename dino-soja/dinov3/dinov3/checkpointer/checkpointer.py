@@ -28,15 +28,18 @@ import logging
 import shutil
 import subprocess
 import tempfile
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from enum import Enum
 from pathlib import Path
-from typing import List, Sequence, Set
+from typing import Any, Callable, Dict, List, Sequence, Set
 
 import torch
 import torch.distributed as dist
 import torch.distributed.checkpoint as dcp
 import torch.distributed.checkpoint.filesystem as dcpfs
 import torch.distributed.checkpoint.state_dict as dcpsd
+from torch.distributed.checkpoint.staging import DefaultStager, StagingOptions
 from torch.distributed.checkpoint.stateful import Stateful
 
 logger = logging.getLogger("dinov3")
@@ -72,23 +75,12 @@ class CheckpointRetentionPolicy(Enum):
         return 1
 
 
-def save_checkpoint(
-    ckpt_dir: str | Path,  # output_dir/ckpt/199
-    *,
-    iteration: int | str,
-    model: torch.nn.Module,
-    optimizer: torch.optim.Optimizer | None = None,
-    overwrite: bool = True,
-    process_group: dist.ProcessGroup = None,
-    **others: Stateful,
-):
-    """Save a plain/DDP/FSDP/FSDP2 model, its optimizer, an integer iteration and other stateful objects."""
+def _make_tmp_checkpoint_dir(ckpt_dir: Path, overwrite: bool, process_group: dist.ProcessGroup = None) -> Path:
     rank = torch.distributed.get_rank(group=process_group)
 
     # Rank 0 checks if the checkpoint directory exists, but all ranks need to know if if exists,
     # so they can raise an error when overwrite is False. If overwrite is True, rank 0 will delete it
     # and other ranks wait for the deletion to finish.
-    ckpt_dir = Path(ckpt_dir)
     ckpt_dir_exists = [ckpt_dir.exists() if rank == 0 else None]
     src_rank = 0
     if process_group is not None:
@@ -111,13 +103,36 @@ def save_checkpoint(
     ckpt_dir.parent.mkdir(parents=True, exist_ok=True)
     ckpt_dir_tmp = [tempfile.mkdtemp(dir=ckpt_dir.parent, prefix=ckpt_dir.name) if rank == 0 else None]
     torch.distributed.broadcast_object_list(ckpt_dir_tmp, src=src_rank, group=process_group)
-    ckpt_dir_tmp = Path(ckpt_dir_tmp[0])
+    return Path(ckpt_dir_tmp[0])
+
 
+def _state_dict_to_save(
+    iteration: int | str, model: torch.nn.Module, optimizer: torch.optim.Optimizer | None, others: Dict[str, Stateful]
+) -> Dict[str, Any]:
     to_save = {"iteration": iteration}
     to_save["model"] = dcpsd.get_model_state_dict(model)
     if optimizer is not None:
         to_save["optimizer"] = dcpsd.get_optimizer_state_dict(model, optimizer)
     to_save.update(others)
+    return to_save
+
+
+def save_checkpoint(
+    ckpt_dir: str | Path,  # output_dir/ckpt/199
+    *,
+    iteration: int | str,
+    model: torch.nn.Module,
+    optimizer: torch.optim.Optimizer | None = None,
+    overwrite: bool = True,
+    process_group: dist.ProcessGroup = None,
+    **others: Stateful,
+):
+    """Save a plain/DDP/FSDP/FSDP2 model, its optimizer, an integer iteration and other stateful objects."""
+    rank = torch.distributed.get_rank(group=process_group)
+    ckpt_dir = Path(ckpt_dir)
+    ckpt_dir_tmp = _make_tmp_checkpoint_dir(ckpt_dir, overwrite, process_group)
+
+    to_save = _state_dict_to_save(iteration, model, optimizer, others)
     dcp.save(
         to_save,
         storage_writer=dcpfs.FileSystemWriter(ckpt_dir_tmp),
@@ -132,6 +147,133 @@ def save_checkpoint(
     logger.info(f"Saved: {ckpt_dir}")
 
 
+class AsyncCheckpointSaver:
+    """
+    Saves checkpoints without blocking training for the I/O. `save` stages the state to (pinned)
+    host memory, then the files are written to a temporary directory by a background thread.
+    Once all the ranks are done, rank 0 renames the directory to its final name and calls
+    `on_commit`, also in the background. A new save waits for the previous one to be committed.
+    `save_file` does the same for a `torch.save` of a state dict from the main process.
+
+    The background writes synchronize the ranks with a gloo process group mirroring `process_group`,
+    created at construction, which must happen on all ranks.
+    """
+
+    def __init__(self, process_group: dist.ProcessGroup = None):
+        self.process_group = process_group
+        self.cpu_process_group = self._new_cpu_process_group(process_group)
+        use_pinned_memory = torch.cuda.is_available()
+        self.stager = DefaultStager(
+            StagingOptions(
+                use_pinned_memory=use_pinned_memory,
+                use_shared_memory=False,
+                use_async_staging=False,
+                use_non_blocking_copy=use_pinned_memory,
+            )
+        )
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        self.pending: Future | None = None
+        self.pending_file: Future | None = None
+
+    @staticmethod
+    def _new_cpu_process_group(process_group: dist.ProcessGroup = None) -> dist.ProcessGroup:
+        # All ranks must create all the groups, in the same order
+        if process_group is None:
+            return torch.distributed.new_group(backend="gloo")
+        all_group_ranks = [None] * torch.distributed.get_world_size()
+        torch.distributed.all_gather_object(all_group_ranks, torch.distributed.get_process_group_ranks(process_group))
+        cpu_process_group = None
+        for group_ranks in sorted(set(tuple(ranks) for ranks in all_group_ranks)):
+            group = torch.distributed.new_group(list(group_ranks), backend="gloo")
+            if torch.distributed.get_rank() in group_ranks:
+                cpu_process_group = group
+        return cpu_process_group
+
+    def save(
+        self,
+        ckpt_dir: str | Path,  # output_dir/ckpt/199
+        *,
+        iteration: int | str,
+        model: torch.nn.Module,
+        optimizer: torch.optim.Optimizer | None = None,
+        overwrite: bool = True,
+        on_commit: Callable[[], None] | None = None,
+        **others: Stateful,
+    ):
+        """Same arguments as `save_checkpoint`, `on_commit` is called on rank 0 after the rename"""
+        self.wait()
+        rank = torch.distributed.get_rank(group=self.process_group)
+        ckpt_dir = Path(ckpt_dir)
+        ckpt_dir_tmp = _make_tmp_checkpoint_dir(ckpt_dir, overwrite, self.process_group)
+
+        to_save = _state_dict_to_save(iteration, model, optimizer, others)
+        start = time.perf_counter()
+        upload = dcp.async_save(
+            to_save,
+            storage_writer=dcpfs.FileSystemWriter(ckpt_dir_tmp),
+            process_group=self.cpu_process_group,
+            async_stager=self.stager,
+        )
+        logger.info(f"Staged checkpoint {ckpt_dir} in {time.perf_counter() - start:.2f}s, writing in the background")
+
+        def commit():
+            # On rank 0, the upload completes after the metadata is written, i.e. after all ranks wrote their shards
+            upload.result()
+            if rank == 0:
+                ckpt_dir_tmp.rename(ckpt_dir)
+                logger.info(f"Saved: {ckpt_dir}")
+                if on_commit is not None:
+                    on_commit()
+
+        self.pending = self.executor.submit(commit)
+
+    def save_file(self, state_dict: Dict[str, Any], path: str | Path):
+        """`torch.save` of `state_dict` (nested dicts of tensors) to `path`, through a temporary file"""
+        self.wait_file()
+        path = Path(path)
+        start = time.perf_counter()
+        state_dict = _copy_to_host(state_dict)
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        logger.info(f"Staged {path} in {time.perf_counter() - start:.2f}s, writing in the background")
+
+        def write():
+            path_tmp = path.with_name(path.name + ".tmp")
+            torch.save(state_dict, path_tmp)
+            path_tmp.rename(path)
+            logger.info(f"Saved: {path}")
+
+        self.pending_file = self.executor.submit(write)
+
+    def wait(self):
+        """Blocks until the last checkpoint is committed, raises if it failed"""
+        if self.pending is not None:
+            if not self.pending.done():
+                logger.info("Waiting for the previous checkpoint to be committed")
+            pending, self.pending = self.pending, None
+            pending.result()
+
+    def wait_file(self):
+        if self.pending_file is not None:
+            pending_file, self.pending_file = self.pending_file, None
+            pending_file.result()
+
+    def close(self):
+        self.wait()
+        self.wait_file()
+        self.executor.shutdown()
+        self.stager.close()
+
+
+def _copy_to_host(obj):
+    if isinstance(obj, torch.Tensor):
+        host = torch.empty_like(obj, device="cpu", pin_memory=obj.is_cuda)
+        return host.copy_(obj, non_blocking=obj.is_cuda)
+    if isinstance(obj, dict):
+        return {k: _copy_to_host(v) for k, v in obj.items()}
+    return obj
+
+
 def load_checkpoint(
     ckpt_dir: str | Path,  # output_dir/ckpt/199
     *,
@@ -0,0 +1,121 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This software may be used and distributed in accordance with
+# the terms of the DINOv3 License Agreement.
+
+"""
+Export of the teacher backbone of a training checkpoint to a single safetensors file, for inference:
+
+    python -m dinov3.checkpointer.export <OUTPUT_DIR>/ckpt/12499 dinov3_vitl16.safetensors --dtype bf16
+    python -m dinov3.checkpointer.export <OUTPUT_DIR>/eval/12499/teacher_checkpoint.pth dinov3_vitl16.safetensors
+
+The file can be loaded by the hub backbones, with `weights=<PATH/TO/FILE.safetensors>`, e.g.
+`dinov3_vitl16(weights="dinov3_vitl16.safetensors")`. A ViT-L teacher trained with untied global and
+local class token norms (as the SAT-493M ViT-L) is loaded with `untie_global_and_local_cls_norm=True`.
+"""
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import torch
+import torch.distributed.checkpoint as dcp
+import torch.distributed.checkpoint.filesystem as dcpfs
+from torch.distributed.checkpoint.metadata import TensorStorageMetadata
+
+from dinov3.logging import setup_logging
+
+logger = logging.getLogger("dinov3")
+
+_EXPORT_DTYPES = {
+    "bf16": torch.bfloat16,
+    "fp16": torch.float16,
+}
+
+
+def _backbone_keys(keys: Iterable[str]) -> Dict[str, str]:
+    """
+    Maps the teacher backbone keys of a checkpoint to their name in the backbone: `_orig_mod.` (added by
+    torch.compile) is removed and only the EMA model (or teacher) backbone is kept, without the DINO and iBOT heads
+    """
+    mapping = {k.replace("_orig_mod.", ""): k for k in keys}
+    for prefixes in (("model_ema.", "teacher."), ("backbone.",)):
+        prefix = next((p for p in prefixes if any(k.startswith(p) for k in mapping)), None)
+        if prefix is not None:
+            mapping = {k[len(prefix) :]: v for k, v in mapping.items() if k.startswith(prefix)}
+    return mapping
+
+
+def load_backbone_state_dict(checkpoint_path: str | Path) -> Dict[str, torch.Tensor]:
+    """
+    Teacher backbone weights of a DCP checkpoint directory (training or sharded eval checkpoint) or of a
+    `teacher_checkpoint.pth`. Only these tensors are read, not the heads nor the optimizer state.
+    """
+    checkpoint_path = Path(checkpoint_path)
+    if checkpoint_path.is_dir():
+        reader = dcpfs.FileSystemReader(checkpoint_path)
+        tensors_metadata = {
+            k[len("model.") :]: v
+            for k, v in reader.read_metadata().state_dict_metadata.items()
+            if k.startswith("model.") and isinstance(v, TensorStorageMetadata)
+        }
+        keys = _backbone_keys(tensors_metadata)
+        to_load = {
+            f"model.{k}": torch.empty(tensors_metadata[k].size, dtype=tensors_metadata[k].properties.dtype)
+            for k in keys.values()
+        }
+        dcp.load(to_load, storage_reader=reader, no_dist=True)
+        return {name: to_load[f"model.{k}"] for name, k in keys.items()}
+    state_dict = torch.load(checkpoint_path, map_location="cpu", mmap=True)
+    if "teacher" in state_dict:
+        state_dict = state_dict["teacher"]
+    return {name: state_dict[k] for name, k in _backbone_keys(state_dict).items()}
+
+
+def export_to_safetensors(
+    checkpoint_path: str | Path, output_path: str | Path, dtype: Optional[torch.dtype] = None
+) -> Dict[str, torch.Tensor]:
+    """Writes the teacher backbone of a checkpoint to a safetensors file, floating-point weights cast to `dtype`"""
+    try:
+        from safetensors.torch import save_file
+    except ImportError:
+        raise ImportError("Exporting to safetensors requires the safetensors package: pip install safetensors")
+
+    state_dict = load_backbone_state_dict(checkpoint_path)
+    if not state_dict:
+        raise ValueError(f"No backbone weights found in {checkpoint_path}")
+    for k, v in state_dict.items():
+        if dtype is not None and v.is_floating_point():
+            v = v.to(dtype)
+        state_dict[k] = v.contiguous()
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    save_file(state_dict, str(tmp_path), metadata={"format": "pt", "source": str(checkpoint_path)})
+    tmp_path.replace(output_path)
+    num_bytes = sum(v.numel() * v.element_size() for v in state_dict.values())
+    logger.info(f"Exported {len(state_dict)} tensors ({num_bytes / 2**20:.1f} MB) to {output_path}")
+    if "local_cls_norm.weight" in state_dict:
+        logger.info(
+            "The backbone has untied global and local class token norms: load it with "
+            "untie_global_and_local_cls_norm=True"
+        )
+    return state_dict
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("checkpoint", help="DCP checkpoint directory or teacher_checkpoint.pth")
+    parser.add_argument("output", help="output .safetensors file")
+    parser.add_argument("--dtype", choices=sorted(_EXPORT_DTYPES), help="cast the weights, float32 kept by default")
+    args = parser.parse_args(argv)
+
+    setup_logging(level=logging.INFO)
+    export_to_safetensors(args.checkpoint, args.output, dtype=_EXPORT_DTYPES.get(args.dtype))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,7 @@
 from .adapters import DatasetWithEnumeratedTargets
 from .augmentations import DataAugmentationDINO
 from .collate import collate_data_and_cast
+from .gpu_augmentations import GPUAugmentedDataLoader, GPUDataAugmentationDINO
 from .loaders import SamplerType, make_data_loader, make_dataset
 from .meta_loaders import CombinedDataLoader
 from .masking import MaskingGenerator
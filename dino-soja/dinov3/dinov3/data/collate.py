@@ -5,6 +5,7 @@
 
 import random
 
+import numpy as np
 import torch
 
 
@@ -41,25 +42,20 @@ def collate_data_and_cast(
     N = n_tokens
     n_samples_masked = int(B * mask_probability)
     probs = torch.linspace(*mask_ratio_tuple, n_samples_masked + 1)
-    upperbound = 0
-    masks_list = []
-    for i in range(0, n_samples_masked):
-        prob_max = probs[i + 1]
-        mask = torch.BoolTensor(mask_generator(int(N * prob_max)))
-        if random_circular_shift:  # apply le random circular shift to
-            shift_x, shift_y = (
-                random.randint(0, mask.shape[0] - 1),
-                random.randint(0, mask.shape[1] - 1),
-            )
-            mask = torch.roll(mask, (shift_x, shift_y), (0, 1))
-        masks_list.append(mask)
-        upperbound += int(N * prob_max)
-    for _ in range(n_samples_masked, B):
-        masks_list.append(torch.BoolTensor(mask_generator(0)))
-
-    random.shuffle(masks_list)
-
-    collated_masks = torch.stack(masks_list).flatten(1)
+    num_masking_patches = [int(N * probs[i + 1]) for i in range(n_samples_masked)] + [0] * (B - n_samples_masked)
+    upperbound = sum(num_masking_patches)
+    masks = mask_generator.generate_batch(num_masking_patches)
+    if random_circular_shift:  # apply le random circular shift to
+        H, W = masks.shape[1:]
+        shift_x = np.array([random.randint(0, H - 1) for _ in range(n_samples_masked)] + [0] * (B - n_samples_masked))
+        shift_y = np.array([random.randint(0, W - 1) for _ in range(n_samples_masked)] + [0] * (B - n_samples_masked))
+        rows = (np.arange(H)[None, :] - shift_x[:, None]) % H
+        cols = (np.arange(W)[None, :] - shift_y[:, None]) % W
+        masks = masks[np.arange(B)[:, None, None], rows[:, :, None], cols[:, None, :]]
+    order = list(range(B))
+    random.shuffle(order)
+
+    collated_masks = torch.from_numpy(masks[order]).flatten(1)
     mask_indices_list = collated_masks.flatten().nonzero().flatten()
 
     masks_weight = (1 / collated_masks.sum(-1).clamp(min=1.0)).unsqueeze(-1).expand_as(collated_masks)[collated_masks]
@@ -3,12 +3,31 @@
 # This software may be used and distributed in accordance with
 # the terms of the DINOv3 License Agreement.
 
-from typing import Any, Tuple
+import logging
+import os
+from typing import Any, Optional, Tuple
 
+import numpy as np
+import torch
+from PIL import Image
 from torchvision.datasets import VisionDataset
 
 from .decoders import Decoder, ImageDataDecoder, TargetDecoder
 
+logger = logging.getLogger("dinov3")
+
+
+class _DecodeDataset(torch.utils.data.Dataset):
+    def __init__(self, dataset: "ExtendedVisionDataset") -> None:
+        self._dataset = dataset
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        image_data = self._dataset.get_image_data(index)
+        return np.asarray(self._dataset.image_decoder(image_data).decode())
+
+    def __len__(self) -> int:
+        return len(self._dataset)
+
 
 class ExtendedVisionDataset(VisionDataset):
     def __init__(
@@ -21,6 +40,9 @@ class ExtendedVisionDataset(VisionDataset):
         super().__init__(*args, **kwargs)  # type: ignore
         self.image_decoder = image_decoder
         self.target_decoder = target_decoder
+        self._decoded_cache_path: Optional[str] = None
+        self._decoded_cache: Optional[np.ndarray] = None
+        self._decoded_cache_as_tensor = False
 
     def get_image_data(self, index: int) -> bytes:
         raise NotImplementedError
@@ -28,10 +50,71 @@ class ExtendedVisionDataset(VisionDataset):
     def get_target(self, index: int) -> Any:
         raise NotImplementedError
 
+    def build_decoded_cache(self, path: str, num_workers: int = 8, batch_size: int = 256) -> None:
+        """
+        Decode every image once into a uint8 N x H x W x 3 .npy array at `path` (all images must share H, W).
+        """
+        tmp_path = f"{path}.tmp.npy"
+        loader = torch.utils.data.DataLoader(
+            _DecodeDataset(self),
+            batch_size=batch_size,
+            num_workers=num_workers,
+            collate_fn=np.stack,
+        )
+        cache = None
+        start = 0
+        for batch in loader:
+            if cache is None:
+                shape = (len(self),) + batch.shape[1:]
+                logger.info(f'building decoded dataset cache of shape {shape} at "{path}"')
+                cache = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8, shape=shape)
+            if batch.shape[1:] != cache.shape[1:]:
+                raise ValueError(
+                    f"decoded cache requires images of the same size, got {batch.shape[1:]} "
+                    f"near sample {start} instead of {cache.shape[1:]}"
+                )
+            cache[start : start + len(batch)] = batch
+            start += len(batch)
+        if cache is None:
+            raise RuntimeError("can not build a decoded cache for an empty dataset")
+        cache.flush()
+        del cache
+        os.replace(tmp_path, path)
+
+    def enable_decoded_cache(self, path: str, as_tensor: bool = False) -> None:
+        """
+        Serve images from a cache built by build_decoded_cache(), as PIL images or CHW uint8 tensors.
+
+        The array is memory-mapped lazily in each process, so DataLoader workers share its pages read-only.
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'decoded dataset cache not found: "{path}"')
+        self._decoded_cache_path = path
+        self._decoded_cache = None
+        self._decoded_cache_as_tensor = as_tensor
+
+    def _get_decoded_image(self, index: int) -> Any:
+        if self._decoded_cache is None:
+            self._decoded_cache = np.load(self._decoded_cache_path, mmap_mode="r")
+            assert len(self._decoded_cache) == len(self), f'stale decoded cache "{self._decoded_cache_path}"'
+        image = self._decoded_cache[index]
+        if self._decoded_cache_as_tensor:
+            return torch.from_numpy(np.array(image)).permute(2, 0, 1)
+        return Image.fromarray(image)
+
+    def __getstate__(self):
+        # Workers re-open the memmap instead of receiving a pickled copy of it
+        state = self.__dict__.copy()
+        state["_decoded_cache"] = None
+        return state
+
     def __getitem__(self, index: int) -> Tuple[Any, Any]:
         try:
-            image_data = self.get_image_data(index)
-            image = self.image_decoder(image_data).decode()
+            if self._decoded_cache_path is not None:
+                image = self._get_decoded_image(index)
+            else:
+                image_data = self.get_image_data(index)
+                image = self.image_decoder(image_data).decode()
         except Exception as e:
             raise RuntimeError(f"can not read image for sample {index}") from e
         target = self.get_target(index)
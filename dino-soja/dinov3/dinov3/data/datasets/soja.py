@@ -6,6 +6,8 @@
 import logging
 import os
 from enum import Enum
+from functools import lru_cache
+from mmap import ACCESS_READ, mmap
 from pathlib import Path
 from typing import Callable, Optional, Union
 import numpy as np
@@ -16,6 +18,27 @@ from .extended import ExtendedVisionDataset
 logger = logging.getLogger("dinov3")
 _Target = int
 
+_DEFAULT_SHARD_SIZE = 1 << 30  # ~1 GiB por shard
+_DEFAULT_MMAP_CACHE_SIZE = 16  # Cuidado: cada shard aberto mantém um descritor de arquivo
+
+# Índice do formato empacotado: cada amostra é um intervalo de bytes dentro de um shard
+_PACKED_INDEX_DTYPE = np.dtype([
+    ('shard', np.uint16),
+    ('offset', np.uint64),
+    ('length', np.uint32),
+    ('class_id', np.int32),
+])
+
+
+def _make_mmap_shard(shards_root: str, mmap_cache_size: int):
+    # Aberto sob demanda (depois do fork dos workers do DataLoader) e mantido aberto
+    @lru_cache(maxsize=mmap_cache_size)
+    def _mmap_shard(shard: int) -> memoryview:
+        with open(os.path.join(shards_root, f"shard-{shard:05d}.bin"), mode="rb") as f:
+            return memoryview(mmap(fileno=f.fileno(), length=0, access=ACCESS_READ))
+
+    return _mmap_shard
+
 
 class _Split(Enum):
     TRAIN = "train"
@@ -51,6 +74,11 @@ class Soja(ExtendedVisionDataset):
     └── extra/
         ├── entries-TRAIN.npy
         └── entries-VAL.npy
+
+    Se o split foi empacotado com pack_shards(), os bytes das imagens são lidos
+    de poucos arquivos grandes (extra/shards-TRAIN/shard-00000.bin, ...) via
+    mmap, usando o índice extra/packed-TRAIN.npy (shard, offset, length, class_id),
+    e os JPEGs individuais deixam de ser acessados.
     """
     
     Target = Union[_Target]
@@ -65,6 +93,7 @@ class Soja(ExtendedVisionDataset):
         transforms: Optional[Callable] = None,
         transform: Optional[Callable] = None,
         target_transform: Optional[Callable] = None,
+        mmap_cache_size: int = _DEFAULT_MMAP_CACHE_SIZE,
     ) -> None:
         super().__init__(
             root=root,
@@ -77,7 +106,9 @@ class Soja(ExtendedVisionDataset):
         self._extra_root = extra
         self._split = split
         self._entries = None
-        
+        self._packed_index = None
+        self._mmap_shard = _make_mmap_shard(self._get_extra_full_path(self._shards_dirname), mmap_cache_size)
+
         # Inicializar automaticamente
         self._initialize_dataset()
 
@@ -106,6 +137,18 @@ class Soja(ExtendedVisionDataset):
     def _entries_path(self) -> str:
         return f"entries-{self._split.value.upper()}.npy"
 
+    @property
+    def _packed_index_path(self) -> str:
+        return f"packed-{self._split.value.upper()}.npy"
+
+    @property
+    def _shards_dirname(self) -> str:
+        return f"shards-{self._split.value.upper()}"
+
+    @property
+    def is_packed(self) -> bool:
+        return self._packed_index is not None
+
     def _get_entries(self) -> np.ndarray:
         if self._entries is None:
             self._entries = self._load_extra(self._entries_path)
@@ -162,13 +205,22 @@ class Soja(ExtendedVisionDataset):
     def _initialize_dataset(self) -> None:
         """Inicializa o dataset criando arquivos necessários se não existirem"""
         entries_full_path = self._get_extra_full_path(self._entries_path)
-        
-        if not os.path.exists(entries_full_path):
+
+        if os.path.exists(self._get_extra_full_path(self._packed_index_path)):
+            self._packed_index = self._load_extra(self._packed_index_path)
+            logger.info(f"Usando shards empacotados de {self._get_extra_full_path(self._shards_dirname)}")
+        elif not os.path.exists(entries_full_path):
             logger.info(f"Inicializando dataset de patches de soja em {self.root}")
             self._create_entries()
 
     def get_image_data(self, index: int) -> bytes:
         """Carrega os dados da imagem"""
+        if self.is_packed:
+            # Fatia do mmap sem cópia e sem syscalls por amostra
+            entry = self._packed_index[index]
+            offset = int(entry['offset'])
+            return self._mmap_shard(int(entry['shard']))[offset:offset + int(entry['length'])]
+
         entries = self._get_entries()
         rel_path = entries[index]['path']
         
@@ -183,20 +235,54 @@ class Soja(ExtendedVisionDataset):
 
     def get_target(self, index: int) -> Optional[_Target]:
         """Retorna o target (sempre 0 para soja)"""
-        entries = self._get_entries()
+        entries = self._packed_index if self.is_packed else self._get_entries()
         return int(entries[index]['class_id'])
 
     def get_targets(self) -> Optional[np.ndarray]:
         """Retorna todos os targets"""
-        entries = self._get_entries()
+        entries = self._packed_index if self.is_packed else self._get_entries()
         return entries['class_id']
 
     def __len__(self) -> int:
         """Retorna o número de amostras"""
-        entries = self._get_entries()
+        entries = self._packed_index if self.is_packed else self._get_entries()
         return len(entries)
 
     def dump_extra(self) -> None:
         """Cria todos os arquivos extras necessários"""
         self._create_entries()
-        logger.info(f"Dataset de soja inicializado com sucesso para split {self._split.value}!")
\ No newline at end of file
+        logger.info(f"Dataset de soja inicializado com sucesso para split {self._split.value}!")
+
+    def pack_shards(self, shard_size: int = _DEFAULT_SHARD_SIZE) -> None:
+        """
+        Empacota as imagens do split em poucos shards grandes e grava o índice mmap.
+
+        Os arquivos são concatenados na ordem das entries, então a leitura de
+        cada shard é sequencial. O índice só é gravado no fim: até lá o dataset
+        continua lendo os JPEGs individuais.
+        """
+        if self.is_packed:
+            raise RuntimeError(f'Split {self._split.value} já está empacotado em "{self._packed_index_path}"')
+        entries = self._get_entries()
+        index = np.empty(len(entries), dtype=_PACKED_INDEX_DTYPE)
+        shards_root = self._get_extra_full_path(self._shards_dirname)
+        os.makedirs(shards_root, exist_ok=True)
+
+        shard, offset = 0, 0
+        out = open(os.path.join(shards_root, f"shard-{shard:05d}.bin"), mode="wb")
+        try:
+            for i in range(len(entries)):
+                image_data = self.get_image_data(i)
+                if offset > 0 and offset + len(image_data) > shard_size:
+                    out.close()
+                    shard, offset = shard + 1, 0
+                    out = open(os.path.join(shards_root, f"shard-{shard:05d}.bin"), mode="wb")
+                out.write(image_data)
+                index[i] = (shard, offset, len(image_data), entries[i]['class_id'])
+                offset += len(image_data)
+        finally:
+            out.close()
+
+        logger.info(f'Empacotadas {len(index)} imagens em {shard + 1} shards em "{shards_root}"')
+        self._save_extra(index, self._packed_index_path)
+        self._packed_index = self._load_extra(self._packed_index_path)
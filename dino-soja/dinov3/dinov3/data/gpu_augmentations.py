@@ -0,0 +1,401 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This software may be used and distributed in accordance with
+# the terms of the DINOv3 License Agreement.
+
+import logging
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+from torch import Tensor
+from torchvision import transforms
+
+from dinov3.data.transforms import IMAGENET_DEFAULT_MEAN, IMAGENET_DEFAULT_STD
+
+logger = logging.getLogger("dinov3")
+
+# Columns of the per-crop parameter rows sampled on the CPU
+_TOP, _LEFT, _HEIGHT, _WIDTH, _FLIP = 0, 1, 2, 3, 4
+_JITTER, _ORDER = 5, slice(6, 10)
+_BRIGHTNESS, _CONTRAST, _SATURATION, _HUE, _GRAYSCALE = 10, 11, 12, 13, 14
+_BLUR, _SIGMA, _SOLARIZE = 15, 16, 17
+_NUM_PARAMS = 18
+
+_BLUR_KERNEL_SIZE = 9
+_SOLARIZE_THRESHOLD = 128 / 255
+
+
+def _grayscale(x: Tensor) -> Tensor:
+    return (0.299 * x[:, 0] + 0.587 * x[:, 1] + 0.114 * x[:, 2]).unsqueeze(1)
+
+
+def _rgb_to_hsv(x: Tensor) -> Tensor:
+    r, g, b = x.unbind(1)
+    maxc, _ = x.max(dim=1)
+    minc, _ = x.min(dim=1)
+    cr = maxc - minc
+    eqc = cr == 0
+    s = cr / torch.where(eqc, torch.ones_like(maxc), maxc)
+    cr_divisor = torch.where(eqc, torch.ones_like(cr), cr)
+    rc, gc, bc = (maxc - r) / cr_divisor, (maxc - g) / cr_divisor, (maxc - b) / cr_divisor
+    hr = (maxc == r) * (bc - gc)
+    hg = ((maxc == g) & (maxc != r)) * (2.0 + rc - bc)
+    hb = ((maxc != g) & (maxc != r)) * (4.0 + gc - rc)
+    h = torch.fmod((hr + hg + hb) / 6.0 + 1.0, 1.0)
+    return torch.stack((h, s, maxc), dim=1)
+
+
+def _hsv_to_rgb(x: Tensor) -> Tensor:
+    h, s, v = x.unbind(1)
+    i = torch.floor(h * 6.0)
+    f = h * 6.0 - i
+    i = i.to(torch.int64) % 6
+    p = (v * (1.0 - s)).clamp(0.0, 1.0)
+    q = (v * (1.0 - s * f)).clamp(0.0, 1.0)
+    t = (v * (1.0 - s * (1.0 - f))).clamp(0.0, 1.0)
+    mask = i.unsqueeze(1) == torch.arange(6, device=i.device).view(-1, 1, 1)  # [B, 6, H, W]
+    a1 = torch.stack((v, q, p, p, t, v), dim=1)
+    a2 = torch.stack((t, v, v, q, p, p), dim=1)
+    a3 = torch.stack((p, p, t, v, v, q), dim=1)
+    a4 = torch.stack((a1, a2, a3), dim=1)  # [B, 3, 6, H, W]
+    return torch.einsum("bjhw,bcjhw->bchw", mask.to(x.dtype), a4)
+
+
+def _adjust_brightness(x: Tensor, factor: Tensor) -> Tensor:
+    return (x * factor.view(-1, 1, 1, 1)).clamp(0.0, 1.0)
+
+
+def _adjust_contrast(x: Tensor, factor: Tensor) -> Tensor:
+    mean = _grayscale(x).mean(dim=(1, 2, 3), keepdim=True)
+    factor = factor.view(-1, 1, 1, 1)
+    return (factor * x + (1.0 - factor) * mean).clamp(0.0, 1.0)
+
+
+def _adjust_saturation(x: Tensor, factor: Tensor) -> Tensor:
+    factor = factor.view(-1, 1, 1, 1)
+    return (factor * x + (1.0 - factor) * _grayscale(x)).clamp(0.0, 1.0)
+
+
+def _adjust_hue(x: Tensor, factor: Tensor) -> Tensor:
+    hsv = _rgb_to_hsv(x)
+    hsv[:, 0] = torch.remainder(hsv[:, 0] + factor.view(-1, 1, 1), 1.0)
+    return _hsv_to_rgb(hsv)
+
+
+# Same order as the fn_idx of transforms.ColorJitter.get_params
+_COLOR_OPS = [
+    (_adjust_brightness, _BRIGHTNESS),
+    (_adjust_contrast, _CONTRAST),
+    (_adjust_saturation, _SATURATION),
+    (_adjust_hue, _HUE),
+]
+
+
+def _gaussian_blur(x: Tensor, sigma: Tensor) -> Tensor:
+    # Separable blur with one kernel per sample (as a grouped convolution), reflect padding as torchvision
+    B, C, H, W = x.shape
+    half = (_BLUR_KERNEL_SIZE - 1) * 0.5
+    grid = torch.linspace(-half, half, _BLUR_KERNEL_SIZE, device=x.device, dtype=x.dtype)
+    kernel = torch.exp(-0.5 * (grid[None, :] / sigma[:, None]) ** 2)
+    kernel = (kernel / kernel.sum(dim=1, keepdim=True)).repeat_interleave(C, dim=0)  # [B * C, K]
+    pad = _BLUR_KERNEL_SIZE // 2
+    x = F.pad(x.reshape(1, B * C, H, W), (pad, pad, pad, pad), mode="reflect")
+    x = F.conv2d(x, kernel[:, None, None, :], groups=B * C)
+    x = F.conv2d(x, kernel[:, None, :, None], groups=B * C)
+    return x.reshape(B, C, H, W)
+
+
+def _select(mask: Tensor, device: torch.device) -> Optional[Tensor]:
+    # Masks come from the CPU copy of the parameters, so selecting samples never synchronizes the GPU
+    indices = mask.nonzero().flatten()
+    if len(indices) == 0:
+        return None
+    return indices.to(device, non_blocking=True)
+
+
+class GPUDataAugmentationDINO(object):
+    """
+    Batched GPU counterpart of DataAugmentationDINO.
+
+    Called on an image (in the DataLoader workers), it only converts the image to a uint8 CHW tensor and
+    samples the random parameters of every crop on the CPU, so results are reproducible given the worker
+    seeds. collate() stacks those, and apply() runs the crops, flips, color jitter, grayscale, blur and
+    solarize as batched tensor ops on the GPU, returning one dictionary per sample with the same layout as
+    DataAugmentationDINO, ready for collate_data_and_cast.
+
+    Crops are resampled with bicubic grid_sample, which does not antialias like PIL when downscaling.
+    All images of a batch must have the same size (set raw_size to resize them in the workers).
+    """
+
+    def __init__(
+        self,
+        global_crops_scale,
+        local_crops_scale,
+        local_crops_number,
+        global_crops_size=224,
+        local_crops_size=96,
+        gram_teacher_crops_size=None,
+        gram_teacher_no_distortions=False,
+        teacher_no_color_jitter=False,
+        local_crops_subset_of_global_crops=False,
+        patch_size=16,
+        share_color_jitter=False,
+        horizontal_flips=True,
+        mean=IMAGENET_DEFAULT_MEAN,
+        std=IMAGENET_DEFAULT_STD,
+        raw_size: Optional[int] = None,
+        device: Optional[torch.device] = None,
+    ):
+        self.global_crops_scale = global_crops_scale
+        self.local_crops_scale = local_crops_scale
+        self.local_crops_number = local_crops_number
+        self.global_crops_size = global_crops_size
+        self.local_crops_size = local_crops_size
+        self.gram_teacher_crops_size = gram_teacher_crops_size
+        self.gram_teacher_no_distortions = gram_teacher_no_distortions
+        self.teacher_no_color_jitter = teacher_no_color_jitter
+        self.local_crops_subset_of_global_crops = local_crops_subset_of_global_crops
+        self.patch_size = patch_size
+        self.share_color_jitter = share_color_jitter
+        self.flip_p = 0.5 if horizontal_flips else 0.0
+        self.mean = mean
+        self.std = std
+        self.raw_size = raw_size
+        self.device = device
+
+        logger.info("###################################")
+        logger.info("Using GPU data augmentation parameters:")
+        logger.info(f"global_crops_scale: {global_crops_scale}")
+        logger.info(f"local_crops_scale: {local_crops_scale}")
+        logger.info(f"local_crops_number: {local_crops_number}")
+        logger.info(f"global_crops_size: {global_crops_size}")
+        logger.info(f"local_crops_size: {local_crops_size}")
+        logger.info(f"gram_crops_size: {gram_teacher_crops_size}")
+        logger.info(f"gram_teacher_no_distortions: {gram_teacher_no_distortions}")
+        logger.info(f"teacher_no_color_jitter: {teacher_no_color_jitter}")
+        logger.info(f"local_crops_subset_of_global_crops: {local_crops_subset_of_global_crops}")
+        logger.info(f"share_color_jitter: {share_color_jitter}")
+        logger.info(f"horizontal flips: {horizontal_flips}")
+        logger.info(f"raw_size: {raw_size}")
+        logger.info("###################################")
+
+        self.global_crop_max_size = max(global_crops_size, gram_teacher_crops_size if gram_teacher_crops_size else 0)
+        self.color_jitter = transforms.ColorJitter(brightness=0.4, contrast=0.4, saturation=0.2, hue=0.1)
+
+    # CPU side (DataLoader workers)
+
+    def _sample_color_params(self, row: Tensor) -> None:
+        # RandomApply(ColorJitter, p=0.8) followed by RandomGrayscale(p=0.2)
+        if torch.rand(1) < 0.8:
+            fn_idx, b, c, s, h = self.color_jitter.get_params(
+                self.color_jitter.brightness,
+                self.color_jitter.contrast,
+                self.color_jitter.saturation,
+                self.color_jitter.hue,
+            )
+            row[_JITTER] = 1.0
+            row[_ORDER] = fn_idx.float()
+            row[_BRIGHTNESS], row[_CONTRAST], row[_SATURATION], row[_HUE] = b, c, s, h
+        row[_GRAYSCALE] = float(torch.rand(1) < 0.2)
+
+    def _sample_crop_params(
+        self,
+        image: Tensor,
+        scale: Optional[Sequence[float]],
+        color: bool,
+        blur_p: float,
+        solarize_p: float = 0.0,
+    ) -> Tensor:
+        row = torch.zeros(_NUM_PARAMS)
+        if scale is not None:
+            row[_TOP], row[_LEFT], row[_HEIGHT], row[_WIDTH] = transforms.RandomResizedCrop.get_params(
+                image, scale=scale, ratio=(3.0 / 4.0, 4.0 / 3.0)
+            )
+            row[_FLIP] = float(torch.rand(1) < self.flip_p)
+        if color:
+            self._sample_color_params(row)
+        # Same semantics as dinov3.data.transforms.GaussianBlur(p=...), which blurs with probability 1 - p
+        row[_BLUR] = float(torch.rand(1) < 1 - blur_p)
+        row[_SIGMA] = transforms.GaussianBlur.get_params(0.1, 2.0)
+        row[_SOLARIZE] = float(torch.rand(1) < solarize_p)
+        return row
+
+    def _to_uint8_tensor(self, image: Any) -> Tensor:
+        if isinstance(image, Image.Image):
+            if self.raw_size is not None and image.size != (self.raw_size, self.raw_size):
+                image = image.resize((self.raw_size, self.raw_size), resample=Image.Resampling.BICUBIC)
+            return torch.from_numpy(np.array(image.convert("RGB"))).permute(2, 0, 1).contiguous()
+        assert isinstance(image, Tensor) and image.dtype == torch.uint8, "expected a PIL image or a uint8 CHW tensor"
+        if self.raw_size is not None and tuple(image.shape[-2:]) != (self.raw_size, self.raw_size):
+            image = transforms.functional.resize(image, [self.raw_size, self.raw_size], antialias=True)
+        return image
+
+    def __call__(self, image) -> Dict[str, Tensor]:
+        image = self._to_uint8_tensor(image)
+        color = not self.share_color_jitter
+        local_scale = None if self.local_crops_subset_of_global_crops else self.local_crops_scale
+        params = {
+            "global": torch.stack(
+                [
+                    self._sample_crop_params(image, self.global_crops_scale, color, blur_p=1.0),
+                    self._sample_crop_params(image, self.global_crops_scale, color, blur_p=0.1, solarize_p=0.2),
+                ]
+            ),
+            "local": torch.stack(
+                [
+                    self._sample_crop_params(image, local_scale, color, blur_p=0.5)
+                    for _ in range(self.local_crops_number)
+                ]
+            ),
+        }
+        if self.share_color_jitter:
+            shared = torch.zeros(_NUM_PARAMS)
+            self._sample_color_params(shared)
+            params["shared"] = shared
+        if self.local_crops_subset_of_global_crops:
+            n_offsets = (self.global_crops_size - self.local_crops_size) // self.patch_size
+            params["offsets"] = torch.randint(0, n_offsets, (self.local_crops_number, 2)) * self.patch_size
+        return {"image": image, "params": params}
+
+    def collate(self, samples_list: List[Any]) -> Dict[str, Any]:
+        images = [s[0]["image"] for s in samples_list]
+        if any(image.shape != images[0].shape for image in images):
+            raise ValueError("GPU data augmentation needs images of the same size, set crops.gpu_raw_size")
+        return {
+            "images": torch.stack(images),
+            "params": {k: torch.stack([s[0]["params"][k] for s in samples_list]) for k in samples_list[0][0]["params"]},
+            "targets": [s[1] for s in samples_list],
+        }
+
+    # GPU side (main process)
+
+    def _resized_crops(self, images: Tensor, params: Tensor, size: int) -> Tensor:
+        # Affine grids mapping the output square to each (top, left, height, width) box, flipped if needed
+        B, _, H, W = images.shape
+        top, left, height, width = params[:, _TOP], params[:, _LEFT], params[:, _HEIGHT], params[:, _WIDTH]
+        sign = 1.0 - 2.0 * params[:, _FLIP]
+        theta = torch.zeros(B, 2, 3, device=images.device, dtype=images.dtype)
+        theta[:, 0, 0] = sign * width / W
+        theta[:, 0, 2] = (2 * left + width) / W - 1
+        theta[:, 1, 1] = height / H
+        theta[:, 1, 2] = (2 * top + height) / H - 1
+        grid = F.affine_grid(theta, [B, 3, size, size], align_corners=False)
+        crops = F.grid_sample(images, grid, mode="bicubic", padding_mode="border", align_corners=False)
+        return crops.clamp_(0.0, 1.0)
+
+    def _color_jitter(self, x: Tensor, params: Tensor, cpu_params: Tensor) -> Tensor:
+        jitter = cpu_params[:, _JITTER] > 0
+        order = cpu_params[:, _ORDER].long()
+        for position in range(4):
+            for op_index, (op, column) in enumerate(_COLOR_OPS):
+                indices = _select(jitter & (order[:, position] == op_index), x.device)
+                if indices is not None:
+                    x[indices] = op(x[indices], params[indices, column])
+        indices = _select(cpu_params[:, _GRAYSCALE] > 0, x.device)
+        if indices is not None:
+            x[indices] = _grayscale(x[indices]).expand(-1, 3, -1, -1)
+        return x
+
+    def _distort(self, x: Tensor, params: Tensor, cpu_params: Tensor) -> Tensor:
+        x = self._color_jitter(x, params, cpu_params)
+        indices = _select(cpu_params[:, _BLUR] > 0, x.device)
+        if indices is not None:
+            x[indices] = _gaussian_blur(x[indices], params[indices, _SIGMA])
+        indices = _select(cpu_params[:, _SOLARIZE] > 0, x.device)
+        if indices is not None:
+            x[indices] = torch.where(x[indices] >= _SOLARIZE_THRESHOLD, 1.0 - x[indices], x[indices])
+        return x
+
+    def _normalize(self, x: Tensor) -> Tensor:
+        mean = torch.tensor(self.mean, device=x.device, dtype=x.dtype).view(1, 3, 1, 1)
+        std = torch.tensor(self.std, device=x.device, dtype=x.dtype).view(1, 3, 1, 1)
+        return (x - mean) / std
+
+    @staticmethod
+    def _resize(x: Tensor, size: int) -> Tensor:
+        if x.shape[-1] == size:
+            return x
+        return F.interpolate(x, size=(size, size), mode="bicubic", antialias=True, align_corners=False)
+
+    @torch.no_grad()
+    def apply(self, batch: Dict[str, Any]) -> List[Dict[str, Any]]:
+        device = self.device if self.device is not None else torch.device("cuda", torch.cuda.current_device())
+        images = batch["images"].to(device, non_blocking=True).float().div_(255.0)
+        cpu_params = batch["params"]
+        params = {k: v.to(device, non_blocking=True) for k, v in cpu_params.items()}
+        B = len(images)
+
+        if self.share_color_jitter:
+            images = self._color_jitter(images, params["shared"], cpu_params["shared"])
+
+        global_crops, teacher_crops, gram_crops, bases = [], [], [], []
+        for i in range(2):
+            base = self._resized_crops(images, params["global"][:, i], self.global_crop_max_size)
+            bases.append(base)
+            x = base
+            if self.gram_teacher_crops_size is not None and self.gram_teacher_no_distortions:
+                x = self._resize(x, self.global_crops_size)
+            x = self._normalize(self._distort(x.clone(), params["global"][:, i], cpu_params["global"][:, i]))
+            if self.gram_teacher_crops_size is not None:
+                if self.gram_teacher_no_distortions:
+                    gram_crops.append(self._normalize(self._resize(base, self.gram_teacher_crops_size)))
+                else:
+                    gram_crops.append(self._resize(x, self.gram_teacher_crops_size))
+            x = self._resize(x, self.global_crops_size)
+            global_crops.append(x)
+            teacher_crops.append(self._normalize(base) if self.teacher_no_color_jitter else x)
+
+        local_crops = []
+        for k in range(self.local_crops_number):
+            if self.local_crops_subset_of_global_crops:
+                x = bases[0 if k < self.local_crops_number // 2 else 1].clone()
+            else:
+                x = self._resized_crops(images, params["local"][:, k], self.local_crops_size)
+            local_crops.append(self._normalize(self._distort(x, params["local"][:, k], cpu_params["local"][:, k])))
+
+        offsets = [() for _ in range(B)]
+        if self.local_crops_subset_of_global_crops:
+            ls = self.local_crops_size
+            offsets = [[tuple(o) for o in cpu_params["offsets"][b].tolist()] for b in range(B)]
+            local_crops = [
+                torch.stack([crop[b, :, rx : rx + ls, ry : ry + ls] for b, (rx, ry) in enumerate(crop_offsets)])
+                for crop, crop_offsets in zip(local_crops, zip(*offsets))
+            ]
+
+        outputs = []
+        for b in range(B):
+            output = {
+                "weak_flag": True,
+                "global_crops": [crop[b] for crop in global_crops],
+                "global_crops_teacher": [crop[b] for crop in teacher_crops],
+                "local_crops": [crop[b] for crop in local_crops],
+                "offsets": offsets[b],
+            }
+            if self.gram_teacher_crops_size is not None:
+                output["gram_teacher_crops"] = [crop[b] for crop in gram_crops]
+            outputs.append(output)
+        return outputs
+
+
+class GPUAugmentedDataLoader:
+    """
+    Wraps a data loader whose batches come from GPUDataAugmentationDINO.collate: augments each batch on the
+    GPU, then collates it with `collate_fn` (e.g. collate_data_and_cast) as the CPU pipeline would.
+    """
+
+    def __init__(self, data_loader, augmentation: GPUDataAugmentationDINO, collate_fn: Callable):
+        self.data_loader = data_loader
+        self.augmentation = augmentation
+        self.collate_fn = collate_fn
+        self.batch_size = data_loader.batch_size
+
+    def __iter__(self):
+        for batch in self.data_loader:
+            outputs = self.augmentation.apply(batch)
+            yield self.collate_fn(list(zip(outputs, batch["targets"])))
+
+    def __len__(self) -> int:
+        return len(self.data_loader)
@@ -3,13 +3,17 @@
 # This software may be used and distributed in accordance with
 # the terms of the DINOv3 License Agreement.
 
+import hashlib
 import logging
+import os
 from enum import Enum
 from typing import Any, Callable, List, Optional, TypeVar
 
 import torch
 from torch.utils.data import Sampler
 
+import dinov3.distributed as distributed
+
 from .datasets import ADE20K, CocoCaptions, ImageNet, ImageNet22k
 from .datasets.soja import Soja
 from .samplers import EpochSampler, InfiniteSampler, ShardedInfiniteSampler
@@ -84,6 +88,7 @@ def make_dataset(
     dataset_str: str,
     transform: Optional[Callable] = None,
     target_transform: Optional[Callable] = None,
+    decoded_cache_dir: Optional[str] = None,
 ):
     """
     Creates a dataset with the specified parameters.
@@ -92,6 +97,7 @@ def make_dataset(
         dataset_str: A dataset string description (e.g. ImageNet:split=TRAIN).
         transform: A transform to apply to images.
         target_transform: A transform to apply to targets.
+        decoded_cache_dir: A local directory where images are decoded once and served from (when supported).
 
     Returns:
         The created dataset.
@@ -109,9 +115,30 @@ def make_dataset(
     if not hasattr(dataset, "target_transform"):
         dataset.target_transform = target_transform
 
+    if decoded_cache_dir:
+        _enable_decoded_cache(dataset, dataset_str, decoded_cache_dir)
+
     return dataset
 
 
+def _enable_decoded_cache(dataset, dataset_str: str, cache_dir: str) -> None:
+    if not hasattr(dataset, "enable_decoded_cache"):
+        logger.warning(f"decoded dataset cache is not supported by {type(dataset).__name__}, ignoring it")
+        return
+
+    digest = hashlib.md5(dataset_str.encode()).hexdigest()[:16]
+    cache_path = os.path.join(cache_dir, f"decoded-{digest}-{len(dataset)}.npy")
+    # The cache lives on node-local disk: the first rank of each node builds it, the others wait
+    if not os.path.exists(cache_path) and int(os.environ.get("LOCAL_RANK", 0)) == 0:
+        os.makedirs(cache_dir, exist_ok=True)
+        dataset.build_decoded_cache(cache_path)
+    if distributed.is_enabled():
+        torch.distributed.barrier()
+
+    logger.info(f'using decoded dataset cache: "{cache_path}"')
+    dataset.enable_decoded_cache(cache_path)
+
+
 def _make_sampler(
     *,
     dataset,
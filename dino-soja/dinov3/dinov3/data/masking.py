@@ -4,7 +4,6 @@
 # the terms of the DINOv3 License Agreement.
 
 import math
-import random
 
 import numpy as np
 
@@ -47,48 +46,68 @@ class MaskingGenerator:
     def get_shape(self):
         return self.height, self.width
 
-    def _mask(self, mask, max_mask_patches):
-        delta = 0
-        for _ in range(10):
-            target_area = random.uniform(self.min_num_patches, max_mask_patches)
-            aspect_ratio = math.exp(random.uniform(*self.log_aspect_ratio))
-            h = int(round(math.sqrt(target_area * aspect_ratio)))
-            w = int(round(math.sqrt(target_area / aspect_ratio)))
-            if w < self.width and h < self.height:
-                top = random.randint(0, self.height - h)
-                left = random.randint(0, self.width - w)
-
-                num_masked = mask[top : top + h, left : left + w].sum()
-                # Overlap
-                if 0 < h * w - num_masked <= max_mask_patches:
-                    for i in range(top, top + h):
-                        for j in range(left, left + w):
-                            if mask[i, j] == 0:
-                                mask[i, j] = 1
-                                delta += 1
-
-                if delta > 0:
-                    break
-        return delta
+    def _mask_batch(self, masks, counts, max_mask_patches, attempts=10):
+        # One rejection-sampling round for every sample at once: up to `attempts` rectangles are proposed per
+        # sample against the current masks and the first acceptable one is painted, as in the scalar version
+        B = len(masks)
+        target_area = np.random.uniform(self.min_num_patches, max_mask_patches[:, None], size=(B, attempts))
+        aspect_ratio = np.exp(np.random.uniform(*self.log_aspect_ratio, size=(B, attempts)))
+        h = np.rint(np.sqrt(target_area * aspect_ratio)).astype(np.int64)
+        w = np.rint(np.sqrt(target_area / aspect_ratio)).astype(np.int64)
+        fits = (w < self.width) & (h < self.height)
+        h, w = np.where(fits, h, 0), np.where(fits, w, 0)
+        top = (np.random.random_sample((B, attempts)) * (self.height - h + 1)).astype(np.int64)
+        left = (np.random.random_sample((B, attempts)) * (self.width - w + 1)).astype(np.int64)
+
+        # Already masked patches inside each proposal, from the summed-area table of the masks
+        table = np.zeros((B, self.height + 1, self.width + 1), dtype=np.int64)
+        table[:, 1:, 1:] = masks.cumsum(1).cumsum(2)
+        b = np.arange(B)[:, None]
+        num_masked = (
+            table[b, top + h, left + w] - table[b, top, left + w] - table[b, top + h, left] + table[b, top, left]
+        )
+        delta = h * w - num_masked
+        accepted = fits & (delta > 0) & (delta <= max_mask_patches[:, None])
+
+        painted = accepted.any(axis=1)
+        first = accepted.argmax(axis=1)
+        top, left, h, w = (v[np.arange(B), first] for v in (top, left, h, w))
+        rows = np.arange(self.height)[None, :, None]
+        cols = np.arange(self.width)[None, None, :]
+        rects = (
+            (rows >= top[:, None, None])
+            & (rows < (top + h)[:, None, None])
+            & (cols >= left[:, None, None])
+            & (cols < (left + w)[:, None, None])
+        )
+        masks |= rects & painted[:, None, None]
+        counts += np.where(painted, delta[np.arange(B), first], 0)
+        return painted
+
+    def generate_batch(self, num_masking_patches):
+        """
+        Block masks for a batch, one sample per entry of `num_masking_patches`, as a [B, H, W] boolean array.
+        """
+        num_masking_patches = np.asarray(num_masking_patches, dtype=np.int64)
+        B = len(num_masking_patches)
+        masks = np.zeros((B, *self.get_shape()), dtype=bool)
+        counts = np.zeros(B, dtype=np.int64)
+        active = counts < num_masking_patches
+        while active.any():
+            indices = np.flatnonzero(active)
+            sub_masks, sub_counts = masks[indices], counts[indices]
+            max_mask_patches = np.minimum(num_masking_patches[indices] - sub_counts, self.max_num_patches)
+            painted = self._mask_batch(sub_masks, sub_counts, max_mask_patches)
+            masks[indices], counts[indices] = sub_masks, sub_counts
+            # Samples stop when they reach their target or when no proposal could be painted
+            active[indices] = painted & (sub_counts < num_masking_patches[indices])
+
+        # Random completion: the lowest random keys among the still unmasked patches
+        flat = masks.reshape(B, -1)
+        keys = np.where(flat, np.inf, np.random.random_sample(flat.shape))
+        ranks = keys.argsort(axis=1).argsort(axis=1)
+        flat |= ranks < (num_masking_patches - flat.sum(axis=1))[:, None]
+        return flat.reshape(masks.shape)
 
     def __call__(self, num_masking_patches=0):
-        mask = np.zeros(shape=self.get_shape(), dtype=bool)
-        mask_count = 0
-        while mask_count < num_masking_patches:
-            max_mask_patches = num_masking_patches - mask_count
-            max_mask_patches = min(max_mask_patches, self.max_num_patches)
-
-            delta = self._mask(mask, max_mask_patches)
-            if delta == 0:
-                break
-            else:
-                mask_count += delta
-
-        return self.complete_mask_randomly(mask, num_masking_patches)
-
-    def complete_mask_randomly(self, mask, num_masking_patches):
-        shape = mask.shape
-        m2 = mask.flatten()
-        to_add = np.random.choice(np.where(~m2)[0], size=num_masking_patches - m2.sum(), replace=False)
-        m2[to_add] = True
-        return m2.reshape(shape)
+        return self.generate_batch([num_masking_patches])[0]
@@ -60,19 +60,68 @@ def _get_torch_dtype(size: int) -> Any:
     return torch.int32 if size <= 2**31 else torch.int64
 
 
-def _generate_randperm_indices(*, size: int, generator: torch.Generator):
-    """Generate the indices of a random permutation."""
-    dtype = _get_torch_dtype(size)
-    # This is actually matching PyTorch's CPU implementation, see: https://github.com/pytorch/pytorch/blob/master/aten/src/ATen/native/TensorFactories.cpp#L900-L921
-    perm = torch.arange(size, dtype=dtype)
-    for i in range(size):
-        j = torch.randint(i, size, size=(1,), generator=generator).item()
+def _make_randperm_rng(seed: int) -> np.random.RandomState:
+    # Same MT19937 stream as torch.Generator().manual_seed(seed) (the seed is truncated to 32 bits in both)
+    return np.random.RandomState(seed & 0xFFFFFFFF)
+
+
+def _draw_randperm_swaps(*, size: int, begin: int, end: int, rng: np.random.RandomState) -> np.ndarray:
+    # Matches torch.randint(i, size, generator=generator) for i in [begin, end): one 32-bit draw, mod range
+    raw = rng.randint(0, 2**32, size=end - begin, dtype=np.uint32).astype(np.int64)
+    i = np.arange(begin, end, dtype=np.int64)
+    return raw % (size - i) + i
+
+
+def _skip_randperm_indices(*, size: int, rng: np.random.RandomState, chunk_size: int = 2**20) -> None:
+    """Advance the stream by one permutation without generating it (each swap consumes exactly one draw)."""
+    for begin in range(0, size, chunk_size):
+        rng.randint(0, 2**32, size=min(chunk_size, size - begin), dtype=np.uint32)
+
+
+def _generate_randperm_indices(
+    *,
+    size: int,
+    rng: np.random.RandomState,
+    start: int = 0,
+    step: int = 1,
+    skip: int = 0,
+    chunk_size: int = 4096,
+):
+    """
+    Generate the indices of a random permutation, in chunks.
+
+    This reproduces the sequence of PyTorch's CPU randperm (a forward Fisher-Yates shuffle drawing one
+    torch.randint per element) for a generator seeded like `rng`. Only the indices at positions
+    start + (skip + k) * step are yielded; the others are generated, but never materialized.
+    """
+    if size >= 2**32:
+        raise ValueError(f"random permutations of {size:,d} >= 2**32 elements are not supported")
+    perm = np.arange(size, dtype=_get_numpy_dtype(size))
+    first = start + skip * step
+    begin = 0
+    while begin < size:
+        # Swaps are applied one chunk at a time: that is exact as long as no step of the chunk
+        # reads a position written by an earlier step of the same chunk, which is checked below
+        count = min(chunk_size, max(1, int((size - begin) ** 0.5) // 4), size - begin)
+        end = begin + count
+        j = _draw_randperm_swaps(size=size, begin=begin, end=end, rng=rng)
+        i = np.arange(begin, end)
+        outside = j[j >= end]
+        if np.all((j == i) | (j >= end)) and len(np.unique(outside)) == len(outside):
+            values = perm[j]
+            perm[j] = perm[begin:end]
+        else:
+            values = np.empty(count, dtype=perm.dtype)
+            for k, jk in enumerate(j.tolist()):
+                values[k] = perm[jk]
+                perm[jk] = perm[begin + k]
 
-        # Always swap even if no-op
-        value = perm[j].item()
-        perm[j] = perm[i].item()
-        perm[i] = value
-        yield value
+        if end > first:
+            offset = max(first - begin, 0)
+            offset += (start - begin - offset) % step
+            if offset < count:
+                yield values[offset::step]
+        begin = end
 
 
 class InfiniteSampler(Sampler):
@@ -99,25 +148,42 @@ class InfiniteSampler(Sampler):
         else:
             iterator = self._iterator()
 
-        yield from itertools.islice(iterator, self._advance, None)
+        yield from iterator
+
+    def _epoch_advance(self) -> tuple[int, int]:
+        # Split the advance into whole epochs and a remainder, in samples of this rank
+        epoch_count = len(range(self._start, self._sample_count, self._step))
+        if epoch_count == 0:
+            return 0, 0
+        return divmod(self._advance, epoch_count)
 
     def _iterator(self):
         assert not self._shuffle
 
+        iterable = range(self._start, self._sample_count, self._step)
+        _, skip = self._epoch_advance()
+        yield from iterable[skip:]
         while True:
-            iterable = range(self._sample_count)
-            yield from itertools.islice(iterable, self._start, None, self._step)
+            yield from iterable
 
     def _shuffled_iterator(self):
         assert self._shuffle
 
-        # Instantiate a generator here (rather than in the ctor) to keep the class
+        # Instantiate the RNG here (rather than in the ctor) to keep the class
         # picklable (requirement of mp.spawn)
-        generator = torch.Generator().manual_seed(self._seed)
+        rng = _make_randperm_rng(self._seed)
+
+        skipped_epochs, skip = self._epoch_advance()
+        for _ in range(skipped_epochs):
+            _skip_randperm_indices(size=self._sample_count, rng=rng)
 
         while True:
-            iterable = _generate_randperm_indices(size=self._sample_count, generator=generator)
-            yield from itertools.islice(iterable, self._start, None, self._step)
+            chunks = _generate_randperm_indices(
+                size=self._sample_count, rng=rng, start=self._start, step=self._step, skip=skip
+            )
+            for chunk in chunks:
+                yield from chunk.tolist()
+            skip = 0
 
 
 # The following function is somewhat equivalent to _new_shuffle_tensor_slice below,
@@ -3,8 +3,11 @@
 # This software may be used and distributed in accordance with
 # the terms of the DINOv3 License Agreement.
 
+from typing import Optional
+
 import torch
 from dinov3.eval.dense.depth.utils import cast_to
+from dinov3.utils import device_autocast
 
 from .dpt_head import DPTHead
 from .encoder import BackboneLayersSet, DinoVisionTransformerWrapper, PatchSizeAdaptationStrategy
@@ -115,20 +118,28 @@ class EncoderDecoder(torch.nn.Module):
         decoder: torch.nn.Module,
         encoder_dtype=torch.float,
         decoder_dtype=torch.float,
+        autocast_dtype: Optional[torch.dtype] = None,
     ):
         super().__init__()
         self.encoder = encoder
         self.decoder = decoder
         self.encoder_dtype = encoder_dtype
         self.decoder_dtype = decoder_dtype
+        # Mixed precision of the encoder and decoder on the device of the inputs (CUDA, or CPU where supported)
+        self.autocast_dtype = autocast_dtype
         self.is_cuda = torch.cuda.is_available()
 
     def forward(self, x):
-        with torch.autocast("cuda" if torch.cuda.is_available() else "cpu", enabled=False):
+        device = x.device
+        # Without autocast_dtype, the encoder runs in encoder_dtype and the decoder in the caller's autocast context
+        with device_autocast(device, self.autocast_dtype, enabled=self.autocast_dtype is not None):
             x = x.to(self.encoder_dtype)
             x = self.encoder(x)
             x = cast_to(x, self.decoder_dtype)
-        return self.decoder(x)
+        if self.autocast_dtype is None:
+            return self.decoder(x)
+        with device_autocast(device, self.autocast_dtype):
+            return self.decoder(x).float()
 
 
 def build_depther(
@@ -142,6 +153,7 @@ def build_depther(
     head_type: str = "dpt",
     encoder_dtype: torch.dtype = torch.float,
     decoder_dtype: torch.dtype = torch.float,
+    autocast_dtype: Optional[torch.dtype] = None,
     # depth args
     min_depth: float = 0.001,
     max_depth: float = 10.0,
@@ -181,6 +193,7 @@ def build_depther(
             decoder,
             encoder_dtype=encoder_dtype,
             decoder_dtype=decoder_dtype,
+            autocast_dtype=autocast_dtype,
         ),
         features_to_depth,
     )
@@ -0,0 +1,387 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This software may be used and distributed in accordance with
+# the terms of the DINOv3 License Agreement.
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import torch
+from torch import nn
+from torch.utils.data import Dataset
+
+import dinov3.distributed as distributed
+from dinov3.data import DatasetWithEnumeratedTargets, SamplerType, make_data_loader
+from dinov3.eval.utils import all_gather_and_flatten
+from dinov3.logging import MetricLogger
+
+logger = logging.getLogger("dinov3")
+
+
+_META_FILENAME = "meta.json"
+_FEATURES_FILENAME = "features.npy"
+_LABELS_FILENAME = "labels.npy"
+
+# Layout of the last-but-one axis of the stored features
+CLASS_TOKEN, POOLED_PATCH_TOKENS = 0, 1
+
+
+@dataclass
+class FeatureBankConfig:
+    root: Optional[str] = None  # directory holding the feature banks, None to disable them
+    max_size_gb: float = 200.0  # least recently used banks are evicted when the directory grows past this size
+
+
+def checkpoint_hash(model: nn.Module) -> str:
+    """
+    Fingerprint of the weights of `model`: names, shapes, dtypes and contents of its state dict.
+    Computed on the main process and broadcast to the other ranks.
+    """
+    digest = [None]
+    if distributed.is_main_process():
+        start = time.time()
+        h = hashlib.blake2b(digest_size=16)
+        for name, tensor in sorted(model.state_dict().items()):
+            tensor = tensor.detach()
+            h.update(f"{name}:{tuple(tensor.shape)}:{tensor.dtype}".encode())
+            h.update(tensor.cpu().contiguous().view(torch.uint8).numpy().tobytes())
+        digest[0] = h.hexdigest()
+        logger.info(f"Checkpoint hash {digest[0]} computed in {time.time() - start:.1f}s")
+    if distributed.is_enabled():
+        torch.distributed.broadcast_object_list(digest, src=0)
+    return digest[0]
+
+
+def resolve_subset(dataset) -> Tuple[Any, Optional[torch.Tensor]]:
+    """
+    Walks down nested `Subset`s and returns the underlying dataset with the indices of the
+    samples of `dataset` within it (None if `dataset` is not a subset).
+    """
+    indices = None
+    while hasattr(dataset, "indices") and hasattr(dataset, "dataset"):
+        subset_indices = torch.as_tensor(dataset.indices, dtype=torch.long)
+        indices = subset_indices if indices is None else subset_indices[indices]
+        dataset = dataset.dataset
+    return dataset, indices
+
+
+class FeatureBankEntry:
+    """
+    Features of all the samples of a dataset, stored as a float16 array of shape
+    [N, n_last_blocks, 2, D] holding, for each of the last blocks, the normalized class token
+    and the average of the normalized patch tokens. The arrays are memory-mapped on first access.
+    """
+
+    def __init__(self, path: str, meta: Dict[str, Any]) -> None:
+        self.path = path
+        self.meta = meta
+        self._features: Optional[np.ndarray] = None
+        self._labels: Optional[np.ndarray] = None
+
+    @property
+    def n_last_blocks(self) -> int:
+        return self.meta["n_last_blocks"]
+
+    @property
+    def features(self) -> np.ndarray:
+        if self._features is None:
+            self._features = np.load(os.path.join(self.path, _FEATURES_FILENAME), mmap_mode="r")
+        return self._features
+
+    @property
+    def all_labels(self) -> np.ndarray:
+        if self._labels is None:
+            self._labels = np.load(os.path.join(self.path, _LABELS_FILENAME), mmap_mode="r")
+        return self._labels
+
+    def __len__(self) -> int:
+        return self.meta["num_samples"]
+
+    def __getstate__(self):
+        # Workers re-open the memmaps instead of receiving a pickled copy of them
+        state = self.__dict__.copy()
+        state["_features"] = None
+        state["_labels"] = None
+        return state
+
+    def _take(self, array: np.ndarray, indices: Optional[torch.Tensor]) -> np.ndarray:
+        if indices is None:
+            return np.array(array)
+        indices = indices.numpy()
+        order = np.argsort(indices, kind="stable")  # read the memmap sequentially
+        out = np.empty((len(indices),) + array.shape[1:], dtype=array.dtype)
+        out[order] = array[indices[order]]
+        return out
+
+    def tokens(self, kind: int, indices: Optional[torch.Tensor] = None, n_last_blocks: int = 1) -> torch.Tensor:
+        """Returns float32 tokens of the given kind, of shape [len(indices), n_last_blocks, D]"""
+        assert n_last_blocks <= self.n_last_blocks
+        features = self._take(self.features, indices)
+        return torch.from_numpy(features[:, -n_last_blocks:, kind].astype(np.float32))
+
+    def class_tokens(self, indices: Optional[torch.Tensor] = None) -> torch.Tensor:
+        return self.tokens(CLASS_TOKEN, indices)[:, -1]
+
+    def labels(self, indices: Optional[torch.Tensor] = None) -> torch.Tensor:
+        return torch.from_numpy(self._take(self.all_labels, indices))
+
+
+class ClassTokenView:
+    """
+    Class tokens of the samples `indices` of a bank entry, read from the memmap when indexed
+    (with a slice or a tensor of indices) instead of being held in memory
+    """
+
+    def __init__(
+        self, entry: FeatureBankEntry, indices: Optional[torch.Tensor] = None, normalize: bool = False
+    ) -> None:
+        self.entry = entry
+        self.indices = torch.arange(len(entry)) if indices is None else indices
+        self.normalize = normalize
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __getitem__(self, index) -> torch.Tensor:
+        features = self.entry.class_tokens(self.indices[index])
+        if self.normalize:
+            features = nn.functional.normalize(features, dim=1, p=2)
+        return features
+
+    def narrow(self, dim: int, start: int, length: int) -> "ClassTokenView":
+        assert dim == 0
+        return ClassTokenView(self.entry, self.indices[start : start + length], self.normalize)
+
+
+class FeatureBankDataset(Dataset):
+    """
+    Serves the tokens of the `n_last_blocks` last blocks stored in a bank, as float16 tensors
+    of shape [n_last_blocks, 2, D], along with the stored labels.
+    """
+
+    def __init__(self, entry: FeatureBankEntry, indices: Optional[torch.Tensor] = None, n_last_blocks: int = 1) -> None:
+        assert n_last_blocks <= entry.n_last_blocks
+        self._entry = entry
+        self._indices = indices
+        self._n_last_blocks = n_last_blocks
+
+    def _get_actual_index(self, index: int) -> int:
+        return index if self._indices is None else int(self._indices[index])
+
+    def get_target(self, index: int) -> Any:
+        target = self._entry.all_labels[self._get_actual_index(index)]
+        return target.item() if target.ndim == 0 else np.array(target)
+
+    def get_targets(self) -> np.ndarray:
+        return self._entry._take(self._entry.all_labels, self._indices)
+
+    def __getitem__(self, index: int) -> Tuple[torch.Tensor, Any]:
+        tokens = self._entry.features[self._get_actual_index(index), -self._n_last_blocks :]
+        return torch.from_numpy(np.array(tokens)), self.get_target(index)
+
+    def __len__(self) -> int:
+        return len(self._entry) if self._indices is None else len(self._indices)
+
+
+class FeatureBank:
+    """
+    On-disk cache of extracted features, keyed by (checkpoint hash, dataset, transform).
+    A bank extracted with `n_last_blocks` blocks also serves requests for fewer blocks, so that
+    k-NN, logistic regression and linear evaluations of the same checkpoint share it, and
+    few-shot subsets index into the bank of the full dataset instead of being re-extracted.
+    """
+
+    def __init__(self, root: str, max_size_gb: float = 200.0) -> None:
+        self.root = root
+        self.max_size_bytes = int(max_size_gb * 2**30)
+        self._checkpoint_hashes: Dict[int, str] = {}
+
+    @classmethod
+    def from_config(cls, config: FeatureBankConfig) -> Optional["FeatureBank"]:
+        if config.root is None:
+            return None
+        return cls(config.root, max_size_gb=config.max_size_gb)
+
+    def _checkpoint_hash(self, model: nn.Module) -> str:
+        if id(model) not in self._checkpoint_hashes:
+            self._checkpoint_hashes[id(model)] = checkpoint_hash(model)
+        return self._checkpoint_hashes[id(model)]
+
+    def _make_key(self, model: nn.Module, dataset, dataset_str: str) -> Dict[str, str]:
+        return {
+            "checkpoint": self._checkpoint_hash(model),
+            "dataset": dataset_str,
+            "transform": repr(getattr(dataset, "transforms", None)),
+        }
+
+    def _bank_path(self, key: Dict[str, str]) -> str:
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()[:20]
+        return os.path.join(self.root, digest)
+
+    def _read_meta(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(path, _META_FILENAME)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def get_or_extract(
+        self,
+        model: nn.Module,
+        dataset,
+        dataset_str: str,
+        *,
+        batch_size: int,
+        num_workers: int,
+        n_last_blocks: int = 1,
+    ) -> Tuple[FeatureBankEntry, Optional[torch.Tensor]]:
+        """
+        Returns the bank of the dataset underlying `dataset` (extracting it if missing or if it
+        has fewer than `n_last_blocks` blocks) along with the indices of `dataset` within it.
+        """
+        dataset, indices = resolve_subset(dataset)
+        key = self._make_key(model, dataset, dataset_str)
+        path = self._bank_path(key)
+        meta = self._read_meta(path)
+        if meta is None or meta["key"] != key or meta["n_last_blocks"] < n_last_blocks:
+            if distributed.is_main_process():
+                logger.info(f"Extracting features of {dataset_str} into bank {path}")
+            self._extract(model, dataset, path, key, batch_size, num_workers, n_last_blocks)
+            meta = self._read_meta(path)
+        else:
+            logger.info(f"Using features of {dataset_str} from bank {path}")
+            if distributed.is_main_process():
+                os.utime(os.path.join(path, _META_FILENAME))  # mark as recently used
+        return FeatureBankEntry(path, meta), indices
+
+    @torch.inference_mode()
+    def _extract(self, model, dataset, path, key, batch_size, num_workers, n_last_blocks) -> None:
+        is_main = distributed.is_main_process()
+        tmp_path = f"{path}.tmp"
+        if is_main:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            os.makedirs(tmp_path)
+
+        dataset_with_enumerated_targets = DatasetWithEnumeratedTargets(dataset)
+        sample_count = len(dataset_with_enumerated_targets)
+        data_loader = make_data_loader(
+            dataset=dataset_with_enumerated_targets,
+            batch_size=batch_size,
+            num_workers=num_workers,
+            sampler_type=SamplerType.DISTRIBUTED,
+            drop_last=False,
+            shuffle=False,
+        )
+        features, all_labels = None, None
+        metric_logger = MetricLogger(delimiter="  ")
+        for samples, (index, labels_rank) in metric_logger.log_every(data_loader, 10):
+            samples = samples.cuda(non_blocking=True)
+            outputs = model.get_intermediate_layers(samples, n=n_last_blocks, return_class_token=True)
+            features_rank = torch.stack(
+                [torch.stack((class_token, patch_tokens.mean(dim=1)), dim=1) for patch_tokens, class_token in outputs],
+                dim=1,
+            ).half()
+
+            index_all = all_gather_and_flatten(index.cuda(non_blocking=True)).cpu().numpy()
+            features_all_ranks = all_gather_and_flatten(features_rank).cpu().numpy()
+            labels_all_ranks = all_gather_and_flatten(labels_rank.cuda(non_blocking=True)).cpu().numpy()
+            if not is_main or len(index_all) == 0:
+                continue
+            if features is None:
+                features = np.lib.format.open_memmap(
+                    os.path.join(tmp_path, _FEATURES_FILENAME),
+                    mode="w+",
+                    dtype=np.float16,
+                    shape=(sample_count,) + features_all_ranks.shape[1:],
+                )
+                all_labels = np.full((sample_count,) + labels_all_ranks.shape[1:], -1, dtype=np.int64)
+            features[index_all] = features_all_ranks
+            all_labels[index_all] = labels_all_ranks
+
+        if is_main:
+            features.flush()
+            del features
+            np.save(os.path.join(tmp_path, _LABELS_FILENAME), all_labels)
+            meta = {"key": key, "n_last_blocks": n_last_blocks, "num_samples": sample_count}
+            with open(os.path.join(tmp_path, _META_FILENAME), "w") as f:
+                json.dump(meta, f)
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+            self._evict(keep=path)
+        if distributed.is_enabled():
+            torch.distributed.barrier()
+
+    def _evict(self, keep: str) -> None:
+        banks = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(path) or path.endswith(".tmp"):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+            meta_path = os.path.join(path, _META_FILENAME)
+            last_used = os.path.getmtime(meta_path) if os.path.exists(meta_path) else 0.0
+            banks.append((last_used, size, path))
+        total_size = sum(size for _, size, _ in banks)
+        for _, size, path in sorted(banks):
+            if total_size <= self.max_size_bytes:
+                break
+            if path == keep:
+                continue
+            logger.info(f"Evicting feature bank {path} ({size / 2**30:.1f} GB)")
+            shutil.rmtree(path, ignore_errors=True)
+            total_size -= size
+
+
+def extract_features_with_bank(
+    feature_bank: FeatureBank,
+    model: nn.Module,
+    dataset,
+    dataset_str: str,
+    batch_size: int,
+    num_workers: int,
+    normalize: bool = False,
+    lazy: bool = False,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Drop-in replacement of `extract_features` for models evaluated on their class token,
+    reading the features from `feature_bank`. With `lazy`, the features are returned as a
+    `ClassTokenView` reading the bank on demand.
+    """
+    entry, indices = feature_bank.get_or_extract(
+        model, dataset, dataset_str, batch_size=batch_size, num_workers=num_workers
+    )
+    if lazy:
+        return ClassTokenView(entry, indices, normalize=normalize), entry.labels(indices)
+    features = entry.class_tokens(indices)
+    if normalize:
+        features = nn.functional.normalize(features, dim=1, p=2)
+    return features, entry.labels(indices)
+
+
+def extract_features_for_dataset_dict_with_bank(
+    feature_bank: FeatureBank,
+    model: nn.Module,
+    dataset_dict: Dict[int, Any],
+    dataset_str: str,
+    batch_size: int,
+    num_workers: int,
+    normalize: bool = False,
+    lazy: bool = False,
+) -> Dict[int, Dict[str, torch.Tensor]]:
+    """
+    Same as `extract_features_for_dataset_dict`, all the few-shot tries share a single bank
+    """
+    few_shot_data_dict: Dict[int, Dict[str, torch.Tensor]] = {}
+    for try_n, dataset in dataset_dict.items():
+        features, labels = extract_features_with_bank(
+            feature_bank, model, dataset, dataset_str, batch_size, num_workers, normalize=normalize, lazy=lazy
+        )
+        few_shot_data_dict[try_n] = {"train_features": features, "train_labels": labels}
+    return few_shot_data_dict
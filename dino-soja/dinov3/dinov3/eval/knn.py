@@ -33,7 +33,9 @@ from dinov3.eval.data import (
     get_num_classes,
     pad_multilabel_and_collate,
 )
+from dinov3.eval.feature_bank import FeatureBank, FeatureBankConfig, extract_features_for_dataset_dict_with_bank
 from dinov3.eval.helpers import args_dict_to_dataclass, cli_parser, write_results
+from dinov3.eval.knn_search import IVFIndex, chunked_topk, recall_at_k
 from dinov3.eval.metrics import ClassificationMetricType, build_classification_metric
 from dinov3.eval.setup import ModelConfig, load_model_and_context
 from dinov3.eval.utils import ModelWithNormalize, average_metrics, evaluate
@@ -59,6 +61,16 @@ class TrainConfig:
     Useful when training and testing on the same dataset split.
     """
     skip_first_nn: bool = False
+    """
+    How the neighbors are searched: "exact" holds the train features on the device, "chunked"
+    streams them from CPU memory (or from the feature bank, memory-mapped) and "ivf" searches
+    an approximate inverted file index, for train sets too large for an exact search.
+    """
+    search: str = "exact"
+    search_chunk_size: int = 65536  # number of train features moved to the device at once ("chunked" and "ivf")
+    ivf_num_lists: Optional[int] = None  # number of k-means lists of the index, None for 4 * sqrt(features per rank)
+    ivf_nprobe: int = 32  # number of lists searched for each test feature
+    ivf_recall_sample: int = 1000  # number of test features per rank also searched exactly to report the recall
 
 
 @dataclass
@@ -89,6 +101,7 @@ class KnnEvalConfig:
     eval: EvalConfig = field(default_factory=EvalConfig)
     transform: TransformConfig = field(default_factory=TransformConfig)
     few_shot: FewShotConfig = field(default_factory=FewShotConfig)
+    feature_bank: FeatureBankConfig = field(default_factory=FeatureBankConfig)
     save_results: bool = False  # save predictions and targets in the output directory
     output_dir: str = ""
 
@@ -110,9 +123,13 @@ class KnnModule(torch.nn.Module):
         self.world_size = distributed.get_world_size()
 
         self.device = device
-        self.train_features_rank_T = train_features.chunk(self.world_size)[self.rank].T.to(self.device)
+        # Same split as `torch.chunk`, also applied to train features that are not tensors
+        chunk_size = -(-len(train_features) // self.world_size)
+        start = min(self.rank * chunk_size, len(train_features))
+        length = min(chunk_size, len(train_features) - start)
+        self._init_train_features(train_features.narrow(0, start, length))
         # Labels can either be integers, or in a one-hot format
-        self.candidates = train_labels.chunk(self.world_size)[self.rank].unsqueeze(0).to(self.device)
+        self.candidates = train_labels.narrow(0, start, length).unsqueeze(0).to(self.device)
 
         self.ks = ks
         self.max_k = max(self.ks) + skip_first_nn
@@ -123,6 +140,9 @@ class KnnModule(torch.nn.Module):
         if self.skip_first_nn:
             logger.info("Skipping the first nearest neighbor of each element in the test dataset")
 
+    def _init_train_features(self, train_features_rank):
+        self.train_features_rank_T = train_features_rank.T.to(self.device)
+
     def _get_knn_sims_and_labels(self, similarity, train_labels):
         topk_sims, indices = similarity.topk(min(self.max_k, similarity.shape[1]), largest=True, sorted=True)
         if len(train_labels.shape) == 3:  # If the labels are in one_hot format
@@ -144,8 +164,11 @@ class KnnModule(torch.nn.Module):
             broadcasted = torch.zeros(*broadcast_shape, dtype=features_rank.dtype, device=self.device)
         torch.distributed.broadcast(broadcasted, source_rank)
 
-        # Compute the neighbors for `source_rank` among `train_features_rank_T`
-        similarity_rank = torch.mm(broadcasted, self.train_features_rank_T)
+        return self._search(broadcasted)
+
+    def _search(self, features):
+        """Computes the neighbors of `features` among `train_features_rank_T`"""
+        similarity_rank = torch.mm(features, self.train_features_rank_T)
         candidate_labels = self.candidates.expand(len(similarity_rank), *self.candidates.shape[1:])
         return self._get_knn_sims_and_labels(similarity_rank, candidate_labels)
 
@@ -184,6 +207,70 @@ class KnnModule(torch.nn.Module):
         return probas_for_k
 
 
+class ChunkedKnnModule(KnnModule):
+    """
+    Exact k-NN where the train features stay off the device, in CPU memory or memory-mapped from
+    a feature bank, and are streamed to the device `chunk_size` at a time for each test chunk
+    """
+
+    def __init__(self, *, chunk_size=65536, **kwargs):
+        super().__init__(**kwargs)
+        self.chunk_size = chunk_size
+
+    def _init_train_features(self, train_features_rank):
+        self.train_features_rank = train_features_rank
+
+    def _labels_for_indices(self, indices):
+        # Neighbors not found (index -1) have a similarity of -inf, hence no weight in the vote
+        return self.candidates[0][indices.clamp(min=0)]
+
+    def _search(self, features):
+        topk_sims, indices = chunked_topk(features, self.train_features_rank, self.max_k, self.chunk_size)
+        return topk_sims, self._labels_for_indices(indices)
+
+
+class IVFKnnModule(ChunkedKnnModule):
+    """
+    Approximate k-NN with an inverted file index of the train features of each rank. The first
+    `recall_sample` test features searched on each rank are also searched exactly to measure
+    the recall of the index.
+    """
+
+    def __init__(self, *, num_lists=None, nprobe=32, recall_sample=1000, **kwargs):
+        super().__init__(**kwargs)
+        self.nprobe = nprobe
+        self.recall_sample = recall_sample
+        self.recall_num_queries, self.recall_found, self.recall_total = 0, 0, 0
+        start = time.time()
+        self.index = IVFIndex.build(
+            self.train_features_rank, device=self.device, num_lists=num_lists, chunk_size=self.chunk_size
+        )
+        logger.info(
+            f"IVF index of {len(self.index)} train features in {self.index.num_lists} lists "
+            f"built in {time.time() - start:.1f}s"
+        )
+
+    def _search(self, features):
+        topk_sims, indices = self.index.search(features, self.max_k, self.nprobe)
+        num_recall_queries = min(len(features), self.recall_sample - self.recall_num_queries)
+        if num_recall_queries > 0:
+            _, exact_indices = chunked_topk(
+                features[:num_recall_queries], self.train_features_rank, self.max_k, self.chunk_size
+            )
+            found, total = recall_at_k(indices[:num_recall_queries], exact_indices)
+            self.recall_num_queries += num_recall_queries
+            self.recall_found += found
+            self.recall_total += total
+        return topk_sims, self._labels_for_indices(indices)
+
+    def recall(self) -> float:
+        """Fraction of the exact neighbors found by the index, over all ranks"""
+        counts = torch.tensor([self.recall_found, self.recall_total], dtype=torch.float64, device=self.device)
+        if distributed.is_enabled():
+            torch.distributed.all_reduce(counts)
+        return (counts[0] / counts[1].clamp(min=1)).item()
+
+
 class DictKeysModule(torch.nn.Module):
     def __init__(self, keys):
         super().__init__()
@@ -240,12 +327,29 @@ def eval_knn(
     eval_metrics_dict: Dict[int, Dict[int, Dict[str, float]]] = {}  # {k: {try: {metric_name: metric_value}}}
     save_results = save_results_func is not None
     device = torch.cuda.current_device()
+    knn_module_kwargs: Dict[str, Any] = {}
+    if knn_config.search == "exact":
+        knn_module_class = KnnModule
+    elif knn_config.search == "chunked":
+        knn_module_class = ChunkedKnnModule
+        knn_module_kwargs = dict(chunk_size=knn_config.search_chunk_size)
+    elif knn_config.search == "ivf":
+        knn_module_class = IVFKnnModule
+        knn_module_kwargs = dict(
+            chunk_size=knn_config.search_chunk_size,
+            num_lists=knn_config.ivf_num_lists,
+            nprobe=knn_config.ivf_nprobe,
+            recall_sample=knn_config.ivf_recall_sample,
+        )
+    else:
+        raise ValueError(f"Unknown k-NN search: {knn_config.search}")
     partial_knn_module = partial(
-        KnnModule,
+        knn_module_class,
         device=device,
         num_classes=num_classes,
         T=knn_config.temperature,
         skip_first_nn=knn_config.skip_first_nn,
+        **knn_module_kwargs,
     )
 
     for try_ in train_data_dict.keys():
@@ -261,6 +365,8 @@ def eval_knn(
             device,
             accumulate_results=save_results,
         )
+        if isinstance(knn_module, IVFKnnModule):
+            logger.info(f"IVF search recall@{knn_module.max_k} against exact search: {knn_module.recall():.4f}")
         for k in ks:
             if save_results:
                 if len(train_data_dict) > 1:
@@ -331,12 +437,26 @@ def eval_knn_with_model(*, model: torch.nn.Module, autocast_dtype, config: KnnEv
     if config.save_results:
         save_results_func = partial(default_save_results_func, output_dir=config.output_dir)
 
+    feature_bank = FeatureBank.from_config(config.feature_bank)
+    backbone = model
     model = ModelWithNormalize(model)
     with torch.autocast("cuda", dtype=autocast_dtype):
         logger.info("Extracting features for train set...")
-        train_data_dict = extract_features_for_dataset_dict(
-            model, train_dataset_dict, config.train.batch_size, config.train.num_workers, gather_on_cpu=True
-        )
+        if feature_bank is not None:
+            train_data_dict = extract_features_for_dataset_dict_with_bank(
+                feature_bank,
+                backbone,
+                train_dataset_dict,
+                config.train.dataset,
+                config.train.batch_size,
+                config.train.num_workers,
+                normalize=True,
+                lazy=config.train.search != "exact",
+            )
+        else:
+            train_data_dict = extract_features_for_dataset_dict(
+                model, train_dataset_dict, config.train.batch_size, config.train.num_workers, gather_on_cpu=True
+            )
         results_dict_knn = eval_knn(
             model=model,
             train_data_dict=train_data_dict,
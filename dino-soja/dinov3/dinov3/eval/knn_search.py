@@ -0,0 +1,170 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This software may be used and distributed in accordance with
+# the terms of the DINOv3 License Agreement.
+
+"""
+Nearest neighbor search over L2-normalized features, by inner product, for train features that
+do not fit in device memory. `features` can be any object that has a length and returns a float
+tensor of shape [n, D] when indexed with a slice or a tensor of indices, e.g. a CPU tensor or a
+`dinov3.eval.feature_bank.ClassTokenView` reading a memory-mapped feature bank.
+"""
+
+import logging
+import math
+from typing import Optional, Tuple
+
+import torch
+
+logger = logging.getLogger("dinov3")
+
+
+def merge_topk(
+    sims: torch.Tensor, indices: torch.Tensor, new_sims: torch.Tensor, new_indices: torch.Tensor, k: int
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Merges two partial top-k results of the same queries, both sorted or not"""
+    sims, positions = torch.cat([sims, new_sims], dim=1).topk(k, dim=1, largest=True, sorted=True)
+    return sims, torch.gather(torch.cat([indices, new_indices], dim=1), 1, positions)
+
+
+def empty_topk(num_queries: int, k: int, device) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Top-k results with no neighbor found yet: similarities of -inf and indices of -1"""
+    sims = torch.full((num_queries, k), -math.inf, device=device)
+    indices = torch.full((num_queries, k), -1, dtype=torch.long, device=device)
+    return sims, indices
+
+
+def chunked_topk(queries: torch.Tensor, features, k: int, chunk_size: int) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Exact top-k of `queries` among `features`, streamed to the device of the queries
+    `chunk_size` rows at a time. Returns the similarities and the indices in `features`.
+    """
+    k = min(k, len(features))
+    sims, indices = empty_topk(len(queries), k, queries.device)
+    for start in range(0, len(features), chunk_size):
+        block = features[start : start + chunk_size].to(device=queries.device, dtype=queries.dtype, non_blocking=True)
+        block_sims, block_indices = torch.mm(queries, block.T).topk(min(k, len(block)), dim=1)
+        sims, indices = merge_topk(sims, indices, block_sims.float(), block_indices + start, k)
+    return sims, indices
+
+
+def spherical_kmeans(
+    x: torch.Tensor, num_clusters: int, num_iters: int = 10, generator: Optional[torch.Generator] = None
+) -> torch.Tensor:
+    """K-means with cosine similarity on the rows of `x`, returns L2-normalized centroids"""
+    centroids = x[torch.randperm(len(x), generator=generator)[:num_clusters].to(x.device)].clone()
+    for _ in range(num_iters):
+        assignments = torch.mm(x, centroids.T).argmax(dim=1)
+        sums = torch.zeros_like(centroids).index_add_(0, assignments, x)
+        counts = torch.bincount(assignments, minlength=num_clusters)
+        empty = (counts == 0).nonzero().flatten()
+        if len(empty) > 0:  # Re-seed empty clusters with random points
+            reseed = torch.randint(len(x), (len(empty),), generator=generator).to(x.device)
+            sums[empty] = x[reseed]
+        centroids = torch.nn.functional.normalize(sums, dim=1, p=2)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted file index: a k-means coarse quantizer splits the features into `num_lists` lists,
+    stored contiguously in float16 on the device. A query is only compared with the features
+    of the `nprobe` lists whose centroids are the closest to it.
+    """
+
+    def __init__(
+        self, centroids: torch.Tensor, list_offsets: torch.Tensor, list_ids: torch.Tensor, list_features: torch.Tensor
+    ) -> None:
+        self.centroids = centroids
+        self.list_offsets = list_offsets.tolist()
+        self.list_ids = list_ids
+        self.list_features = list_features
+
+    @property
+    def num_lists(self) -> int:
+        return len(self.centroids)
+
+    def __len__(self) -> int:
+        return len(self.list_ids)
+
+    @classmethod
+    def build(
+        cls,
+        features,
+        *,
+        device,
+        num_lists: Optional[int] = None,
+        chunk_size: int = 65536,
+        num_train_points_per_list: int = 64,
+        num_kmeans_iters: int = 10,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        num_features = len(features)
+        if num_lists is None:
+            num_lists = 4 * int(math.sqrt(num_features))
+        num_lists = max(1, min(num_lists, num_features))
+        generator = torch.Generator().manual_seed(seed)
+
+        num_train_points = min(num_features, num_lists * num_train_points_per_list)
+        train_indices = torch.randperm(num_features, generator=generator)[:num_train_points].sort().values
+        train_points = features[train_indices].to(device=device, dtype=torch.float32)
+        logger.info(f"Training the IVF coarse quantizer: {num_lists} lists on {num_train_points} features")
+        centroids = spherical_kmeans(train_points, num_lists, num_kmeans_iters, generator=generator)
+        del train_points
+
+        assignments = torch.empty(num_features, dtype=torch.long)
+        for start in range(0, num_features, chunk_size):
+            block = features[start : start + chunk_size].to(device=device, dtype=torch.float32)
+            assignments[start : start + len(block)] = torch.mm(block, centroids.T).argmax(dim=1).cpu()
+        list_ids = torch.argsort(assignments, stable=True)
+        list_offsets = torch.zeros(num_lists + 1, dtype=torch.long)
+        list_offsets[1:] = torch.bincount(assignments, minlength=num_lists).cumsum(0)
+
+        # Features are read in their original order and written to their position in the lists
+        positions = torch.empty_like(list_ids)
+        positions[list_ids] = torch.arange(num_features)
+        list_features = None
+        for start in range(0, num_features, chunk_size):
+            block = features[start : start + chunk_size].to(device=device, dtype=torch.float16)
+            if list_features is None:
+                list_features = torch.empty(num_features, block.shape[1], dtype=torch.float16, device=device)
+            list_features[positions[start : start + len(block)].to(device)] = block
+        return cls(centroids, list_offsets, list_ids.to(device), list_features)
+
+    def search(self, queries: torch.Tensor, k: int, nprobe: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Approximate top-k of `queries`. Returns the similarities and the indices of the neighbors,
+        padded with -inf and -1 when fewer than `k` features are found in the probed lists.
+        """
+        k = min(k, len(self))
+        nprobe = min(nprobe, self.num_lists)
+        queries = queries.float()
+        sims, indices = empty_topk(len(queries), k, queries.device)
+        probes = torch.mm(queries, self.centroids.T).topk(nprobe, dim=1).indices
+
+        # Group the (query, list) pairs by list, to scan each probed list once for all its queries
+        probed_lists, pair_order = probes.flatten().sort(stable=True)
+        pair_queries = pair_order // nprobe
+        unique_lists, counts = torch.unique_consecutive(probed_lists, return_counts=True)
+        compute_dtype = self.list_features.dtype if queries.is_cuda else torch.float32
+        pair_start = 0
+        for list_idx, count in zip(unique_lists.tolist(), counts.tolist()):
+            list_queries = pair_queries[pair_start : pair_start + count]
+            pair_start += count
+            start, end = self.list_offsets[list_idx], self.list_offsets[list_idx + 1]
+            if start == end:
+                continue
+            list_features = self.list_features[start:end].to(compute_dtype)
+            list_sims = torch.mm(queries[list_queries].to(compute_dtype), list_features.T).float()
+            list_sims, list_positions = list_sims.topk(min(k, end - start), dim=1)
+            sims[list_queries], indices[list_queries] = merge_topk(
+                sims[list_queries], indices[list_queries], list_sims, self.list_ids[start + list_positions], k
+            )
+        return sims, indices
+
+
+def recall_at_k(approximate_indices: torch.Tensor, exact_indices: torch.Tensor) -> Tuple[int, int]:
+    """Number of exact neighbors found by the approximate search, and number of exact neighbors"""
+    valid = exact_indices >= 0
+    found = (exact_indices[:, :, None] == approximate_indices[:, None, :]).any(dim=2) & valid
+    return int(found.sum()), int(valid.sum())
@@ -36,6 +36,13 @@ from dinov3.data.transforms import (
     make_classification_train_transform,
 )
 from dinov3.eval.data import create_train_dataset_dict, get_num_classes, pad_multilabel_and_collate
+from dinov3.eval.feature_bank import (
+    CLASS_TOKEN,
+    POOLED_PATCH_TOKENS,
+    FeatureBank,
+    FeatureBankConfig,
+    FeatureBankDataset,
+)
 from dinov3.eval.helpers import args_dict_to_dataclass, cli_parser, write_results
 from dinov3.eval.metrics import ClassificationMetricType, build_classification_metric
 from dinov3.eval.setup import ModelConfig, load_model_and_context
@@ -103,6 +110,8 @@ class TrainConfig:
     checkpoint_retention_policy: CheckpointRetentionPolicy = CheckpointRetentionPolicy.NONE  # keep checkpoints or not
     resume: bool = True  # whether to resume from existing checkpoints
     classifier_fpath: Optional[str] = None  # path to a file containing pretrained linear classifiers
+    # Extract the tokens once with the eval transform (no augmentation) and train on them instead of the backbone
+    precompute_features: bool = False
 
 
 @dataclass
@@ -133,6 +142,7 @@ class LinearEvalConfig:
     eval: EvalConfig = field(default_factory=EvalConfig)
     transform: TransformConfig = field(default_factory=TransformConfig)
     few_shot: FewShotConfig = field(default_factory=FewShotConfig)
+    feature_bank: FeatureBankConfig = field(default_factory=FeatureBankConfig)  # used with train.precompute_features
     save_results: bool = False  # save predictions and targets in the output directory
     output_dir: str = ""
 
@@ -191,6 +201,17 @@ class AllClassifiers(nn.Module):
         return len(self.classifiers_dict)
 
 
+class PrecomputedIntermediateLayers(nn.Module):
+    """Turns tokens read from a feature bank into the output format of `ModelWithIntermediateLayers`"""
+
+    def forward(self, tokens):
+        tokens = tokens.float()
+        return tuple(
+            (tokens[:, i, POOLED_PATCH_TOKENS, None], tokens[:, i, CLASS_TOKEN])  # average of a single patch token
+            for i in range(tokens.shape[1])
+        )
+
+
 class LinearPostprocessor(nn.Module):
     def __init__(self, linear_classifier, class_mapping=None):
         super().__init__()
@@ -249,6 +270,9 @@ def make_eval_data_loader(
     batch_size,
     num_workers,
     metric_type,
+    feature_bank: Optional[FeatureBank] = None,
+    model: Optional[nn.Module] = None,
+    n_last_blocks: int = 1,
 ):
     transform = make_eval_transform(transform_config)
     test_dataset = make_dataset(dataset_str=test_dataset_str, transform=transform)
@@ -257,6 +281,17 @@ def make_eval_data_loader(
     if hasattr(test_dataset, "get_imagenet_class_mapping"):
         class_mapping = test_dataset.get_imagenet_class_mapping()
 
+    if feature_bank is not None:
+        entry, _ = feature_bank.get_or_extract(
+            model,
+            test_dataset,
+            test_dataset_str,
+            batch_size=batch_size,
+            num_workers=num_workers,
+            n_last_blocks=n_last_blocks,
+        )
+        test_dataset = FeatureBankDataset(entry, n_last_blocks=n_last_blocks)
+
     test_data_loader = make_data_loader(
         dataset=DatasetWithEnumeratedTargets(test_dataset, pad_dataset=True, num_replicas=distributed.get_world_size()),
         batch_size=batch_size,
@@ -280,6 +315,10 @@ class Evaluator:
     metrics_file_path: str
     training_num_classes: int
     save_results_func: Optional[Callable]
+    # Evaluate on features read from a bank, extracted with `model` if missing
+    feature_bank: Optional[FeatureBank] = None
+    model: Optional[nn.Module] = None
+    n_last_blocks: int = 1
 
     def __post_init__(self):
         self.data_loader, self.class_mapping = make_eval_data_loader(
@@ -288,6 +327,9 @@ class Evaluator:
             num_workers=self.num_workers,
             transform_config=self.transform_config,
             metric_type=self.metric_type,
+            feature_bank=self.feature_bank,
+            model=self.model,
+            n_last_blocks=self.n_last_blocks,
         )
         self.main_metric_name = f"{self.dataset_str}_accuracy"
 
@@ -388,6 +430,9 @@ def make_evaluators(
     metrics_file_path: str,
     training_num_classes: int,
     save_results_func: Optional[Callable],
+    feature_bank: Optional[FeatureBank] = None,
+    model: Optional[nn.Module] = None,
+    n_last_blocks: int = 1,
 ):
     test_metric_types = eval_config.test_metric_types
     if len(test_metric_types) == 0:
@@ -404,6 +449,9 @@ def make_evaluators(
             metrics_file_path=metrics_file_path,
             training_num_classes=training_num_classes,
             save_results_func=save_results_func,
+            feature_bank=feature_bank,
+            model=model,
+            n_last_blocks=n_last_blocks,
         )
         for dataset_str, metric_type in zip(
             (val_dataset,) + tuple(eval_config.test_datasets),
@@ -588,7 +636,15 @@ def eval_linear_with_model(*, model: torch.nn.Module, autocast_dtype, config: Li
     start = time.time()
     cudnn.benchmark = True
 
-    train_dataset = make_train_dataset(config.train.dataset, config.transform)
+    feature_bank = None
+    if config.train.precompute_features:
+        feature_bank = FeatureBank(
+            config.feature_bank.root or os.path.join(config.output_dir, "feature_bank"),
+            max_size_gb=config.feature_bank.max_size_gb,
+        )
+        train_dataset = make_dataset(dataset_str=config.train.dataset, transform=make_eval_transform(config.transform))
+    else:
+        train_dataset = make_train_dataset(config.train.dataset, config.transform)
     training_num_classes = get_num_classes(train_dataset)
     train_dataset_dict = create_train_dataset_dict(
         train_dataset,
@@ -598,22 +654,40 @@ def eval_linear_with_model(*, model: torch.nn.Module, autocast_dtype, config: Li
     )
     n_last_blocks = max(config.train.n_last_blocks_list)
     autocast_ctx = partial(torch.autocast, device_type="cuda", enabled=True, dtype=autocast_dtype)
-    feature_model = ModelWithIntermediateLayers(model, n_last_blocks, autocast_ctx)
+    if feature_bank is not None:
+        with autocast_ctx():
+            for _try, dataset in train_dataset_dict.items():
+                entry, indices = feature_bank.get_or_extract(
+                    model,
+                    dataset,
+                    config.train.dataset,
+                    batch_size=config.eval.batch_size,
+                    num_workers=config.train.num_workers,
+                    n_last_blocks=n_last_blocks,
+                )
+                train_dataset_dict[_try] = FeatureBankDataset(entry, indices, n_last_blocks=n_last_blocks)
+        feature_model = PrecomputedIntermediateLayers()
+    else:
+        feature_model = ModelWithIntermediateLayers(model, n_last_blocks, autocast_ctx)
 
     save_results_func = None
     if config.save_results:
         save_results_func = partial(default_save_results_func, output_dir=config.output_dir)
 
     metrics_file_path = os.path.join(config.output_dir, "results_eval_linear.json")
-    val_evaluator, test_evaluators = make_evaluators(
-        eval_config=config.eval,
-        val_metric_type=config.train.val_metric_type,
-        val_dataset=config.train.val_dataset,
-        transform_config=config.transform,
-        metrics_file_path=metrics_file_path,
-        training_num_classes=training_num_classes,
-        save_results_func=save_results_func,
-    )
+    with autocast_ctx():  # for the extraction of the eval features with `feature_bank`
+        val_evaluator, test_evaluators = make_evaluators(
+            eval_config=config.eval,
+            val_metric_type=config.train.val_metric_type,
+            val_dataset=config.train.val_dataset,
+            transform_config=config.transform,
+            metrics_file_path=metrics_file_path,
+            training_num_classes=training_num_classes,
+            save_results_func=save_results_func,
+            feature_bank=feature_bank,
+            model=model,
+            n_last_blocks=n_last_blocks,
+        )
     results_dict = {}
     checkpoint_output_dirs: list = []
     for _try in train_dataset_dict.keys():
@@ -28,6 +28,12 @@ from dinov3.eval.data import (
     get_num_classes,
     split_train_val_datasets,
 )
+from dinov3.eval.feature_bank import (
+    FeatureBank,
+    FeatureBankConfig,
+    extract_features_for_dataset_dict_with_bank,
+    extract_features_with_bank,
+)
 from dinov3.eval.helpers import args_dict_to_dataclass, cli_parser, write_results
 from dinov3.eval.metrics import ClassificationMetricType, build_classification_metric
 from dinov3.eval.setup import ModelConfig, load_model_and_context
@@ -73,6 +79,9 @@ class TrainConfig:
     train_features_device: str = "cpu"  # device to gather train features (cpu, cuda, cuda:0, etc.)
     train_dtype: str = "float64"  # data type to convert the train features to
     max_train_iters: int = 1_000  # maximum number of train iterations in logistic regression
+    # "sklearn": one independent fit per C, "torch_path": warm-started path over the values of C, fitted in torch
+    solver: str = "sklearn"
+    path_patience: int = 8  # with "torch_path", stop walking the path after this many values of C without improvement
 
 
 @dataclass
@@ -103,6 +112,7 @@ class LogregEvalConfig:
     eval: EvalConfig = field(default_factory=EvalConfig)
     transform: TransformConfig = field(default_factory=TransformConfig)
     few_shot: FewShotConfig = field(default_factory=FewShotConfig)
+    feature_bank: FeatureBankConfig = field(default_factory=FeatureBankConfig)
     save_results: bool = False  # save predictions and targets in the output directory
     output_dir: str = ""
 
@@ -142,6 +152,67 @@ class LogRegModule(nn.Module):
         self.estimator.fit(train_features, train_labels)
 
 
+class TorchLogRegModule(nn.Module):
+    """
+    L2-regularized logistic regression with the objective of scikit-learn's LogisticRegression
+    (one-vs-rest for multi-label targets), fitted with L-BFGS on any device. Successive fits
+    start from the previous solution.
+    """
+
+    def __init__(self, num_features: int, num_classes: int, multi_label=False, logreg_config=TrainConfig):
+        super().__init__()
+        self.dtype = as_torch_dtype(logreg_config.train_dtype)
+        self.device = torch.device(logreg_config.train_features_device)
+        self.multi_label = multi_label
+        self.max_iter = logreg_config.max_train_iters
+        self.tol = logreg_config.tol
+        self.weight = torch.zeros(num_classes, num_features, dtype=self.dtype, device=self.device)
+        self.bias = torch.zeros(num_classes, dtype=self.dtype, device=self.device)
+
+    def forward(self, samples, targets):
+        samples_device = samples.device
+        logits = torch.addmm(self.bias, samples.to(dtype=self.dtype, device=self.device), self.weight.T)
+        probas = logits.sigmoid() if self.multi_label else logits.softmax(dim=-1)
+        return {"preds": probas.to(samples_device), "target": targets}
+
+    def fit(self, train_features, train_labels, C: float) -> int:
+        features = train_features.to(dtype=self.dtype, device=self.device)
+        if self.multi_label:
+            labels = train_labels.to(dtype=self.dtype, device=self.device)
+        else:
+            labels = train_labels.to(dtype=torch.long, device=self.device)
+        # sklearn minimizes C * sum(losses) + ||W||^2 / 2, divided here by C * n for a better conditioning
+        penalty = 1.0 / (2.0 * C * features.shape[0])
+        weight = self.weight.clone().requires_grad_(True)
+        bias = self.bias.clone().requires_grad_(True)
+        optimizer = torch.optim.LBFGS(
+            [weight, bias],
+            lr=1,
+            max_iter=self.max_iter,
+            tolerance_grad=self.tol,
+            tolerance_change=self.tol,
+            history_size=10,
+            line_search_fn="strong_wolfe",
+        )
+
+        def closure():
+            optimizer.zero_grad()
+            logits = torch.addmm(bias, features, weight.T)
+            if self.multi_label:
+                loss = nn.functional.binary_cross_entropy_with_logits(logits, labels, reduction="sum") / len(labels)
+            else:
+                loss = nn.functional.cross_entropy(logits, labels)
+            loss = loss + penalty * weight.square().sum()
+            loss.backward()
+            return loss
+
+        with torch.inference_mode(False), torch.enable_grad():
+            optimizer.step(closure)
+        self.weight = weight.detach()
+        self.bias = bias.detach()
+        return optimizer.state[weight]["n_iter"]
+
+
 def evaluate_logreg_model(*, logreg_model, test_metric, test_data_loader, save_results_func=None):
     key = "metrics"  # We need only one key as we have only one metric
     postprocessors, metrics = {key: logreg_model}, {key: test_metric}
@@ -220,6 +291,62 @@ def sweep_C_values(
     return best_stats, best_C
 
 
+def sweep_C_path(
+    *,
+    train_features,
+    train_labels,
+    val_features,
+    val_labels,
+    val_metric,
+    logreg_config: TrainConfig,
+):
+    """
+    Each rank walks a contiguous range of the values of C from strong to weak regularization,
+    warm-starting each fit from the previous one, and evaluates on the val set locally. A range
+    is cut short once `path_patience` values of C in a row do not improve on the best one.
+    Only the best C and the corresponding weights are exchanged between ranks.
+    """
+    ALL_C = 10**C_POWER_RANGE
+    multi_label = len(train_labels.shape) > 1
+    num_classes = train_labels.shape[1] if multi_label else int(max(train_labels.max(), val_labels.max())) + 1
+    logreg_model = TorchLogRegModule(
+        train_features.shape[1], num_classes, multi_label=multi_label, logreg_config=logreg_config
+    )
+    val_features = val_features.to(logreg_model.device)
+    val_labels = val_labels.to(logreg_model.device)
+
+    best_score, best_C, best_state = -float("inf"), None, None
+    n_without_improvement = 0
+    for C in ALL_C.tensor_split(get_world_size())[get_rank()].tolist():
+        if n_without_improvement >= logreg_config.path_patience:
+            logger.info(f"No improvement for {n_without_improvement} values of C, stopping at C = {C:.4g}")
+            break
+        n_iter = logreg_model.fit(train_features, train_labels, C)
+        metric = val_metric.clone().to(logreg_model.device)
+        metric.update(**logreg_model(val_features, val_labels))
+        evals = metric.compute()
+        logger.info(f"Trained for C = {C:.4g} in {n_iter} iterations, accuracies = {evals}")
+        score = evals["top-1"].item()
+        if score > best_score:
+            best_score, best_C = score, C
+            best_state = (logreg_model.weight.cpu(), logreg_model.bias.cpu())
+            n_without_improvement = 0
+        else:
+            n_without_improvement += 1
+
+    # Ties are broken in favor of the strongest regularization, as in `sweep_C_values`
+    candidates: List[Any] = [None for _ in range(get_world_size())]
+    torch.distributed.all_gather_object(candidates, (best_score, best_C))
+    best_rank = min(range(len(candidates)), key=lambda r: (-candidates[r][0], candidates[r][1]))
+    best_score, best_C = candidates[best_rank]
+    state = [best_state]
+    torch.distributed.broadcast_object_list(state, src=best_rank)
+    logreg_model.weight = state[0][0].to(logreg_model.device)
+    logreg_model.bias = state[0][1].to(logreg_model.device)
+    logger.info(f"Sweep best top-1 {100.0 * best_score:.4g}, best C = {best_C:.4g}")
+    return logreg_model, best_C
+
+
 def make_logreg_data_loader(batch_size: int, num_workers: int, features: torch.Tensor, labels: torch.Tensor):
     return make_data_loader(
         dataset=DatasetWithEnumeratedTargets(
@@ -243,6 +370,21 @@ def get_best_logreg_with_features(
     concatenate_train_val: bool,
     train_config: TrainConfig,
 ):
+    if train_config.solver == "torch_path":
+        logreg_model, best_C = sweep_C_path(
+            train_features=train_features,
+            train_labels=train_labels,
+            val_features=val_features,
+            val_labels=val_labels,
+            val_metric=val_metric,
+            logreg_config=train_config,
+        )
+        if concatenate_train_val:
+            logger.info("Best parameter found, training final model on concatenated features")
+            logreg_model.fit(torch.cat((train_features, val_features)), torch.cat((train_labels, val_labels)), best_C)
+        return logreg_model
+
+    assert train_config.solver == "sklearn", f"Unknown logistic regression solver {train_config.solver}"
     val_data_loader = make_logreg_data_loader(
         train_config.batch_size, train_config.num_workers, val_features, val_labels
     )
@@ -302,15 +444,22 @@ def make_train_val_datasets(train_config: TrainConfig, few_shot_config: FewShotC
     return train_dataset_dict, val_dataset, num_classes
 
 
-def make_test_dataset_and_data_loader(model, config: EvalConfig, transform, gather_on_cpu: bool):
+def make_test_dataset_and_data_loader(
+    model, config: EvalConfig, transform, gather_on_cpu: bool, feature_bank: FeatureBank | None = None
+):
     test_dataset = make_dataset(
         dataset_str=config.test_dataset,
         transform=transform,
         target_transform=get_target_transform(config.test_dataset),
     )
-    test_features, test_labels = extract_features(
-        model, test_dataset, config.batch_size, config.num_workers, gather_on_cpu=gather_on_cpu
-    )
+    if feature_bank is not None:
+        test_features, test_labels = extract_features_with_bank(
+            feature_bank, model, test_dataset, config.test_dataset, config.batch_size, config.num_workers
+        )
+    else:
+        test_features, test_labels = extract_features(
+            model, test_dataset, config.batch_size, config.num_workers, gather_on_cpu=gather_on_cpu
+        )
     assert isinstance(config.batch_size, int)  # eval batch size has been replaced by train batch size if None
     test_data_loader = make_logreg_data_loader(config.batch_size, config.num_workers, test_features, test_labels)
     return test_dataset, test_data_loader
@@ -335,16 +484,47 @@ def eval_log_regression_with_model(*, model: torch.nn.Module, autocast_dtype, co
     train_dataset_dict, val_dataset, num_classes = make_train_val_datasets(config.train, config.few_shot, transform)
 
     # Extracting features
+    feature_bank = FeatureBank.from_config(config.feature_bank)
     with torch.autocast("cuda", dtype=autocast_dtype):
         gather_on_cpu = torch.device(config.train.train_features_device) == _CPU_DEVICE
-        train_data_dict = extract_features_for_dataset_dict(
-            model, train_dataset_dict, config.train.batch_size, config.train.num_workers, gather_on_cpu=gather_on_cpu
-        )
-        logger.info("Choosing hyperparameters on the val dataset")
-        val_features, val_labels = extract_features(
-            model, val_dataset, config.train.batch_size, config.train.num_workers, gather_on_cpu=gather_on_cpu
+        if feature_bank is not None:
+            features_device = torch.device(config.train.train_features_device)
+            train_data_dict = extract_features_for_dataset_dict_with_bank(
+                feature_bank,
+                model,
+                train_dataset_dict,
+                config.train.dataset,
+                config.train.batch_size,
+                config.train.num_workers,
+            )
+            train_data_dict = {
+                try_n: {k: v.to(features_device) for k, v in data.items()} for try_n, data in train_data_dict.items()
+            }
+            logger.info("Choosing hyperparameters on the val dataset")
+            val_features, val_labels = extract_features_with_bank(
+                feature_bank,
+                model,
+                val_dataset,
+                config.train.val_dataset or config.train.dataset,
+                config.train.batch_size,
+                config.train.num_workers,
+            )
+            val_features, val_labels = val_features.to(features_device), val_labels.to(features_device)
+        else:
+            train_data_dict = extract_features_for_dataset_dict(
+                model,
+                train_dataset_dict,
+                config.train.batch_size,
+                config.train.num_workers,
+                gather_on_cpu=gather_on_cpu,
+            )
+            logger.info("Choosing hyperparameters on the val dataset")
+            val_features, val_labels = extract_features(
+                model, val_dataset, config.train.batch_size, config.train.num_workers, gather_on_cpu=gather_on_cpu
+            )
+        test_dataset, test_data_loader = make_test_dataset_and_data_loader(
+            model, config.eval, transform, gather_on_cpu, feature_bank=feature_bank
         )
-        test_dataset, test_data_loader = make_test_dataset_and_data_loader(model, config.eval, transform, gather_on_cpu)
 
     # Moves the model to cpu in-place. Deleting the variable would only delete a reference and not free any space.
     model.cpu()  # all features are extracted, we won't use the backbone anymore
@@ -55,6 +55,7 @@ def make_inference(
     apply_horizontal_flip: bool = False,
     num_max_forward: int = 1,
     output_activation: Callable | None = None,
+    crop_batch_size: int = 1,
 ):
     """Make inference on a given image, and reverts horizontal flip TTA if applicable.
     If `inference_mode` = whole, one single prediction is made for the image.
@@ -78,6 +79,7 @@ def make_inference(
         output_activation (callable): Output activation to use on top of the predictions.
             - softmax is used when each pixel belongs to a single class (multiclass),
             - sigmoid is used when pixel can belong to multiple classes (multilabel). Defaults to None (identity).
+        crop_batch_size (int): number of crops forwarded at once with `inference_mode` = slide. Defaults to 1.
     Returns:
         Tensor: The segmentation results created from the input image.
     """
@@ -95,6 +97,7 @@ def make_inference(
                 crop_size=crop_size,
                 stride=stride,
                 num_max_forward=num_max_forward,
+                crop_batch_size=crop_batch_size,
             ),
             size=rescale_to,
             mode="bilinear",
@@ -122,6 +125,18 @@ def make_inference(
     return pred
 
 
+def _slide_crop_boxes(h_img: int, w_img: int, h_crop: int, w_crop: int, h_stride: int, w_stride: int):
+    h_grids = max(h_img - h_crop + h_stride - 1, 0) // h_stride + 1
+    w_grids = max(w_img - w_crop + w_stride - 1, 0) // w_stride + 1
+    boxes = []
+    for h_idx in range(h_grids):
+        for w_idx in range(w_grids):
+            y2 = min(h_idx * h_stride + h_crop, h_img)
+            x2 = min(w_idx * w_stride + w_crop, w_img)
+            boxes.append((max(y2 - h_crop, 0), max(x2 - w_crop, 0), y2, x2))
+    return boxes
+
+
 def slide_inference(
     inputs: torch.Tensor,
     segmentation_model: nn.Module,
@@ -130,10 +145,13 @@ def slide_inference(
     crop_size: Tuple = (512, 512),
     stride: Tuple = (341, 341),
     num_max_forward: int = 1,
+    crop_batch_size: int = 1,
 ):
     """Inference by sliding-window with overlap.
     If h_crop > h_img or w_crop > w_img, the small patch will be used to
     decode without padding.
+    Crops of all the images of the batch are forwarded `crop_batch_size` at a time, and the
+    predictions are accumulated on the device of `inputs`.
     Args:
         inputs (tensor): the tensor should have a shape NxCxHxW,
             which contains all images in the batch.
@@ -141,6 +159,9 @@ def slide_inference(
         n_output_channels (int): number of output channels
         crop_size (tuple): (h_crop, w_crop)
         stride (tuple): (h_stride, w_stride)
+        num_max_forward (int): maximum number of crops of an image over all ranks, the model is
+            run on dummy inputs so that each rank does the same number of forwards
+        crop_batch_size (int): number of crops per forward
     Returns:
         Tensor: The output results from model of each input image.
     """
@@ -149,33 +170,31 @@ def slide_inference(
     batch_size, C, h_img, w_img = inputs.shape
     if h_crop > h_img and w_crop > w_img:  # Meaning we are doing < 1.0 TTA
         h_crop, w_crop = min(h_img, w_img), min(h_img, w_img)
-    assert batch_size == 1  # As of now, the code assumes that a single image is passed at a time at inference time
-    h_grids = max(h_img - h_crop + h_stride - 1, 0) // h_stride + 1
-    w_grids = max(w_img - w_crop + w_stride - 1, 0) // w_stride + 1
-    preds = inputs.new_zeros((1, n_output_channels, h_img, w_img)).cpu()
-    count_mat = inputs.new_zeros((1, 1, h_img, w_img)).to(torch.int8).cpu()
-    for h_idx in range(h_grids):
-        for w_idx in range(w_grids):
-            y1 = h_idx * h_stride
-            x1 = w_idx * w_stride
-            y2 = min(y1 + h_crop, h_img)
-            x2 = min(x1 + w_crop, w_img)
-            y1 = max(y2 - h_crop, 0)
-            x1 = max(x2 - w_crop, 0)
-            crop_img = inputs[:, :, y1:y2, x1:x2]
-            crop_pred = segmentation_model.predict(crop_img, rescale_to=crop_img.shape[2:])
-            if decoder_head_type == "m2f":
-                mask_pred, mask_cls = crop_pred["pred_masks"], crop_pred["pred_logits"]
-                mask_cls = F.softmax(mask_cls, dim=-1)[..., :-1]
-                mask_pred = mask_pred.sigmoid()
-                crop_pred = torch.einsum("bqc,bqhw->bchw", mask_cls.to(torch.bfloat16), mask_pred.to(torch.bfloat16))
-                del mask_cls, mask_pred
-            preds += F.pad(crop_pred, (int(x1), int(preds.shape[-1] - x2), int(y1), int(preds.shape[-2] - y2))).cpu()
-            count_mat[:, :, y1:y2, x1:x2] += 1
-            del crop_img, crop_pred
+    boxes = _slide_crop_boxes(h_img, w_img, h_crop, w_crop, h_stride, w_stride)
+    preds = inputs.new_zeros((batch_size, n_output_channels, h_img, w_img), dtype=torch.float)
+    count_mat = inputs.new_zeros((1, 1, h_img, w_img), dtype=torch.float)
+    for y1, x1, y2, x2 in boxes:
+        count_mat[:, :, y1:y2, x1:x2] += 1
+
+    # All crops have the same size (h_crop and w_crop are clipped to the image size)
+    crops = [(i, box) for i in range(batch_size) for box in boxes]
+    num_forwards = 0
+    for start in range(0, len(crops), crop_batch_size):
+        batch_crops = crops[start : start + crop_batch_size]
+        crop_imgs = torch.stack([inputs[i, :, y1:y2, x1:x2] for i, (y1, x1, y2, x2) in batch_crops])
+        crop_preds = segmentation_model.predict(crop_imgs, rescale_to=crop_imgs.shape[2:])
+        if decoder_head_type == "m2f":
+            mask_pred, mask_cls = crop_preds["pred_masks"], crop_preds["pred_logits"]
+            mask_cls = F.softmax(mask_cls, dim=-1)[..., :-1]
+            mask_pred = mask_pred.sigmoid()
+            crop_preds = torch.einsum("bqc,bqhw->bchw", mask_cls.to(torch.bfloat16), mask_pred.to(torch.bfloat16))
+            del mask_cls, mask_pred
+        for crop_pred, (i, (y1, x1, y2, x2)) in zip(crop_preds, batch_crops):
+            preds[i, :, y1:y2, x1:x2] += crop_pred
+        num_forwards += 1
+        del crop_imgs, crop_preds
     # Optional buffer to ensure each gpu does the same number of operations for sharded models
-    for _ in range(h_grids * w_grids, num_max_forward):
+    for _ in range(num_forwards, -(-batch_size * num_max_forward // crop_batch_size)):
         dummy_input = inputs.new_zeros((1, C, h_crop, w_crop))
         _ = segmentation_model.predict(dummy_input, rescale_to=dummy_input.shape[2:])
-    assert (count_mat == 0).sum() == 0
     return preds / count_mat
@@ -3,12 +3,13 @@
 # This software may be used and distributed in accordance with
 # the terms of the DINOv3 License Agreement.
 
-from functools import partial
+from typing import Optional
 
 import torch
 
 from dinov3.eval.segmentation.models.backbone.dinov3_adapter import DINOv3_Adapter
 from dinov3.eval.segmentation.models.heads.mask2former_head import Mask2FormerHead
+from dinov3.utils import device_autocast
 
 
 BACKBONE_INTERMEDIATE_LAYERS = {
@@ -20,20 +21,23 @@ BACKBONE_INTERMEDIATE_LAYERS = {
 
 
 class FeatureDecoder(torch.nn.Module):
-    def __init__(self, segmentation_model: torch.nn.ModuleList, autocast_ctx):
+    def __init__(
+        self, segmentation_model: torch.nn.ModuleList, autocast_dtype: Optional[torch.dtype] = torch.bfloat16
+    ):
         super().__init__()
         self.segmentation_model = segmentation_model
-        self.autocast_ctx = autocast_ctx
+        # Mixed precision on the device of the inputs (CUDA, or CPU where supported), float32 if None
+        self.autocast_dtype = autocast_dtype
 
     def forward(self, inputs):
-        with self.autocast_ctx():
+        with device_autocast(inputs.device, self.autocast_dtype):
             for module in self.segmentation_model:
                 inputs = module.forward(inputs)
         return inputs
 
     def predict(self, inputs, rescale_to=(512, 512)):
         with torch.inference_mode():
-            with self.autocast_ctx():
+            with device_autocast(inputs.device, self.autocast_dtype):
                 out = self.segmentation_model[0](inputs)  # backbone forward
                 out = self.segmentation_model[1].predict(out, rescale_to=rescale_to)  # decoder head prediction
         return out
@@ -47,7 +51,6 @@ def build_segmentation_decoder(
     num_classes=150,
     autocast_dtype=torch.bfloat16,
 ):
-    autocast_ctx = partial(torch.autocast, device_type="cuda", enabled=True, dtype=autocast_dtype)
     if decoder_type == "m2f":
         backbone_model = DINOv3_Adapter(
             backbone_model,
@@ -77,6 +80,6 @@ def build_segmentation_decoder(
                 decoder,
             ]
         ),
-        autocast_ctx=autocast_ctx,
+        autocast_dtype=autocast_dtype,
     )
     return segmentation_model
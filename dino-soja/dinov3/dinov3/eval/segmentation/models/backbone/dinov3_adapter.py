@@ -13,6 +13,7 @@ import torch.utils.checkpoint as cp
 from functools import partial
 
 from dinov3.eval.segmentation.models.utils.ms_deform_attn import MSDeformAttn
+from dinov3.utils import device_autocast
 
 
 def drop_path(x, drop_prob: float = 0.0, training: bool = False):
@@ -419,7 +420,8 @@ class DINOv3_Adapter(nn.Module):
         H_toks, W_toks = x.shape[2] // self.patch_size, x.shape[3] // self.patch_size
         bs, C, h, w = x.shape
 
-        with torch.autocast("cuda", torch.bfloat16):
+        # The backbone runs in bf16 when the adapter runs in mixed precision
+        with device_autocast(x.device, torch.bfloat16, enabled=torch.is_autocast_enabled(x.device.type)):
             with torch.no_grad():
                 all_layers = self.backbone.get_intermediate_layers(
                     x, n=self.interaction_indexes, return_class_token=True
@@ -366,6 +366,7 @@ class MSDeformAttnPixelDecoder(nn.Module):
         self.lateral_convs = nn.ModuleList(lateral_convs[::-1])
         self.output_convs = nn.ModuleList(output_convs[::-1])
 
+    # On CPU, only the deformable attention is run in float32 under autocast, by MSDeformAttnFunction
     @autocast(device_type="cuda", enabled=False)
     def forward_features(self, features):
         srcs = []
@@ -26,6 +26,7 @@ except ImportError:
 class MSDeformAttnFunction(Function):
     @staticmethod
     @custom_fwd(device_type="cuda", cast_inputs=torch.float32)
+    @custom_fwd(device_type="cpu", cast_inputs=torch.float32)
     def forward(
         ctx, value, value_spatial_shapes, value_level_start_index, sampling_locations, attention_weights, im2col_step
     ):
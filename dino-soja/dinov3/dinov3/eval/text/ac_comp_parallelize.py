@@ -15,6 +15,8 @@ from torch.distributed.fsdp import register_fsdp_forward_method
 from torch.distributed.fsdp._fully_shard._fsdp_state import FSDPState
 from torch.utils.checkpoint import create_selective_checkpoint_contexts
 
+from dinov3.layers.block import configure_dynamo
+
 logger = logging.getLogger("dinov3")
 
 
@@ -92,6 +94,9 @@ def ac_compile_parallelize_and_init(
                     model.blocks[i] = _checkpointing_wrapper(b)
 
     # 2/ Compile blocks
+    if do_compile:
+        configure_dynamo()
+
     def compile_block(block: nn.Module) -> nn.Module:
         if do_compile:
             if use_cuda_graphs:
@@ -22,6 +22,7 @@ from dinov3.eval.text.tokenizer import get_tokenizer
 
 from dinov3.eval.text.ac_comp_parallelize import ac_compile_parallelize_and_init
 from dinov3.eval.text.dinotxt_model import DINOTxt, DINOTxtConfig
+from dinov3.layers.block import configure_dynamo
 
 logger = logging.getLogger("dinov3")
 
@@ -91,6 +92,7 @@ def compile_parallelize_and_init(
         logger.info("Wrap in DDP, compile and initialize the model")
         if do_compile:
             torch._dynamo.config.optimize_ddp = "ddp_optimizer"
+            configure_dynamo()
         replicate(model, device_mesh=world_mesh, bucket_cap_mb=100)
         if do_compile:
             model.compile()
@@ -17,6 +17,7 @@ from torchmetrics import Metric
 import dinov3.distributed as distributed
 from dinov3.data import DatasetWithEnumeratedTargets, SamplerType, make_data_loader
 from dinov3.eval.accumulators import NoOpAccumulator, ResultsAccumulator
+from dinov3.layers import convert_linears_to_int8
 from dinov3.logging import MetricLogger
 
 logger = logging.getLogger("dinov3")
@@ -76,10 +77,12 @@ def wrap_model(
 
 
 class ModelWithIntermediateLayers(nn.Module):
-    def __init__(self, feature_model, n_last_blocks, autocast_ctx):
+    def __init__(self, feature_model, n_last_blocks, autocast_ctx, int8: bool = False):
         super().__init__()
         self.feature_model = feature_model
         self.feature_model.eval()
+        if int8:  # CPU inference, the autocast context should then be a no-op
+            self.feature_model = convert_linears_to_int8(self.feature_model)
         self.n_last_blocks = n_last_blocks
         self.autocast_ctx = autocast_ctx
 
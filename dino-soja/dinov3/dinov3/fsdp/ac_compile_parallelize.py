@@ -16,6 +16,7 @@ from torch.distributed.fsdp import register_fsdp_forward_method
 from torch.distributed.fsdp._fully_shard._fsdp_state import FSDPState
 from torch.utils.checkpoint import create_selective_checkpoint_contexts
 
+from dinov3.layers.block import configure_dynamo
 from dinov3.utils import utils
 
 logger = logging.getLogger("dinov3")
@@ -99,6 +100,8 @@ def ac_compile_parallelize(
                 m.compile()
         return m
 
+    if cfg.train.compile:
+        configure_dynamo()
     map_modules_and_blocks(all_models, wrap_compile_block)
 
     # 3/ Wrap submodules with FSDP
@@ -3,16 +3,22 @@
 # This software may be used and distributed in accordance with
 # the terms of the DINOv3 License Agreement.
 
+import contextlib
+import logging
 import os
+import time
 from enum import Enum
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 from urllib.parse import urlparse
+from urllib.request import url2pathname
 from pathlib import Path
 
 import torch
 
 from .utils import DINOV3_BASE_URL
 
+logger = logging.getLogger("dinov3")
+
 
 class Weights(Enum):
     LVD1689M = "LVD1689M"
@@ -30,6 +36,68 @@ def convert_path_or_url_to_url(path: str) -> str:
     return Path(path).expanduser().resolve().as_uri()
 
 
+def _load_state_dict_from_url(url: str, check_hash: bool = False) -> Dict[str, torch.Tensor]:
+    """
+    Same as `torch.hub.load_state_dict_from_url`, but the checkpoint file is memory-mapped instead of
+    read into memory, and local files are used in place instead of being copied to the hub cache.
+    Checkpoints can also be safetensors files, as written by `dinov3.checkpointer.export`.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme == "file":
+        cached_file = url2pathname(parsed.path)
+    else:
+        filename = os.path.basename(parsed.path)
+        cached_file = os.path.join(torch.hub.get_dir(), "checkpoints", filename)
+        if not os.path.exists(cached_file):
+            os.makedirs(os.path.dirname(cached_file), exist_ok=True)
+            hash_prefix = None
+            if check_hash:
+                r = torch.hub.HASH_REGEX.search(filename)
+                hash_prefix = r.group(1) if r else None
+            torch.hub.download_url_to_file(url, cached_file, hash_prefix, progress=True)
+    if cached_file.endswith(".safetensors"):
+        try:
+            from safetensors.torch import load_file
+        except ImportError:
+            raise ImportError("Loading safetensors weights requires the safetensors package: pip install safetensors")
+        return load_file(cached_file, device="cpu")  # Memory-mapped as well
+    try:
+        return torch.load(cached_file, map_location="cpu", mmap=True)
+    except RuntimeError:  # Checkpoints in the legacy (non-zip) format cannot be memory-mapped
+        return torch.load(cached_file, map_location="cpu")
+
+
+def _load_pretrained_weights(model: torch.nn.Module, url: str, check_hash: bool = False) -> None:
+    """
+    Loads the checkpoint at `url` into `model`, built on the meta device: the tensors of the memory-mapped
+    checkpoint are assigned to the model without copies. Buffers not in the checkpoint (non-persistent)
+    are then materialized on CPU and computed by the `_init_weights` of their module, like RoPE periods.
+    """
+    start = time.perf_counter()
+    state_dict = _load_state_dict_from_url(url, check_hash=check_hash)
+    model_state_dict = model.state_dict()
+    for k, v in state_dict.items():
+        if k in model_state_dict and v.dtype != model_state_dict[k].dtype:
+            state_dict[k] = v.to(model_state_dict[k].dtype)
+    model.load_state_dict(state_dict, strict=True, assign=True)
+    for module in model.modules():
+        meta_buffers = [name for name, buffer in module.named_buffers(recurse=False) if buffer.is_meta]
+        for name in meta_buffers:
+            module._buffers[name] = torch.empty_like(module._buffers[name], device="cpu")
+        if meta_buffers:
+            module._init_weights()
+    logger.info(f"Loaded {url} in {time.perf_counter() - start:.1f}s, peak RSS {peak_rss_gb():.2f} GB")
+
+
+def peak_rss_gb() -> float:
+    """Peak resident set size of this process, NaN where it is not available"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float("nan")
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**20  # ru_maxrss is in KB on Linux
+
+
 def _make_dinov3_vit_model_arch(
     *,
     patch_size: int = 16,
@@ -92,6 +160,7 @@ def _make_dinov3_vit(
     weights: Union[Weights, str] = Weights.LVD1689M,
     hash: Optional[str] = None,
     check_hash: bool = False,
+    int8: bool = False,
     **kwargs,
 ):
     from ..models.vision_transformer import DinoVisionTransformer
@@ -123,7 +192,8 @@ def _make_dinov3_vit(
         mask_k_bias=mask_k_bias,
     )
     vit_kwargs.update(**kwargs)
-    model = DinoVisionTransformer(**vit_kwargs)
+    with torch.device("meta") if pretrained else contextlib.nullcontext():
+        model = DinoVisionTransformer(**vit_kwargs)
     if pretrained:
         if type(weights) is Weights and weights not in {Weights.LVD1689M, Weights.SAT493M}:
             raise ValueError(f"Unsupported weights for the backbone: {weights}")
@@ -137,10 +207,13 @@ def _make_dinov3_vit(
             )
         else:
             url = convert_path_or_url_to_url(weights)
-        state_dict = torch.hub.load_state_dict_from_url(url, map_location="cpu", check_hash=check_hash)
-        model.load_state_dict(state_dict, strict=True)
+        _load_pretrained_weights(model, url, check_hash=check_hash)
     else:
         model.init_weights()
+    if int8:  # Dynamic INT8 quantization of the linear layers, for CPU inference
+        from ..layers import convert_linears_to_int8
+
+        model = convert_linears_to_int8(model.eval())
     return model
 
 
@@ -181,7 +254,8 @@ def _make_dinov3_convnext(
         layer_scale_init_value=layer_scale_init_value,
     )
     model_kwargs.update(**kwargs)
-    model = ConvNeXt(**model_kwargs)
+    with torch.device("meta") if pretrained else contextlib.nullcontext():
+        model = ConvNeXt(**model_kwargs)
     if pretrained:
         if type(weights) is Weights and weights not in {Weights.LVD1689M, Weights.SAT493M}:
             raise ValueError(f"Unsupported weights for the backbone: {weights}")
@@ -193,8 +267,7 @@ def _make_dinov3_convnext(
             )
         else:
             url = convert_path_or_url_to_url(weights)
-        state_dict = torch.hub.load_state_dict_from_url(url, map_location="cpu")
-        model.load_state_dict(state_dict, strict=True)
+        _load_pretrained_weights(model, url)
     return model
 
 
@@ -333,13 +406,15 @@ def dinov3_vitl16(
     elif type(weights) is str:
         import re
 
-        pattern = r"-(.{8}).pth"
+        # Released checkpoints are recognized by their hash, other checkpoints (e.g. exported with
+        # dinov3.checkpointer.export) have tied norms unless untie_global_and_local_cls_norm=True is passed
+        pattern = r"-(.{8})\.(?:pth|safetensors)"
         matches = re.findall(pattern, weights)
-        if len(matches) != 1:
+        if len(matches) > 1:
             raise ValueError(f"Unexpected weights specification for the ViT-L backbone: {weights}")
-        hash = matches[0]
-        if hash == "eadcf0ff":
+        if matches and matches[0] == "eadcf0ff":
             untie_global_and_local_cls_norm = True
+    untie_global_and_local_cls_norm = kwargs.pop("untie_global_and_local_cls_norm", untie_global_and_local_cls_norm)
     kwargs["version"] = None
     return _make_dinov3_vit(
         img_size=224,
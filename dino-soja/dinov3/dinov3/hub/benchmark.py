@@ -0,0 +1,195 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This software may be used and distributed in accordance with
+# the terms of the DINOv3 License Agreement.
+
+"""
+Startup cost of the hub entry points, each measured in a fresh process.
+
+`startup` loads backbones and reports their import time, build time and peak RSS:
+
+    python -m dinov3.hub.benchmark startup dinov3_vits16=/path/to/dinov3_vits16.pth dinov3_vitl16
+    python -m dinov3.hub.benchmark startup --no-pretrained  # all the backbones, randomly initialized
+
+`imports` resolves entry points of hubconf.py under `python -X importtime` and fails if one of
+them imports modules it does not need, e.g. a backbone importing torchvision or the eval code:
+
+    python -m dinov3.hub.benchmark imports  # all the entry points
+
+The benchmarks of the inference features (int8, token merging, packing, dense heads autocast) are in
+`dinov3.benchmarks`.
+"""
+
+import argparse
+import json
+import multiprocessing
+import queue as queue_module
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+_REPO_ROOT = Path(__file__).resolve().parents[2]
+# Modules that only the heads (detection, segmentation, ...) need
+_BACKBONE_UNEXPECTED_MODULES = ("torchvision", "torch._dynamo", "dinov3.eval")
+
+
+def _backbone_entry_points() -> List[str]:
+    from dinov3.hub import backbones
+
+    return [name for name in dir(backbones) if name.startswith("dinov3_") and callable(getattr(backbones, name))]
+
+
+def _measure_startup(entry_point: str, weights: Optional[str], pretrained: bool, queue) -> None:
+    try:
+        start = time.perf_counter()
+        from dinov3.hub import backbones
+
+        import_s = time.perf_counter() - start
+        kwargs: Dict[str, Any] = {"pretrained": pretrained}
+        if weights is not None:
+            kwargs["weights"] = weights
+        start = time.perf_counter()
+        getattr(backbones, entry_point)(**kwargs)
+        build_s = time.perf_counter() - start
+        queue.put({"import_s": import_s, "build_s": build_s, "peak_rss_gb": backbones.peak_rss_gb()})
+    except Exception as e:
+        queue.put({"error": repr(e)})
+
+
+def benchmark_startup(entry_points: Dict[str, Optional[str]], pretrained: bool = True) -> Dict[str, Dict[str, float]]:
+    """Startup metrics of each entry point, with the given weights (None for the default ones)"""
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for entry_point, weights in entry_points.items():
+        queue = context.Queue()
+        process = context.Process(target=_measure_startup, args=(entry_point, weights, pretrained, queue))
+        process.start()
+        result = None
+        while result is None and process.is_alive():
+            try:
+                result = queue.get(timeout=1.0)
+            except queue_module.Empty:
+                pass
+        process.join()
+        if result is None:  # Killed, e.g. out of memory
+            result = {"error": f"exit code {process.exitcode}"}
+        results[entry_point] = result
+    return results
+
+
+def _hubconf_entry_points() -> Dict[str, str]:
+    """Entry points of hubconf.py, mapped to the module that defines them"""
+    completed = subprocess.run(
+        [sys.executable, "-c", "import hubconf, json; print(json.dumps(hubconf._ENTRY_POINTS))"],
+        cwd=_REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout)
+
+
+def _unexpected_modules(modules: List[str], hub_module: str) -> List[str]:
+    allowed_hub_modules = {"dinov3.hub", "dinov3.hub.backbones", "dinov3.hub.utils", hub_module}
+    unexpected = [m for m in modules if m.startswith("dinov3.hub.") and m not in allowed_hub_modules]
+    if hub_module == "dinov3.hub.backbones":
+        unexpected += [
+            m for m in modules if any(m == p or m.startswith(p + ".") for p in _BACKBONE_UNEXPECTED_MODULES)
+        ]
+    return unexpected
+
+
+def benchmark_imports(entry_points: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Import metrics of resolving each entry point of hubconf.py, mapped to its module: total
+    import time, import time of torch and list of the modules that the entry point should not import
+    """
+    line_pattern = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+    results = {}
+    for entry_point, hub_module in entry_points.items():
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import hubconf; hubconf.{entry_point}"],
+            cwd=_REPO_ROOT,
+            capture_output=True,
+            text=True,
+        )
+        if completed.returncode != 0:
+            error = completed.stderr.strip().splitlines()
+            results[entry_point] = {"error": error[-1] if error else f"exit code {completed.returncode}"}
+            continue
+        self_us, torch_us, modules = 0, 0, []
+        for match in line_pattern.finditer(completed.stderr):
+            self_us += int(match.group(1))
+            modules.append(match.group(4))
+            if match.group(4) == "torch":
+                torch_us = int(match.group(2))
+        results[entry_point] = {
+            "import_s": self_us / 1e6,
+            "torch_import_s": torch_us / 1e6,
+            "num_modules": len(modules),
+            "unexpected_modules": sorted(set(_unexpected_modules(modules, hub_module))),
+        }
+    return results
+
+
+def _main_imports(args) -> int:
+    entry_points = _hubconf_entry_points()
+    if args.entry_points:
+        entry_points = {name: entry_points[name] for name in args.entry_points}
+    results = benchmark_imports(entry_points)
+
+    failed = False
+    print(f"{'entry point':<40} {'import (s)':>10} {'torch (s)':>10} {'modules':>8}")
+    for name, metrics in results.items():
+        if "error" in metrics:
+            print(f"{name:<40} failed: {metrics['error']}")
+            failed = True
+            continue
+        print(
+            f"{name:<40} {metrics['import_s']:>10.2f} {metrics['torch_import_s']:>10.2f} {metrics['num_modules']:>8}"
+        )
+        if metrics["unexpected_modules"]:
+            print(f"    unexpected imports: {', '.join(metrics['unexpected_modules'])}")
+            failed = True
+    return 1 if failed else 0
+
+
+def _main_startup(args) -> int:
+    entry_points: Dict[str, Optional[str]] = {}
+    for entry_point in args.entry_points or _backbone_entry_points():
+        name, _, weights = entry_point.partition("=")
+        entry_points[name] = weights or None
+    results = benchmark_startup(entry_points, pretrained=not args.no_pretrained)
+
+    print(f"{'entry point':<24} {'import (s)':>10} {'build (s)':>10} {'peak RSS (GB)':>14}")
+    for name, metrics in results.items():
+        if "error" in metrics:
+            print(f"{name:<24} failed: {metrics['error']}")
+            continue
+        print(f"{name:<24} {metrics['import_s']:>10.2f} {metrics['build_s']:>10.2f} {metrics['peak_rss_gb']:>14.2f}")
+    return 0 if all("error" not in metrics for metrics in results.values()) else 1
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    startup_parser = subparsers.add_parser("startup", help="import time, build time and peak RSS of backbones")
+    startup_parser.add_argument(
+        "entry_points",
+        nargs="*",
+        help="backbone entry points, as NAME or NAME=WEIGHTS (path or URL), all the backbones by default",
+    )
+    startup_parser.add_argument("--no-pretrained", action="store_true", help="build randomly initialized models")
+    startup_parser.set_defaults(func=_main_startup)
+    imports_parser = subparsers.add_parser("imports", help="modules imported by the entry points of hubconf.py")
+    imports_parser.add_argument("entry_points", nargs="*", help="entry points, all of them by default")
+    imports_parser.set_defaults(func=_main_imports)
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
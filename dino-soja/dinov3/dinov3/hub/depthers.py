@@ -72,6 +72,7 @@ def _make_dinov3_dpt_depther(
     depth_range: Optional[Tuple[float, float]] = None,
     check_hash: bool = False,
     backbone_dtype: torch.dtype = torch.float32,
+    autocast_dtype: Optional[torch.dtype] = None,
     **kwargs,
 ):
     backbone: torch.nn.Module = _BACKBONE_DICT[backbone_name](
@@ -93,6 +94,7 @@ def _make_dinov3_dpt_depther(
         use_cls_token=_DPT_HEAD_CONFIG_DICT["use_cls_token"],
         head_type="dpt",
         encoder_dtype=backbone_dtype,
+        autocast_dtype=autocast_dtype,
         min_depth=min_depth,
         max_depth=max_depth,
         # DPTHead args
@@ -121,6 +123,7 @@ def dinov3_vit7b16_dd(
     backbone_weights: BackboneWeights | str = BackboneWeights.LVD1689M,
     check_hash: bool = False,
     backbone_dtype: torch.dtype = torch.float32,
+    autocast_dtype: Optional[torch.dtype] = None,
     **kwargs,
 ):
     return _make_dinov3_dpt_depther(
@@ -130,5 +133,6 @@ def dinov3_vit7b16_dd(
         backbone_weights=backbone_weights,
         check_hash=check_hash,
         backbone_dtype=backbone_dtype,
+        autocast_dtype=autocast_dtype,
         **kwargs,
     )
@@ -5,12 +5,14 @@
 
 import os
 from enum import Enum
+from typing import Optional
 
 import torch
 
 from dinov3.eval.detection.config import DetectionHeadConfig
 from dinov3.eval.detection.models.detr import PostProcess, build_model
 from dinov3.eval.detection.models.position_encoding import PositionEncoding
+from dinov3.utils import device_autocast
 
 from .backbones import Weights as BackboneWeights, dinov3_vit7b16, dinov3_vitl16plus, convert_path_or_url_to_url
 from .utils import DINOV3_BASE_URL
@@ -26,13 +28,17 @@ class DetectorWithProcessor(torch.nn.Module):
     a list of dicts with keys "scores", "labels" and "boxes" (format XYXY)
     """
 
-    def __init__(self, detector, postprocessor):
+    def __init__(self, detector, postprocessor, autocast_dtype: Optional[torch.dtype] = None):
         super().__init__()
         self.detector = detector
         self.postprocessor = postprocessor
+        # Mixed precision of the detector on the device of the inputs (CUDA, or CPU where supported)
+        self.autocast_dtype = autocast_dtype
 
     def forward(self, samples: list[torch.Tensor]):
-        outputs = self.detector(samples)
+        with device_autocast(samples[0].device, self.autocast_dtype):
+            outputs = self.detector(samples)
+        outputs["pred_logits"], outputs["pred_boxes"] = outputs["pred_logits"].float(), outputs["pred_boxes"].float()
         sizes_tensor = torch.tensor([sample.shape[1:] for sample in samples], device=samples[0].device)  # N * [3, H, W]
         return self.postprocessor(outputs, target_sizes=sizes_tensor, original_target_sizes=sizes_tensor)
 
@@ -44,6 +50,7 @@ def _make_dinov3_detector(
     detector_weights: str | DetectionWeights,
     backbone_weights: str | BackboneWeights,
     check_hash: bool = False,
+    autocast_dtype: Optional[torch.dtype] = None,
     **kwargs,
 ):
     detection_kwargs = dict(
@@ -110,7 +117,7 @@ def _make_dinov3_detector(
     detector.transformer.two_stage_num_proposals = detector.num_queries
 
     postprocessor = PostProcess(config.topk, config.reparam)
-    model = DetectorWithProcessor(detector=detector, postprocessor=postprocessor)
+    model = DetectorWithProcessor(detector=detector, postprocessor=postprocessor, autocast_dtype=autocast_dtype)
     return model
 
 
@@ -120,6 +127,7 @@ def dinov3_vit7b16_de(
     weights: DetectionWeights | str = DetectionWeights.COCO2017,
     backbone_weights: BackboneWeights | str = BackboneWeights.LVD1689M,
     check_hash: bool = False,
+    autocast_dtype: Optional[torch.dtype] = None,
     **kwargs,
 ):
     return _make_dinov3_detector(
@@ -128,5 +136,6 @@ def dinov3_vit7b16_de(
         detector_weights=weights,
         backbone_weights=backbone_weights,
         check_hash=check_hash,
+        autocast_dtype=autocast_dtype,
         **kwargs,
     )
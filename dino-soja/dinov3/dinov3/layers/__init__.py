@@ -3,11 +3,21 @@
 # This software may be used and distributed in accordance with
 # the terms of the DINOv3 License Agreement.
 
-from .attention import CausalSelfAttention, LinearKMaskedBias, SelfAttention
+from .attention import BlockDiagonalMask, CausalSelfAttention, LinearKMaskedBias, SelfAttention
 from .block import CausalSelfAttentionBlock, SelfAttentionBlock
 from .ffn_layers import Mlp, SwiGLUFFN
-from .fp8_linear import convert_linears_to_fp8
+from .int8_linear import convert_linears_to_int8
 from .layer_scale import LayerScale
 from .patch_embed import PatchEmbed
 from .rms_norm import RMSNorm
 from .rope_position_encoding import RopePositionEmbedding
+from .token_merging import TokenMerging
+
+
+def __getattr__(name: str):
+    # fp8_linear imports torch._dynamo, which takes seconds: only import it when fp8 is used
+    if name == "convert_linears_to_fp8":
+        from .fp8_linear import convert_linears_to_fp8
+
+        return convert_linears_to_fp8
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
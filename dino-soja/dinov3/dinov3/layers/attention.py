@@ -40,6 +40,44 @@ class LinearKMaskedBias(nn.Linear):
         return F.linear(input, self.weight, masked_bias)
 
 
+class BlockDiagonalMask:
+    """
+    Attention bias of sequences packed in a single one, of lengths `seqlens`: each token only attends to the
+    tokens of its sequence. The attention is computed with the varlen flash kernel on GPU in half precision,
+    otherwise only on the diagonal blocks, in batches of the sequences of the same length.
+    """
+
+    def __init__(self, seqlens: List[int], device=None) -> None:
+        self.seqlens = seqlens
+        self.cu_seqlens = torch.tensor([0] + seqlens, dtype=torch.int32, device=device).cumsum(0, dtype=torch.int32)
+        self.max_seqlen = max(seqlens)
+        # Indices of the tokens of the sequences of each length
+        starts = self.cu_seqlens[:-1].long()
+        self.token_indices_per_length = {}
+        for length in sorted(set(seqlens)):
+            same_length = torch.tensor([n == length for n in seqlens], device=device)
+            offsets = torch.arange(length, device=device)
+            self.token_indices_per_length[length] = (starts[same_length][:, None] + offsets).flatten()
+
+    def attention(self, q: Tensor, k: Tensor, v: Tensor) -> Tensor:
+        # q, k, v: [1, heads, T, D] where T = sum(seqlens)
+        assert q.shape[0] == 1 and q.shape[2] == self.cu_seqlens[-1]
+        if q.is_cuda and q.dtype in (torch.float16, torch.bfloat16):
+            from torch.nn.attention.varlen import varlen_attn
+
+            q, k, v = [t[0].transpose(0, 1) for t in (q, k, v)]  # [T, heads, D]
+            cu_seqlens, max_seqlen = self.cu_seqlens, self.max_seqlen
+            x = varlen_attn(q, k, v, cu_seqlens, cu_seqlens, max_seqlen, max_seqlen)
+            return x.transpose(0, 1)[None]
+        x = torch.empty_like(q)
+        for length, token_indices in self.token_indices_per_length.items():
+            # [heads, n * length, D] -> [n, heads, length, D]
+            q_l, k_l, v_l = [t[0][:, token_indices].unflatten(1, (-1, length)).transpose(0, 1) for t in (q, k, v)]
+            x_l = torch.nn.functional.scaled_dot_product_attention(q_l, k_l, v_l)
+            x[0][:, token_indices] = x_l.transpose(0, 1).flatten(1, 2)
+        return x
+
+
 class SelfAttention(nn.Module):
     def __init__(
         self,
@@ -104,7 +142,6 @@ class SelfAttention(nn.Module):
         return uncat_with_shapes(x_flat, shapes, num_tokens)
 
     def compute_attention(self, qkv: Tensor, attn_bias=None, rope=None) -> Tensor:
-        assert attn_bias is None
         B, N, _ = qkv.shape
         C = self.qkv.in_features
 
@@ -113,7 +150,12 @@ class SelfAttention(nn.Module):
         q, k, v = [t.transpose(1, 2) for t in [q, k, v]]
         if rope is not None:
             q, k = self.apply_rope(q, k, rope)
-        x = torch.nn.functional.scaled_dot_product_attention(q, k, v)
+        if isinstance(attn_bias, BlockDiagonalMask):  # Packed sequences
+            x = attn_bias.attention(q, k, v)
+        else:
+            if attn_bias is not None:  # Additive mask, e.g. the token sizes of proportional attention with ToMe
+                attn_bias = attn_bias.to(q.dtype)
+            x = torch.nn.functional.scaled_dot_product_attention(q, k, v, attn_mask=attn_bias)
         x = x.transpose(1, 2)
         return x.reshape([B, N, C])
 
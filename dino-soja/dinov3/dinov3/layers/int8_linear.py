@@ -0,0 +1,56 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This software may be used and distributed in accordance with
+# the terms of the DINOv3 License Agreement.
+
+import logging
+import warnings
+
+import torch
+from torch import nn
+
+from dinov3.layers.attention import LinearKMaskedBias, SelfAttention
+from dinov3.layers.ffn_layers import Mlp, SwiGLUFFN
+from dinov3.utils import named_replace
+
+logger = logging.getLogger("dinov3")
+
+# Linear layers quantized in each module, everything else (norms, RoPE, attention) stays in float
+INT8_LINEARS = {
+    SelfAttention: ("qkv", "proj"),
+    Mlp: ("fc1", "fc2"),
+    SwiGLUFFN: ("w1", "w2", "w3"),
+}
+
+
+def _fold_bias_mask(module: nn.Module) -> nn.Module:
+    # The bias mask of the keys is constant at inference: fold it into the bias to get a plain nn.Linear
+    if type(module) is not LinearKMaskedBias:
+        return module
+    new_module = nn.Linear(module.in_features, module.out_features, bias=module.bias is not None, device="meta")
+    new_module.weight = module.weight
+    if module.bias is not None:
+        new_module.bias = nn.Parameter(module.bias * module.bias_mask.to(module.bias.dtype), requires_grad=False)
+    return new_module
+
+
+@torch.no_grad()
+def convert_linears_to_int8(root_module: nn.Module) -> nn.Module:
+    """
+    Dynamic INT8 quantization of the linear layers of the attention and FFN modules, for CPU inference:
+    weights are quantized per output channel once, activations per tensor at each call. In place.
+    """
+    names = {
+        f"{module_name}.{linear_name}" if module_name else linear_name
+        for module_name, module in root_module.named_modules()
+        for linear_name in INT8_LINEARS.get(type(module), ())
+    }
+    assert len(names) > 0, "int8: no layer found to convert"
+    assert all(p.device.type == "cpu" for p in root_module.parameters()), "int8: quantized linears only run on CPU"
+    root_module = named_replace(lambda module, name: _fold_bias_mask(module) if name in names else module, root_module)
+    qconfig = torch.ao.quantization.per_channel_dynamic_qconfig
+    with warnings.catch_warnings():  # Deprecation of torch.ao.quantization, that has no replacement in PyTorch yet
+        warnings.simplefilter("ignore")
+        torch.ao.quantization.quantize_dynamic(root_module, {name: qconfig for name in names}, inplace=True)
+    logger.info(f"int8: quantized {len(names)} linear layers")
+    return root_module
@@ -4,6 +4,7 @@
 # the terms of the DINOv3 License Agreement.
 
 import math
+from collections import OrderedDict
 from typing import Literal
 
 import numpy as np
@@ -28,6 +29,7 @@ class RopePositionEmbedding(nn.Module):
         rescale_coords: float | None = None,
         dtype: torch.dtype | None = None,
         device: torch.device | None = None,
+        cache_size: int = 8,
     ):
         super().__init__()
         assert embed_dim % (4 * num_heads) == 0
@@ -52,12 +54,42 @@ class RopePositionEmbedding(nn.Module):
             torch.empty(D_head // 4, device=device, dtype=dtype),
             persistent=True,
         )
+        # Eval-mode (sin, cos) per (H, W, device, dtype), evicted in LRU order
+        self.cache_size = cache_size
+        self._cache: OrderedDict[tuple, tuple[Tensor, Tensor]] = OrderedDict()
+        self._cache_periods: tuple | None = None
         self._init_weights()
 
+    def clear_cache(self) -> None:
+        self._cache.clear()
+        self._cache_periods = None
+
     def forward(self, *, H: int, W: int) -> tuple[Tensor, Tensor]:
-        device = self.periods.device
-        dtype = self.dtype
-        dd = {"device": device, "dtype": dtype}
+        # Coords are randomly augmented in training, and the cache would only add graph breaks under compile
+        if self.training or self.cache_size <= 0 or torch.compiler.is_compiling():
+            return self._compute(H=H, W=W)
+
+        # Any in-place or reassigned update of periods (load_state_dict, .to(), _init_weights) invalidates the cache
+        periods_state = (self.periods.data_ptr(), self.periods._version)
+        if periods_state != self._cache_periods:
+            self._cache.clear()
+            self._cache_periods = periods_state
+
+        # Inference tensors cannot be saved for backward, so they are kept apart from the ones built outside
+        key = (H, W, self.periods.device, self.dtype, torch.is_inference_mode_enabled())
+        sincos = self._cache.get(key)
+        if sincos is None:
+            sincos = self._compute(H=H, W=W)
+            self._cache[key] = sincos
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        return sincos
+
+    def coords(self, *, H: int, W: int) -> Tensor:
+        """Coordinates of the patches of a H x W grid, in range [-1, +1], without augmentation: [HW, 2]"""
+        dd = {"device": self.periods.device, "dtype": self.dtype}
 
         # Prepare coords in range [-1, +1]
         if self.normalize_coords == "max":
@@ -75,7 +107,20 @@ class RopePositionEmbedding(nn.Module):
             raise ValueError(f"Unknown normalize_coords: {self.normalize_coords}")
         coords = torch.stack(torch.meshgrid(coords_h, coords_w, indexing="ij"), dim=-1)  # [H, W, 2]
         coords = coords.flatten(0, 1)  # [HW, 2]
-        coords = 2.0 * coords - 1.0  # Shift range [0, 1] to [-1, +1]
+        return 2.0 * coords - 1.0  # Shift range [0, 1] to [-1, +1]
+
+    def sincos(self, coords: Tensor) -> tuple[Tensor, Tensor]:
+        """(sin, cos) of coordinates [..., 2], e.g. positions of merged tokens: 2 * [..., D]"""
+        angles = 2 * math.pi * coords[..., None] / self.periods  # [..., 2, D//4]
+        angles = angles.flatten(-2, -1)  # [..., D//2]
+        angles = angles.tile(2)  # [..., D]
+        cos = torch.cos(angles)  # [..., D]
+        sin = torch.sin(angles)  # [..., D]
+        return (sin, cos)
+
+    def _compute(self, *, H: int, W: int) -> tuple[Tensor, Tensor]:
+        dd = {"device": self.periods.device, "dtype": self.dtype}
+        coords = self.coords(H=H, W=W)  # [HW, 2]
 
         # Shift coords by adding a uniform value in [-shift, shift]
         if self.training and self.shift_coords is not None:
@@ -96,17 +141,12 @@ class RopePositionEmbedding(nn.Module):
             rescale_hw = torch.empty(1, **dd).uniform_(rescale_min, rescale_max).exp()
             coords *= rescale_hw
 
-        # Prepare angles and sin/cos
-        angles = 2 * math.pi * coords[:, :, None] / self.periods[None, None, :]  # [HW, 2, D//4]
-        angles = angles.flatten(1, 2)  # [HW, D//2]
-        angles = angles.tile(2)  # [HW, D]
-        cos = torch.cos(angles)  # [HW, D]
-        sin = torch.sin(angles)  # [HW, D]
-
-        return (sin, cos)  # 2 * [HW, D]
+        return self.sincos(coords)  # 2 * [HW, D]
 
     def _init_weights(self):
         device = self.periods.device
+        if device.type == "meta":  # Computed once materialized, these ops import torch._dynamo on meta
+            return
         dtype = self.dtype
         if self.base is not None:
             periods = self.base ** (
@@ -119,3 +159,4 @@ class RopePositionEmbedding(nn.Module):
             periods = periods / base  # range [min_period / max_period, 1]
             periods = periods * self.max_period  # range [min_period, max_period]
         self.periods.data = periods
+        self.clear_cache()
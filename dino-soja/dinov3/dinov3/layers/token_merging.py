@@ -0,0 +1,79 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This software may be used and distributed in accordance with
+# the terms of the DINOv3 License Agreement.
+
+import torch
+import torch.nn.functional as F
+from torch import Tensor
+
+
+# Token merging (ToMe, https://arxiv.org/abs/2210.09461) between the blocks of a ViT, for inference.
+# Patch tokens are split alternately in two sets A and B, and the `r` tokens of A that are the most similar
+# to a token of B are averaged into it, weighted by the number of patches each token already holds.
+# Merged tokens keep the average coordinates of their patches, from which their RoPE is computed.
+# The class and storage tokens are never merged.
+class TokenMerging:
+    def __init__(self, x: Tensor, coords: Tensor, num_prefix_tokens: int) -> None:
+        B, N, _ = x.shape
+        num_patches = N - num_prefix_tokens
+        self.num_prefix_tokens = num_prefix_tokens
+        self.coords = coords.expand(B, num_patches, 2)  # [B, n, 2]
+        self.sizes = torch.ones(B, num_patches, 1, device=x.device)  # Number of patches in each token
+        # Index of the token holding each patch of the full grid
+        self.patch_to_token = torch.arange(num_patches, device=x.device).expand(B, num_patches)  # [B, num_patches]
+
+    @property
+    def num_tokens(self) -> int:
+        return self.sizes.shape[1]
+
+    def merge(self, x: Tensor, r: int) -> Tensor:
+        """Merges `r` patch tokens of `x`, at most half of them"""
+        r = min(r, self.num_tokens // 2)
+        if r <= 0:
+            return x
+        prefix, patches = x[:, : self.num_prefix_tokens], x[:, self.num_prefix_tokens :]
+        B, n, _ = patches.shape
+        metric = F.normalize(patches.float(), dim=-1)
+        scores = metric[:, ::2] @ metric[:, 1::2].transpose(1, 2)  # [B, n_a, n_b]
+        n_a = scores.shape[1]
+        best_scores, best_b = scores.max(dim=-1)  # [B, n_a]
+        order = best_scores.argsort(dim=-1, descending=True)
+        src_a, kept_a = order[:, :r], order[:, r:]  # Merged and kept tokens of A
+        dst_b = best_b.gather(1, src_a)  # [B, r]
+
+        def merge_sum(t: Tensor) -> Tensor:
+            t_a, t_b = t[:, ::2], t[:, 1::2]
+            c = t.shape[-1]
+            kept = t_a.gather(1, kept_a[..., None].expand(B, n_a - r, c))
+            src = t_a.gather(1, src_a[..., None].expand(B, r, c))
+            return torch.cat([kept, t_b.scatter_add(1, dst_b[..., None].expand(B, r, c), src)], dim=1)
+
+        sizes = merge_sum(self.sizes)
+        patches = (merge_sum(patches.float() * self.sizes) / sizes).to(x.dtype)
+        self.coords = (merge_sum(self.coords * self.sizes) / sizes).to(self.coords.dtype)
+
+        # New tokens are [kept tokens of A, tokens of B]
+        token_to_new_token = torch.empty(B, n, dtype=torch.long, device=x.device)
+        new_a = torch.empty(B, n_a, dtype=torch.long, device=x.device)
+        new_a.scatter_(1, kept_a, torch.arange(n_a - r, device=x.device).expand(B, n_a - r))
+        new_a.scatter_(1, src_a, n_a - r + dst_b)
+        token_to_new_token[:, ::2] = new_a
+        token_to_new_token[:, 1::2] = n_a - r + torch.arange(n - n_a, device=x.device)
+        self.patch_to_token = token_to_new_token.gather(1, self.patch_to_token)
+        self.sizes = sizes
+        return torch.cat([prefix, patches], dim=1)
+
+    def unmerge(self, x: Tensor) -> Tensor:
+        """Tokens of the full patch grid, each patch taking the features of the token that holds it"""
+        prefix, patches = x[:, : self.num_prefix_tokens], x[:, self.num_prefix_tokens :]
+        index = self.patch_to_token[..., None].expand(-1, -1, patches.shape[-1])
+        return torch.cat([prefix, patches.gather(1, index)], dim=1)
+
+    def size_bias(self) -> Tensor:
+        """
+        Attention bias [B, 1, 1, N] of proportional attention: a token holding s patches gets the attention
+        of s patches, by adding log(s) to its logits
+        """
+        prefix = torch.zeros(self.sizes.shape[0], self.num_prefix_tokens, device=self.sizes.device)
+        return torch.cat([prefix, self.sizes[..., 0].log()], dim=1)[:, None, None, :]
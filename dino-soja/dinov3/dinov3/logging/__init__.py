@@ -13,7 +13,7 @@ from termcolor import colored
 
 from dinov3.distributed import TorchDistributedEnvironment
 
-from dinov3.logging.helpers import MetricLogger, SmoothedValue
+from dinov3.logging.helpers import AsyncHostCopy, MetricLogger, SmoothedValue
 
 _LEVEL_COLORED_KWARGS = {
     logging.DEBUG: {"color": "green", "attrs": ["bold"]},
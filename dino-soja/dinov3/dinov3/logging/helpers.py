@@ -6,8 +6,11 @@
 import datetime
 import json
 import logging
+import threading
 import time
 from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
 
 import torch
 
@@ -16,18 +19,103 @@ import dinov3.distributed as distributed
 logger = logging.getLogger("dinov3")
 
 
+class AsyncHostCopy:
+    """
+    Copies tensors to pinned host memory without blocking the host,
+    `result` waits for the copy to be done.
+    """
+
+    def __init__(self, tensors: Dict[str, torch.Tensor | float]):
+        self.event = None
+        self.tensors = {}
+        for k, v in tensors.items():
+            v = torch.as_tensor(v).detach()
+            if v.is_cuda:
+                host = torch.empty(v.shape, dtype=v.dtype, pin_memory=True)
+                self.tensors[k] = host.copy_(v, non_blocking=True)
+                if self.event is None:
+                    self.event = torch.cuda.Event()
+            else:
+                self.tensors[k] = v.clone()
+        if self.event is not None:
+            self.event.record()
+
+    def result(self) -> Dict[str, torch.Tensor]:
+        if self.event is not None:
+            self.event.synchronize()
+        return self.tensors
+
+
 class MetricLogger(object):
-    def __init__(self, delimiter="\t", output_file=None):
+    """
+    With `async_reduce`, tensor metrics are summed on their device and only averaged over the
+    ranks of `process_group` every `print_freq` iterations of `log_every`. The reduced values
+    are copied to the host and recorded (and dumped to `output_file`) by a background thread,
+    so that the meters lag behind by up to `print_freq` iterations but the host never waits
+    on the device.
+    """
+
+    def __init__(self, delimiter="\t", output_file=None, async_reduce=False, process_group=None):
         self.meters = defaultdict(SmoothedValue)
         self.delimiter = delimiter
         self.output_file = output_file
+        self.async_reduce = async_reduce
+        self.process_group = process_group
+        self._lock = threading.Lock()
+        self._sums: Dict[str, torch.Tensor] = {}
+        self._counts: Dict[str, int] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1) if async_reduce else None
+        self._pending: Optional[Future] = None
 
     def update(self, **kwargs):
         for k, v in kwargs.items():
             if isinstance(v, torch.Tensor):
+                if self.async_reduce:
+                    v = v.detach().float().reshape(())
+                    self._sums[k] = self._sums[k] + v if k in self._sums else v
+                    self._counts[k] = self._counts.get(k, 0) + 1
+                    continue
                 v = v.item()
             assert isinstance(v, (float, int))
-            self.meters[k].update(v)
+            with self._lock:
+                self.meters[k].update(v)
+
+    def reduce_async(self, **dump_kwargs):
+        """
+        Averages the accumulated tensor metrics over the ranks and hands them to the background
+        thread, which also dumps the meters to `output_file` with `dump_kwargs`.
+        """
+        keys = list(self._sums.keys())
+        counts = [self._counts[k] for k in keys]
+        host_copy = None
+        if len(keys) > 0:
+            values = torch.stack([self._sums[k] for k in keys])
+            values = torch.cat([values, torch.tensor(counts, dtype=values.dtype).to(values.device)])
+            if distributed.is_enabled():
+                torch.distributed.all_reduce(values, group=self.process_group)
+            host_copy = AsyncHostCopy({"values": values})
+        self._sums, self._counts = {}, {}
+        self._pending = self._executor.submit(self._record_reduced, keys, counts, host_copy, dump_kwargs)
+
+    def _record_reduced(self, keys: List[str], counts: List[int], host_copy: Optional[AsyncHostCopy], dump_kwargs):
+        if host_copy is not None:
+            values = host_copy.result()["values"].tolist()
+            sums, counts_all_ranks = values[: len(keys)], values[len(keys) :]
+            with self._lock:
+                for k, total, count_all_ranks, count in zip(keys, sums, counts_all_ranks, counts):
+                    self.meters[k].update(total / count_all_ranks, num=count)
+        if dump_kwargs:
+            self.dump_in_output_file(**dump_kwargs)
+
+    def wait(self):
+        """Reduces the remaining tensor metrics and waits for the background thread"""
+        if not self.async_reduce:
+            return
+        if len(self._sums) > 0:
+            self.reduce_async()
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
 
     def __getattr__(self, attr):
         if attr in self.meters:
@@ -38,11 +126,13 @@ class MetricLogger(object):
 
     def __str__(self):
         loss_str = []
-        for name, meter in self.meters.items():
-            loss_str.append("{}: {}".format(name, str(meter)))
+        with self._lock:
+            for name, meter in self.meters.items():
+                loss_str.append("{}: {}".format(name, str(meter)))
         return self.delimiter.join(loss_str)
 
     def synchronize_between_processes(self):
+        self.wait()
         for meter in self.meters.values():
             meter.synchronize_between_processes()
 
@@ -57,7 +147,8 @@ class MetricLogger(object):
             iter_time=iter_time,
             data_time=data_time,
         )
-        dict_to_dump.update({k: v.median for k, v in self.meters.items()})
+        with self._lock:
+            dict_to_dump.update({k: v.median for k, v in self.meters.items()})
         with open(self.output_file, "a") as f:
             f.write(json.dumps(dict_to_dump) + "\n")
         pass
@@ -98,7 +189,10 @@ class MetricLogger(object):
             yield obj
             iter_time.update(time.time() - end)
             if i % print_freq == 0 or i == n_iterations - 1:
-                self.dump_in_output_file(iteration=i, iter_time=iter_time.avg, data_time=data_time.avg)
+                if self.async_reduce:
+                    self.reduce_async(iteration=i, iter_time=iter_time.avg, data_time=data_time.avg)
+                else:
+                    self.dump_in_output_file(iteration=i, iter_time=iter_time.avg, data_time=data_time.avg)
                 eta_seconds = iter_time.global_avg * (n_iterations - i)
                 eta_string = str(datetime.timedelta(seconds=int(eta_seconds)))
                 if torch.cuda.is_available():
@@ -127,6 +221,7 @@ class MetricLogger(object):
                     )
             i += 1
             end = time.time()
+        self.wait()
         total_time = time.time() - start_time
         total_time_str = str(datetime.timedelta(seconds=int(total_time)))
         s_it = total_time / n_iterations if n_iterations > 0 else 0
@@ -11,8 +11,6 @@ from typing import Union
 import torch
 import torch.nn as nn
 
-from dinov3.layers.fp8_linear import convert_linears_to_fp8
-
 from . import vision_transformer as vits
 
 logger = logging.getLogger("dinov3")
@@ -23,6 +21,8 @@ def init_fp8(model: nn.Module, args) -> nn.Module:
         logger.info("fp8 matmuls: OFF (disabled in config)")
         return model
     logger.info("fp8 matmuls: ON")
+    from dinov3.layers.fp8_linear import convert_linears_to_fp8
+
     # Multi-kernel makes Inductor auto-tune between a regular "streaming"-based
     # reduction kernel and a "persistent" reduction kernel. Since fp8 has some
     # multi-pass steps (e.g., first get amax, then scale), persistent kernels
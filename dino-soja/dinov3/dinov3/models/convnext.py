@@ -61,7 +61,7 @@ class Block(nn.Module):
         self.act = nn.GELU()
         self.pwconv2 = nn.Linear(4 * dim, dim)
         self.gamma = (
-            nn.Parameter(layer_scale_init_value * torch.ones((dim)), requires_grad=True)
+            nn.Parameter(torch.full((dim,), layer_scale_init_value), requires_grad=True)
             if layer_scale_init_value > 0
             else None
         )
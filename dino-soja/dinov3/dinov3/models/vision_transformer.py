@@ -11,7 +11,17 @@ import torch
 import torch.nn.init
 from torch import Tensor, nn
 
-from dinov3.layers import LayerScale, Mlp, PatchEmbed, RMSNorm, RopePositionEmbedding, SelfAttentionBlock, SwiGLUFFN
+from dinov3.layers import (
+    BlockDiagonalMask,
+    LayerScale,
+    Mlp,
+    PatchEmbed,
+    RMSNorm,
+    RopePositionEmbedding,
+    SelfAttentionBlock,
+    SwiGLUFFN,
+    TokenMerging,
+)
 from dinov3.utils import named_apply
 
 logger = logging.getLogger("dinov3")
@@ -219,19 +229,60 @@ class DinoVisionTransformer(nn.Module):
 
         return x, (H, W)
 
-    def forward_features_list(self, x_list: List[Tensor], masks_list: List[Tensor]) -> List[Dict[str, Tensor]]:
+    def _rope_sincos_list(self, hw_list: List[Tuple[int, int]]) -> List[Tuple[Tensor, Tensor] | None]:
+        if self.rope_embed is None:
+            return [None for _ in hw_list]
+        return [self.rope_embed(H=H, W=W) for H, W in hw_list]
+
+    def _forward_blocks_with_token_merging(
+        self, x: Tensor, H: int, W: int, blocks_to_take: Sequence[int], merge_ratio: float
+    ) -> List[Tensor]:
+        """
+        Inference with patch tokens merged between blocks, `merge_ratio` of them by the last block to take.
+        The outputs of the blocks to take are un-merged to the full patch grid.
+        """
+        assert not self.training, "Token merging is only supported in inference"
+        assert 0.0 <= merge_ratio < 1.0, f"Invalid merge ratio: {merge_ratio}"
+        last_block = max(blocks_to_take)
+        merging = TokenMerging(x, self.rope_embed.coords(H=H, W=W), num_prefix_tokens=self.n_storage_tokens + 1)
+        # Same number of tokens merged after each block
+        r = int(merging.num_tokens * merge_ratio / max(last_block, 1))
+        rope_sincos = self._rope_sincos_list([(H, W)])[0]
+        attn_bias = None
+        output = []
+        for i, blk in enumerate(self.blocks[: last_block + 1]):
+            x = blk(x, rope_sincos, attn_bias=attn_bias)
+            if i in blocks_to_take:
+                output.append(merging.unmerge(x))
+            if i < last_block and r > 0:
+                x = merging.merge(x, r)
+                sin, cos = self.rope_embed.sincos(merging.coords)  # [B, n, D] for the positions of the tokens
+                rope_sincos = (sin[:, None], cos[:, None])
+                attn_bias = merging.size_bias()  # Proportional attention
+        return output
+
+    def forward_features_list(
+        self, x_list: List[Tensor], masks_list: List[Tensor], merge_ratio: float = 0.0
+    ) -> List[Dict[str, Tensor]]:
         x = []
         rope = []
         for t_x, t_masks in zip(x_list, masks_list):
             t2_x, hw_tuple = self.prepare_tokens_with_masks(t_x, t_masks)
             x.append(t2_x)
             rope.append(hw_tuple)
-        for _, blk in enumerate(self.blocks):
-            if self.rope_embed is not None:
-                rope_sincos = [self.rope_embed(H=H, W=W) for H, W in rope]
-            else:
-                rope_sincos = [None for r in rope]
-            x = blk(x, rope_sincos)
+        if merge_ratio > 0.0:
+            last_block = len(self.blocks) - 1
+            x = [
+                self._forward_blocks_with_token_merging(t_x, H, W, [last_block], merge_ratio)[0]
+                for t_x, (H, W) in zip(x, rope)
+            ]
+        else:
+            # RoPE is computed once per forward, except in training where coords are re-augmented for every block
+            rope_sincos = self._rope_sincos_list(rope)
+            for i, blk in enumerate(self.blocks):
+                if i > 0 and self.training:
+                    rope_sincos = self._rope_sincos_list(rope)
+                x = blk(x, rope_sincos)
         all_x = x
         output = []
         for idx, (x, masks) in enumerate(zip(all_x, masks_list)):
@@ -260,22 +311,81 @@ class DinoVisionTransformer(nn.Module):
             )
         return output
 
-    def forward_features(self, x: Tensor | List[Tensor], masks: Optional[Tensor] = None) -> List[Dict[str, Tensor]]:
+    def _forward_features_pack(self, x_list: List[Tensor]) -> List[Dict[str, Tensor]]:
+        num_prefix_tokens = self.n_storage_tokens + 1
+        tokens, sin_list, cos_list = [], [], []
+        for image in x_list:
+            t_x, (H, W) = self.prepare_tokens_with_masks(image[None])
+            tokens.append(t_x[0])
+            sin, cos = self.rope_embed(H=H, W=W)
+            # No rotation of the class and storage tokens, at the start of each sequence
+            sin_list += [sin.new_zeros(num_prefix_tokens, sin.shape[-1]), sin]
+            cos_list += [cos.new_ones(num_prefix_tokens, cos.shape[-1]), cos]
+        seqlens = [len(t) for t in tokens]
+        x = torch.cat(tokens)[None]  # [1, sum(seqlens), D]
+        rope_sincos = (torch.cat(sin_list), torch.cat(cos_list))
+        attn_bias = BlockDiagonalMask(seqlens, device=x.device)
+        for blk in self.blocks:
+            x = blk(x, rope_sincos, attn_bias=attn_bias)
+        x = x[0]
+
+        x_norm = self.norm(x)
+        if self.untie_cls_and_patch_norms:
+            starts = attn_bias.cu_seqlens[:-1].long().repeat_interleave(torch.tensor(seqlens, device=x.device))
+            is_prefix = torch.arange(len(x), device=x.device) - starts < num_prefix_tokens
+            x_norm[is_prefix] = self.cls_norm(x[is_prefix])
+        return [
+            {
+                "x_norm_clstoken": t_x_norm[0],
+                "x_storage_tokens": t_x_norm[1:num_prefix_tokens],
+                "x_norm_patchtokens": t_x_norm[num_prefix_tokens:],
+                "x_prenorm": t_x,
+                "masks": None,
+            }
+            for t_x, t_x_norm in zip(x.split(seqlens), x_norm.split(seqlens))
+        ]
+
+    def forward_features_packed(self, x_list: List[Tensor], max_tokens: int = 16384) -> List[Dict[str, Tensor]]:
+        """
+        Inference on images of different sizes, each [3, H, W], without padding: their tokens are packed in sequences
+        of at most `max_tokens` tokens (or a single image), that go through the blocks with a block-diagonal attention
+        and the RoPE of each image. Returns the outputs of `forward_features` of each image, without batch dimension.
+        """
+        assert not self.training, "Packed sequences are only supported in inference"
+        output: List[Dict[str, Tensor]] = []
+        pack: List[Tensor] = []
+        pack_tokens = 0
+        for image in x_list:
+            num_patches = (image.shape[-2] // self.patch_size) * (image.shape[-1] // self.patch_size)
+            num_tokens = self.n_storage_tokens + 1 + num_patches
+            if pack and pack_tokens + num_tokens > max_tokens:
+                output += self._forward_features_pack(pack)
+                pack, pack_tokens = [], 0
+            pack.append(image)
+            pack_tokens += num_tokens
+        if pack:
+            output += self._forward_features_pack(pack)
+        return output
+
+    def forward_features(
+        self, x: Tensor | List[Tensor], masks: Optional[Tensor] = None, merge_ratio: float = 0.0
+    ) -> List[Dict[str, Tensor]]:
         if isinstance(x, torch.Tensor):
-            return self.forward_features_list([x], [masks])[0]
+            return self.forward_features_list([x], [masks], merge_ratio=merge_ratio)[0]
         else:
-            return self.forward_features_list(x, masks)
+            return self.forward_features_list(x, masks, merge_ratio=merge_ratio)
 
-    def _get_intermediate_layers_not_chunked(self, x: Tensor, n: int = 1) -> List[Tensor]:
+    def _get_intermediate_layers_not_chunked(self, x: Tensor, n: int = 1, merge_ratio: float = 0.0) -> List[Tensor]:
         x, (H, W) = self.prepare_tokens_with_masks(x)
         # If n is an int, take the n last blocks. If it's a list, take them
         output, total_block_len = [], len(self.blocks)
         blocks_to_take = range(total_block_len - n, total_block_len) if isinstance(n, int) else n
+        if merge_ratio > 0.0:
+            return self._forward_blocks_with_token_merging(x, H, W, blocks_to_take, merge_ratio)
+        rope_sincos = self._rope_sincos_list([(H, W)])[0]
         for i, blk in enumerate(self.blocks):
-            if self.rope_embed is not None:
-                rope_sincos = self.rope_embed(H=H, W=W)
-            else:
-                rope_sincos = None
+            if i > 0 and self.training:
+                rope_sincos = self._rope_sincos_list([(H, W)])[0]
             x = blk(x, rope_sincos)
             if i in blocks_to_take:
                 output.append(x)
@@ -291,8 +401,9 @@ class DinoVisionTransformer(nn.Module):
         return_class_token: bool = False,
         return_extra_tokens: bool = False,
         norm: bool = True,
+        merge_ratio: float = 0.0,  # Fraction of the patch tokens merged by the last block to take (inference)
     ) -> Tuple[Union[torch.Tensor, Tuple[torch.Tensor, ...]]]:
-        outputs = self._get_intermediate_layers_not_chunked(x, n)
+        outputs = self._get_intermediate_layers_not_chunked(x, n, merge_ratio=merge_ratio)
         if norm:
             outputs_normed = []
             for out in outputs:
@@ -0,0 +1,231 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This software may be used and distributed in accordance with
+# the terms of the DINOv3 License Agreement.
+
+import atexit
+import contextlib
+import json
+import logging
+import os
+import statistics
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+import torch
+
+import dinov3.distributed as distributed
+
+logger = logging.getLogger("dinov3")
+
+_NULL_CONTEXT = contextlib.nullcontext()
+_STEP_PROFILER: Optional["StepProfiler"] = None
+# Host phases measured in the data loader workers: they overlap the training step instead of adding to it
+_CONCURRENT_PHASES = ("collate",)
+
+
+class _PhaseTimer:
+    """Device time of a phase with CUDA events, wall-clock time on CPU"""
+
+    def __init__(self) -> None:
+        self.use_cuda = torch.cuda.is_available()
+        if self.use_cuda:
+            self.start_event = torch.cuda.Event(enable_timing=True)
+            self.end_event = torch.cuda.Event(enable_timing=True)
+
+    def start(self) -> None:
+        if self.use_cuda:
+            self.start_event.record()
+        else:
+            self.start_time = time.perf_counter()
+
+    def stop(self) -> None:
+        if self.use_cuda:
+            self.end_event.record()
+        else:
+            self.end_time = time.perf_counter()
+
+    def elapsed_ms(self) -> float:
+        if self.use_cuda:
+            return self.start_event.elapsed_time(self.end_event)
+        return 1000 * (self.end_time - self.start_time)
+
+
+class StepProfiler:
+    """
+    Breaks the training steps from `start_iter` to `start_iter + num_iters` into phases.
+    Phases are marked with `phase(name)` (device time, measured with CUDA events) or reported
+    with `record(name, seconds)` (host time, e.g. waiting for data). At the end of the window,
+    a JSON summary of the phases and, with `with_trace`, a trace from `torch.profiler` viewable
+    in chrome://tracing or Perfetto are written to `output_dir` for each rank. If training stops
+    before the end of the window, `close()` writes them for the steps profiled so far.
+    """
+
+    def __init__(self, output_dir: str, start_iter: int = 20, num_iters: int = 20, with_trace: bool = True) -> None:
+        self.output_dir = output_dir
+        self.start_iter = start_iter
+        self.end_iter = start_iter + num_iters
+        self.with_trace = with_trace
+        self.active = False
+        self.done = False
+        self._steps: List[Dict[str, Any]] = []
+        self._step_timer: Optional[_PhaseTimer] = None
+        self._last_step_end: Optional[float] = None
+        self._torch_profiler = None
+
+    def start_step(self, iteration: int) -> None:
+        now = time.perf_counter()
+        data_wait = None if self._last_step_end is None else now - self._last_step_end
+        if self.done:
+            return
+        if not self.active and self.start_iter <= iteration < self.end_iter:
+            self._start()
+        if not self.active:
+            return
+        self._steps.append({"iteration": iteration, "timers": defaultdict(list), "host": defaultdict(float)})
+        if data_wait is not None:
+            self.record("data_wait", data_wait)
+        self._step_timer = _PhaseTimer()
+        self._step_timer.start()
+
+    def end_step(self) -> None:
+        if self.active:
+            self._step_timer.stop()
+            self._steps[-1]["step_timer"] = self._step_timer
+            if self._steps[-1]["iteration"] + 1 >= self.end_iter:
+                self._finish()
+        self._last_step_end = time.perf_counter()
+
+    def phase(self, name: str):
+        if not self.active:
+            return _NULL_CONTEXT
+        return self._phase(name)
+
+    @contextlib.contextmanager
+    def _phase(self, name: str):
+        timer = _PhaseTimer()
+        with torch.profiler.record_function(name):
+            timer.start()
+            try:
+                yield
+            finally:
+                timer.stop()
+        self._steps[-1]["timers"][name].append(timer)
+
+    def record(self, name: str, seconds: float) -> None:
+        if self.active:
+            self._steps[-1]["host"][name] += 1000 * seconds
+
+    def close(self) -> None:
+        """Ends profiling before the end of the window (short run, crash), keeping the completed steps"""
+        if not self.active:
+            return
+        if self._steps and "step_timer" not in self._steps[-1]:
+            self._steps.pop()
+        self._finish()
+
+    def _start(self) -> None:
+        logger.info(f"Profiling iterations {self.start_iter} to {self.end_iter - 1}")
+        self.active = True
+        atexit.register(self.close)
+        if self.with_trace:
+            self._torch_profiler = torch.profiler.profile(
+                activities=[torch.profiler.ProfilerActivity.CPU]
+                + ([torch.profiler.ProfilerActivity.CUDA] if torch.cuda.is_available() else []),
+                record_shapes=False,
+                with_stack=False,
+            )
+            self._torch_profiler.__enter__()
+
+    def _finish(self) -> None:
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        self.active = False
+        self.done = True
+        atexit.unregister(self.close)
+        rank = distributed.get_rank()
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self._torch_profiler is not None:
+            self._torch_profiler.__exit__(None, None, None)
+            trace_path = os.path.join(self.output_dir, f"trace_rank{rank}.json")
+            self._torch_profiler.export_chrome_trace(trace_path)
+            self._torch_profiler = None
+            logger.info(f"Profiling trace written to {trace_path}")
+        if not self._steps:
+            logger.info("Profiling stopped before the end of the first step, no summary written")
+            return
+
+        per_phase: Dict[str, List[float]] = defaultdict(list)
+        for step in self._steps:
+            step_ms = step["step_timer"].elapsed_ms()
+            per_phase["step"].append(step_ms)
+            phases_ms = 0.0
+            for name, timers in step["timers"].items():
+                phase_ms = sum(timer.elapsed_ms() for timer in timers)
+                per_phase[name].append(phase_ms)
+                phases_ms += phase_ms
+            per_phase["other"].append(max(step_ms - phases_ms, 0.0))
+            for name, ms in step["host"].items():
+                per_phase[name].append(ms)
+            per_phase["iteration"].append(step_ms + step["host"].get("data_wait", 0.0))
+        mean_iteration_ms = statistics.mean(per_phase["iteration"])
+        summary = {
+            "iterations": [step["iteration"] for step in self._steps],
+            "phases_ms": {
+                name: {
+                    "mean": statistics.mean(values),
+                    "median": statistics.median(values),
+                    "max": max(values),
+                    **(
+                        {"concurrent_with_step": True}
+                        if name in _CONCURRENT_PHASES
+                        else {"fraction_of_iteration": statistics.mean(values) / mean_iteration_ms}
+                    ),
+                }
+                for name, values in per_phase.items()
+            },
+        }
+        summary_path = os.path.join(self.output_dir, f"phases_rank{rank}.json")
+        with open(summary_path, "w") as f:
+            json.dump(summary, f, indent=2)
+        self._steps = []
+
+        lines = [
+            f"{name:>20}: {stats['mean']:9.2f} ms" + (" (in data loader workers)" if name in _CONCURRENT_PHASES else "")
+            for name, stats in summary["phases_ms"].items()
+        ]
+        logger.info("Mean time per phase:\n" + "\n".join(lines))
+        logger.info(f"Profiling summary written to {summary_path}")
+
+
+def set_step_profiler(profiler: Optional[StepProfiler]) -> None:
+    global _STEP_PROFILER
+    if _STEP_PROFILER is not None and _STEP_PROFILER is not profiler:
+        _STEP_PROFILER.close()
+    _STEP_PROFILER = profiler
+
+
+def get_step_profiler() -> Optional[StepProfiler]:
+    return _STEP_PROFILER
+
+
+def profile_phase(name: str):
+    """Marks a phase of the current training step for the step profiler, if there is one"""
+    if _STEP_PROFILER is None:
+        return _NULL_CONTEXT
+    return _STEP_PROFILER.phase(name)
+
+
+class TimedCollate:
+    """Adds the time spent in `collate_fn` to the collated batch, under `collate_time`"""
+
+    def __init__(self, collate_fn: Callable) -> None:
+        self.collate_fn = collate_fn
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        batch = self.collate_fn(*args, **kwargs)
+        if isinstance(batch, dict):
+            batch["collate_time"] = time.perf_counter() - start
+        return batch
@@ -14,13 +14,14 @@ from torch import Tensor, nn
 import dinov3.distributed as distributed
 from dinov3.checkpointer import init_fsdp_model_from_checkpoint
 from dinov3.configs import get_default_config
-from dinov3.data import DataAugmentationDINO
+from dinov3.data import DataAugmentationDINO, GPUDataAugmentationDINO
 from dinov3.fsdp.ac_compile_parallelize import ac_compile_parallelize
 from dinov3.layers.dino_head import DINOHead
 from dinov3.loss import DINOLoss, GramLoss, KoLeoLoss, KoLeoLossDistributed, iBOTPatchLoss
 from dinov3.models import build_model_from_cfg
 from dinov3.train.cosine_lr_scheduler import linear_warmup_cosine_decay
 from dinov3.train.param_groups import fuse_params_groups, get_params_groups_with_decay_fsdp
+from dinov3.train.profiler import profile_phase
 from dinov3.utils import count_parameters
 
 logger = logging.getLogger("dinov3")
@@ -376,32 +377,35 @@ class SSLMetaArch(nn.Module):
             gram_teacher_crops = None
 
         # Teacher output (will trigger an all-gather to unshard)
-        teacher_global = self.get_teacher_output(
-            global_crops.unflatten(0, (n_global_crops, B)),
-            teacher_temp=teacher_temp,
-            n_masked_patches_tensor=n_masked_patches_tensor,
-            mask_indices_list=mask_indices_list,
-            upperbound=data["upperbound"],
-        )
+        with profile_phase("teacher_forward"):
+            teacher_global = self.get_teacher_output(
+                global_crops.unflatten(0, (n_global_crops, B)),
+                teacher_temp=teacher_temp,
+                n_masked_patches_tensor=n_masked_patches_tensor,
+                mask_indices_list=mask_indices_list,
+                upperbound=data["upperbound"],
+            )
 
         # Student output (will trigger an all-gather to unshard)
-        student_global, student_local = self.get_student_output(
-            global_crops=global_crops.unflatten(0, (n_global_crops, B)),
-            local_crops=local_crops.unflatten(0, (n_local_crops, B)),
-            upperbound=data["upperbound"],
-            masks=masks,
-            mask_indices_list=mask_indices_list,
-        )
+        with profile_phase("student_forward"):
+            student_global, student_local = self.get_student_output(
+                global_crops=global_crops.unflatten(0, (n_global_crops, B)),
+                local_crops=local_crops.unflatten(0, (n_local_crops, B)),
+                upperbound=data["upperbound"],
+                masks=masks,
+                mask_indices_list=mask_indices_list,
+            )
 
         # Gram output
         if self.gram_use_loss:
-            gram_global = self.get_gram_teacher_output(
-                gram_teacher_crops.unflatten(0, (n_global_crops, B)) if gram_teacher_crops is not None else None,
-                masks=masks,
-                teacher_global=teacher_global,
-                student_global=student_global,
-                student_global_crops_size=global_crops.shape[-1],
-            )
+            with profile_phase("gram_teacher_forward"):
+                gram_global = self.get_gram_teacher_output(
+                    gram_teacher_crops.unflatten(0, (n_global_crops, B)) if gram_teacher_crops is not None else None,
+                    masks=masks,
+                    teacher_global=teacher_global,
+                    student_global=student_global,
+                    student_global_crops_size=global_crops.shape[-1],
+                )
         else:
             gram_global = {}
 
@@ -417,7 +421,8 @@ class SSLMetaArch(nn.Module):
             iteration=iteration,
         )
 
-        self.backprop_loss(loss_accumulator)
+        with profile_phase("backward"):
+            self.backprop_loss(loss_accumulator)
 
         # Return total weighted loss and a dict of metrics to log
         return loss_accumulator, metrics_dict | loss_dict
@@ -602,10 +607,11 @@ class SSLMetaArch(nn.Module):
         koleo_scale = n_global_crops
 
         # DINO local loss: compare post-head CLS tokens: student(local crops) vs. teacher(global crops)
-        dino_local_crops_loss = self.dino_loss(
-            student_logits=student_local["cls_after_head"],
-            teacher_probs=teacher_global["cls_centered"],
-        )
+        with profile_phase("dino_local_loss"):
+            dino_local_crops_loss = self.dino_loss(
+                student_logits=student_local["cls_after_head"],
+                teacher_probs=teacher_global["cls_centered"],
+            )
         loss_dict["dino_local_crops_loss"] = dino_local_crops_loss
 
         # Reweighting of DINO loss
@@ -618,37 +624,41 @@ class SSLMetaArch(nn.Module):
         loss_accumulator += self.dino_loss_weight * dino_local_scale * local_weight * dino_local_crops_loss
 
         # DINO global loss: compare post-head CLS tokens: student(global crops) vs. teacher(global crops)
-        dino_global_crops_loss = self.dino_loss(
-            student_logits=student_global["cls_after_head"],
-            teacher_probs=teacher_global["cls_centered"],
-            ignore_diagonal=self.dino_global_ignore_diagonal,
-        )
+        with profile_phase("dino_global_loss"):
+            dino_global_crops_loss = self.dino_loss(
+                student_logits=student_global["cls_after_head"],
+                teacher_probs=teacher_global["cls_centered"],
+                ignore_diagonal=self.dino_global_ignore_diagonal,
+            )
         loss_dict["dino_global_crops_loss"] = dino_global_crops_loss
         loss_accumulator += self.dino_loss_weight * dino_global_scale * dino_global_crops_loss
 
         # Koleo: regularize pre-head CLS tokens of student(global crops)
-        koleo_loss = sum(self.koleo_loss(x) for x in student_global["cls_pre_head"]) / n_global_crops
+        with profile_phase("koleo_loss"):
+            koleo_loss = sum(self.koleo_loss(x) for x in student_global["cls_pre_head"]) / n_global_crops
         loss_dict["koleo_loss"] = koleo_loss
         loss_accumulator += self.dino_koleo_loss_weight * koleo_scale * koleo_loss
 
         # IBOT loss
-        ibot_patch_loss = self.ibot_patch_loss.forward_masked(
-            student_global["masked_patch_after_head"],
-            teacher_global["masked_patch_centered"],
-            student_masks_flat=masks,
-            n_masked_patches=mask_indices_list.shape[0],
-            masks_weight=masks_weight,
-        )
+        with profile_phase("ibot_loss"):
+            ibot_patch_loss = self.ibot_patch_loss.forward_masked(
+                student_global["masked_patch_after_head"],
+                teacher_global["masked_patch_centered"],
+                student_masks_flat=masks,
+                n_masked_patches=mask_indices_list.shape[0],
+                masks_weight=masks_weight,
+            )
         loss_dict["ibot_loss"] = ibot_patch_loss
         loss_accumulator += self.ibot_loss_weight * ibot_patch_loss
 
         # Gram loss
         if self.gram_use_loss:
-            gram_loss = self.gram_loss(
-                gram_global["student_patches"],
-                gram_global["teacher_patches"],
-                img_level=self.gram_img_level,
-            )
+            with profile_phase("gram_loss"):
+                gram_loss = self.gram_loss(
+                    gram_global["student_patches"],
+                    gram_global["teacher_patches"],
+                    img_level=self.gram_img_level,
+                )
 
             if self.gram_loss_schedule is not None:
                 gram_loss_weight = self.gram_loss_schedule[iteration]
@@ -739,6 +749,22 @@ class SSLMetaArch(nn.Module):
             torch._foreach_add_(gramteacher_param_list, teacher_param_list, alpha=1 - m)
 
     def build_data_augmentation_dino(self, cfg):
+        if cfg.crops.gpu_augmentation:
+            return GPUDataAugmentationDINO(
+                cfg.crops.global_crops_scale,
+                cfg.crops.local_crops_scale,
+                cfg.crops.local_crops_number,
+                global_crops_size=cfg.crops.global_crops_size,
+                local_crops_size=cfg.crops.local_crops_size,
+                gram_teacher_crops_size=cfg.crops.gram_teacher_crops_size,
+                gram_teacher_no_distortions=cfg.crops.gram_teacher_no_distortions,
+                local_crops_subset_of_global_crops=cfg.crops.localcrops_subset_of_globalcrops,
+                share_color_jitter=cfg.crops.share_color_jitter,
+                horizontal_flips=cfg.crops.horizontal_flips,
+                mean=cfg.crops.rgb_mean,
+                std=cfg.crops.rgb_std,
+                raw_size=cfg.crops.gpu_raw_size,
+            )
         return DataAugmentationDINO(
             cfg.crops.global_crops_scale,
             cfg.crops.local_crops_scale,
@@ -19,6 +19,7 @@ from torch.distributed._tensor import DTensor
 
 import dinov3.distributed as distributed
 from dinov3.checkpointer import (
+    AsyncCheckpointSaver,
     find_latest_checkpoint,
     keep_checkpoint_copy,
     keep_last_n_checkpoints,
@@ -28,6 +29,8 @@ from dinov3.checkpointer import (
 )
 from dinov3.configs import setup_config, setup_job, setup_multidistillation
 from dinov3.data import (
+    GPUAugmentedDataLoader,
+    GPUDataAugmentationDINO,
     MaskingGenerator,
     SamplerType,
     collate_data_and_cast,
@@ -35,9 +38,10 @@ from dinov3.data import (
     make_dataset,
     CombinedDataLoader,
 )
-from dinov3.logging import MetricLogger, setup_logging
+from dinov3.logging import AsyncHostCopy, MetricLogger, setup_logging
 from dinov3.train.cosine_lr_scheduler import CosineScheduler, linear_warmup_cosine_decay
 from dinov3.train.multidist_meta_arch import MultiDistillationMetaArch
+from dinov3.train.profiler import StepProfiler, TimedCollate, get_step_profiler, profile_phase, set_step_profiler
 from dinov3.train.ssl_meta_arch import SSLMetaArch
 
 assert torch.__version__ >= (2, 1)
@@ -236,7 +240,7 @@ def apply_optim_scheduler(optimizer, lr, wd, last_layer_lr):
             param_group["lr"] = lr * lr_multiplier
 
 
-def do_test(cfg, model, iteration, process_group, do_low_freq=False):
+def do_test(cfg, model, iteration, process_group, do_low_freq=False, checkpoint_saver=None):
     # dump a sharded checkpoint
     eval_dir = Path(cfg.train.output_dir) / "eval" / str(iteration)
     if distributed.is_subgroup_main_process():
@@ -247,9 +251,16 @@ def do_test(cfg, model, iteration, process_group, do_low_freq=False):
             ckpt_path.mkdir(parents=True, exist_ok=True)
         torch.distributed.barrier()
         teacher_backbone = model.model_ema
-        save_checkpoint(
-            ckpt_dir=ckpt_path, iteration=iteration, model=teacher_backbone, overwrite=True, process_group=process_group
-        )
+        if checkpoint_saver is not None:
+            checkpoint_saver.save(ckpt_dir=ckpt_path, iteration=iteration, model=teacher_backbone, overwrite=True)
+        else:
+            save_checkpoint(
+                ckpt_dir=ckpt_path,
+                iteration=iteration,
+                model=teacher_backbone,
+                overwrite=True,
+                process_group=process_group,
+            )
         if not distributed.is_subgroup_main_process():
             return
     else:
@@ -261,8 +272,11 @@ def do_test(cfg, model, iteration, process_group, do_low_freq=False):
             return
         # save teacher checkpoint
         ckpt_path = eval_dir / "teacher_checkpoint.pth"
-        torch.save({"teacher": new_state_dict}, ckpt_path)
-        logger.info("Saved eval checkpoint: %s", ckpt_path)
+        if checkpoint_saver is not None:
+            checkpoint_saver.save_file({"teacher": new_state_dict}, ckpt_path)
+        else:
+            torch.save({"teacher": new_state_dict}, ckpt_path)
+            logger.info("Saved eval checkpoint: %s", ckpt_path)
 
 
 def build_data_loader_from_cfg(
@@ -303,13 +317,18 @@ def build_data_loader_from_cfg(
         random_circular_shift=cfg.ibot.mask_random_circular_shift,
         local_batch_size=local_batch_size,
     )
+    if get_step_profiler() is not None:
+        collate_fn = TimedCollate(collate_fn)
     batch_size = dataloader_batch_size_per_gpu
     num_workers = cfg.train.num_workers
     dataset_path = cfg.train.dataset_path
+    augmentation = model.build_data_augmentation_dino(cfg)
+    gpu_augmentation = isinstance(augmentation, GPUDataAugmentationDINO)
     dataset = make_dataset(
         dataset_str=dataset_path,
-        transform=model.build_data_augmentation_dino(cfg),
+        transform=augmentation,
         target_transform=lambda _: (),
+        decoded_cache_dir=cfg.train.decoded_cache_dir,
     )
 
     if isinstance(dataset, torch.utils.data.IterableDataset):
@@ -326,8 +345,11 @@ def build_data_loader_from_cfg(
         sampler_type=sampler_type,
         sampler_advance=start_iter * dataloader_batch_size_per_gpu,
         drop_last=True,
-        collate_fn=collate_fn,
+        collate_fn=augmentation.collate if gpu_augmentation else collate_fn,
     )
+    if gpu_augmentation:
+        # Workers only sample the crop parameters; crops are computed and collated batch-wise on the GPU
+        data_loader = GPUAugmentedDataLoader(data_loader, augmentation, collate_fn)
     return data_loader
 
 
@@ -379,7 +401,30 @@ def build_multi_resolution_data_loader_from_cfg(
     return data_loader
 
 
-def do_train(cfg, model, resume=False):
+def _check_nan_loss(cfg, consecutive_nan_count: int, losses: dict, metrics_description: str) -> int:
+    total_loss_all_ranks = losses.pop("total_loss_all_ranks")
+    if not total_loss_all_ranks.isnan().any():
+        return 0
+    consecutive_nan_count += 1
+    which_ranks = total_loss_all_ranks.isnan().nonzero().flatten().tolist()
+    logger.warning("NaN loss detected on ranks: %s", which_ranks)
+    logger.warning("Consecutive NaNs: %d", consecutive_nan_count)
+    metrics_dict_str = "\n".join([f"{k}: {v}" for k, v in losses.items()])
+    logger.warning("%s:\n%s", metrics_description, metrics_dict_str)
+    if consecutive_nan_count > 2 and not cfg.multidistillation.enabled:
+        msg = "Too many consecutive nans detected in loss, aborting..."
+        logger.error(msg)
+        raise RuntimeError(msg)
+    return consecutive_nan_count
+
+
+def _cleanup_checkpoints(cfg, ckpt_dir, iteration):
+    keep_last_n_checkpoints(ckpt_dir, cfg.checkpointing.max_to_keep)
+    if "keep_every" in cfg.checkpointing and (iteration + 1) % cfg.checkpointing.keep_every == 0:
+        keep_checkpoint_copy(ckpt_dir / str(iteration))
+
+
+def do_train(cfg, model, resume=False, profiling=False):
     process_subgroup = distributed.get_process_subgroup()
     ckpt_dir = Path(cfg.train.output_dir, "ckpt").expanduser()
     ckpt_dir.mkdir(parents=True, exist_ok=True)
@@ -420,6 +465,22 @@ def do_train(cfg, model, resume=False):
     else:
         global_batch_size = cfg.train.batch_size_per_gpu * distributed.get_world_size()
 
+    # Step profiler, set before building the data loader so that collate is timed
+    profiler = None
+    if profiling:
+        profiler = StepProfiler(
+            output_dir=os.path.join(cfg.train.output_dir, "profiling"),
+            start_iter=start_iter + cfg.profiling.warmup_iterations,
+            num_iters=cfg.profiling.num_iterations,
+            with_trace=cfg.profiling.trace,
+        )
+    set_step_profiler(profiler)
+
+    # Checkpoints are written in the background, training only stops to stage them to host memory
+    checkpoint_saver = None
+    if cfg.checkpointing.async_save:
+        checkpoint_saver = AsyncCheckpointSaver(process_group=process_subgroup)
+
     # Build data loader
     data_loader = build_multi_resolution_data_loader_from_cfg(
         cfg=cfg,
@@ -430,7 +491,13 @@ def do_train(cfg, model, resume=False):
     # Metric logging
     logger.info("Starting training from iteration %d", start_iter)
     metrics_file = os.path.join(cfg.train.output_dir, "training_metrics.json")
-    metric_logger = MetricLogger(delimiter="  ", output_file=metrics_file)
+    async_metrics = cfg.train.async_metrics
+    metric_logger = MetricLogger(
+        delimiter="  ",
+        output_file=metrics_file,
+        async_reduce=async_metrics,
+        process_group=distributed.get_process_subgroup(),
+    )
     # Manual garbage collection
     gc.disable()
     gc.collect()
@@ -451,6 +518,7 @@ def do_train(cfg, model, resume=False):
         num_gram_updates = math.ceil((start_iter + 1 - cfg.gram.it_first_update) / cfg.gram.update_frequency)
         logger.info(f"Gram was updated {num_gram_updates} times before iteration {start_iter}")
     consecutive_nan_count = 0
+    previous_losses = None  # with async_metrics, the NaN check of an iteration happens at the next one
     for data in metric_logger.log_every(
         data_loader,
         print_freq=10,
@@ -461,7 +529,10 @@ def do_train(cfg, model, resume=False):
         it = iteration
         data["global_batch_size"] = global_batch_size
         if iteration > max_iter:
-            return
+            break
+        if profiler is not None:
+            profiler.start_step(it)
+            profiler.record("collate", data.pop("collate_time", 0.0))
 
         # Garbage collection (trigger manually so it happens on all ranks at the same time)
         if (iteration + 1) % 150 == 0:
@@ -487,15 +558,14 @@ def do_train(cfg, model, resume=False):
         # Gradient clipping
         if cfg.optim.clip_grad:
             for k, v in student.items():
-                grad_norm = torch.nn.utils.clip_grad_norm_(
-                    v.parameters(),
-                    max_norm=cfg.optim.clip_grad,
-                )
-                metrics_dict[f"{k}_grad_norm"] = (
-                    grad_norm.full_tensor().item()
-                    if isinstance(grad_norm, torch.distributed.tensor.DTensor)
-                    else grad_norm.item()
-                )
+                with profile_phase("grad_clip"):
+                    grad_norm = torch.nn.utils.clip_grad_norm_(
+                        v.parameters(),
+                        max_norm=cfg.optim.clip_grad,
+                    )
+                if isinstance(grad_norm, torch.distributed.tensor.DTensor):
+                    grad_norm = grad_norm.full_tensor()
+                metrics_dict[f"{k}_grad_norm"] = grad_norm if async_metrics else grad_norm.item()
 
         # Reduce total_loss to check for NaNs, reduce metrics for logging
         total_loss_all_ranks = total_loss.new_empty(distributed.get_subgroup_size())
@@ -505,31 +575,38 @@ def do_train(cfg, model, resume=False):
             group=distributed.get_process_subgroup(),
         )
         total_loss = total_loss_all_ranks.mean()
-        metrics_values = torch.stack(
-            [torch.as_tensor(v, dtype=torch.float32, device=total_loss.device).detach() for v in metrics_dict.values()]
-        )
-        torch.distributed.all_reduce(
-            metrics_values,
-            op=torch.distributed.ReduceOp.AVG,
-            group=distributed.get_process_subgroup(),
-        )
-        metrics_dict = dict(zip(metrics_dict.keys(), metrics_values))
-        if total_loss_all_ranks.isnan().any():
-            consecutive_nan_count += 1
-            which_ranks = total_loss_all_ranks.isnan().nonzero().flatten().tolist()
-            logger.warning("NaN loss detected on ranks: %s", which_ranks)
-            logger.warning("Consecutive NaNs: %d", consecutive_nan_count)
-            metrics_dict_str = "\n".join([f"{k}: {v}" for k, v in metrics_dict.items()])
-            logger.warning("All-reduced metrics:\n%s", metrics_dict_str)
-            if consecutive_nan_count > 2 and not cfg.multidistillation.enabled:
-                msg = "Too many consecutive nans detected in loss, aborting..."
-                logger.error(msg)
-                raise RuntimeError(msg)
+        if async_metrics:
+            # Metrics are averaged over ranks by metric_logger. The losses of the previous iteration
+            # were copied to the host while this one was queued, checking them does not stall the device.
+            if previous_losses is not None:
+                consecutive_nan_count = _check_nan_loss(
+                    cfg, consecutive_nan_count, previous_losses.result(), metrics_description="Metrics of this rank"
+                )
+            previous_losses = AsyncHostCopy({"total_loss_all_ranks": total_loss_all_ranks, **metrics_dict})
         else:
-            consecutive_nan_count = 0
+            metrics_values = torch.stack(
+                [
+                    torch.as_tensor(v, dtype=torch.float32, device=total_loss.device).detach()
+                    for v in metrics_dict.values()
+                ]
+            )
+            torch.distributed.all_reduce(
+                metrics_values,
+                op=torch.distributed.ReduceOp.AVG,
+                group=distributed.get_process_subgroup(),
+            )
+            metrics_dict = dict(zip(metrics_dict.keys(), metrics_values))
+            consecutive_nan_count = _check_nan_loss(
+                cfg,
+                consecutive_nan_count,
+                {"total_loss_all_ranks": total_loss_all_ranks, **metrics_dict},
+                metrics_description="All-reduced metrics",
+            )
         # Step optimizer
-        optimizer.step()
-        model.update_ema(mom)
+        with profile_phase("optimizer"):
+            optimizer.step()
+        with profile_phase("ema_update"):
+            model.update_ema(mom)
 
         # [GRAM] Update gram teacher when using gram teacher and frequent updates
         if (
@@ -555,26 +632,50 @@ def do_train(cfg, model, resume=False):
             cfg.evaluation.eval_period_iterations > 0 and (iteration + 1) % cfg.evaluation.eval_period_iterations == 0
             # and iteration != max_iter - 1
         ):
-            do_test(cfg, model, f"training_{iteration}", process_group=process_subgroup)
+            do_test(
+                cfg,
+                model,
+                f"training_{iteration}",
+                process_group=process_subgroup,
+                checkpoint_saver=checkpoint_saver,
+            )
             torch.cuda.synchronize()
 
         # Checkpointing
         if (iteration + 1) % cfg.checkpointing.period == 0:
             torch.cuda.synchronize()
-            save_checkpoint(
-                ckpt_dir / str(iteration),
-                iteration=iteration,
-                model=model,
-                optimizer=optimizer,
-                overwrite=True,
-                process_group=process_subgroup,
-            )
-            if distributed.is_subgroup_main_process():
-                keep_last_n_checkpoints(ckpt_dir, cfg.checkpointing.max_to_keep)
-                if "keep_every" in cfg.checkpointing and (iteration + 1) % cfg.checkpointing.keep_every == 0:
-                    keep_checkpoint_copy(ckpt_dir / str(iteration))
+            on_commit = partial(_cleanup_checkpoints, cfg, ckpt_dir, iteration)
+            if checkpoint_saver is not None:
+                checkpoint_saver.save(
+                    ckpt_dir / str(iteration),
+                    iteration=iteration,
+                    model=model,
+                    optimizer=optimizer,
+                    overwrite=True,
+                    on_commit=on_commit,
+                )
+            else:
+                save_checkpoint(
+                    ckpt_dir / str(iteration),
+                    iteration=iteration,
+                    model=model,
+                    optimizer=optimizer,
+                    overwrite=True,
+                    process_group=process_subgroup,
+                )
+                if distributed.is_subgroup_main_process():
+                    on_commit()
 
+        if profiler is not None:
+            profiler.end_step()
         iteration = iteration + 1
+    if previous_losses is not None:  # NaN check of the last iteration
+        consecutive_nan_count = _check_nan_loss(
+            cfg, consecutive_nan_count, previous_losses.result(), metrics_description="Metrics of this rank"
+        )
+    set_step_profiler(None)
+    if checkpoint_saver is not None:
+        checkpoint_saver.close()
     metric_logger.synchronize_between_processes()
 
     return {k: meter.global_avg for k, meter in metric_logger.meters.items()}
@@ -630,7 +731,7 @@ def main(argv=None):
             + 1
         )
         return do_test(cfg, model, f"manual_{iteration}")
-    do_train(cfg, model, resume=not args.no_resume)
+    do_train(cfg, model, resume=not args.no_resume, profiling=args.profiling)
 
 
 if __name__ == "__main__":
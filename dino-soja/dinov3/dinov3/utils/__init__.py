@@ -3,7 +3,7 @@
 # This software may be used and distributed in accordance with
 # the terms of the DINOv3 License Agreement.
 
-from .dtype import as_torch_dtype
+from .dtype import as_torch_dtype, device_autocast, is_autocast_dtype_supported
 from .utils import (
     cat_keep_shapes,
     count_parameters,
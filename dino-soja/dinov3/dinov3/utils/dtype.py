@@ -3,7 +3,7 @@
 # This software may be used and distributed in accordance with
 # the terms of the DINOv3 License Agreement.
 
-from typing import Dict, Union
+from typing import Dict, Optional, Union
 
 import numpy as np
 import torch
@@ -33,3 +33,28 @@ def as_torch_dtype(dtype: TypeSpec) -> torch.dtype:
         dtype = np.dtype(dtype)
     assert isinstance(dtype, np.dtype), f"Expected an instance of nunpy dtype, got {type(dtype)}"
     return _NUMPY_TO_TORCH_DTYPE[dtype]
+
+
+def is_autocast_dtype_supported(device_type: str, dtype: torch.dtype) -> bool:
+    """Whether mixed precision in `dtype` is supported on `device_type`, e.g. bf16 on CPUs with AVX-512 or AMX"""
+    if dtype not in (torch.bfloat16, torch.float16):
+        return False
+    if device_type == "cuda":
+        return torch.cuda.is_available() and (dtype is torch.float16 or torch.cuda.is_bf16_supported())
+    if device_type == "cpu":
+        if not torch.backends.mkldnn.is_available():
+            return False
+        if dtype is torch.bfloat16:
+            return torch.ops.mkldnn._is_mkldnn_bf16_supported()
+        return torch.ops.mkldnn._is_mkldnn_fp16_supported()
+    return torch.amp.is_autocast_available(device_type)
+
+
+def device_autocast(device: Union[str, torch.device], dtype: Optional[torch.dtype], enabled: bool = True):
+    """
+    torch.autocast on the device type of `device` (e.g. the device of the inputs of a model), in `dtype`.
+    Disabled if `dtype` is None or float32, or if it is not supported on that device.
+    """
+    device_type = torch.device(device).type
+    enabled = enabled and dtype is not None and is_autocast_dtype_supported(device_type, dtype)
+    return torch.autocast(device_type, dtype=dtype if enabled else None, enabled=enabled)
@@ -3,24 +3,40 @@
 # This software may be used and distributed in accordance with
 # the terms of the DINOv3 License Agreement.
 
-from dinov3.hub.backbones import (
-    dinov3_convnext_base,
-    dinov3_convnext_large,
-    dinov3_convnext_small,
-    dinov3_convnext_tiny,
-    dinov3_vit7b16,
-    dinov3_vitb16,
-    dinov3_vith16plus,
-    dinov3_vitl16,
-    dinov3_vitl16plus,
-    dinov3_vits16,
-    dinov3_vits16plus,
-)
-from dinov3.hub.classifiers import dinov3_vit7b16_lc
-from dinov3.hub.detectors import dinov3_vit7b16_de
-from dinov3.hub.dinotxt import dinov3_vitl16_dinotxt_tet1280d20h24l
-from dinov3.hub.segmentors import dinov3_vit7b16_ms
-
-from dinov3.hub.depthers import dinov3_vit7b16_dd
+import importlib
 
 dependencies = ["torch", "numpy"]
+
+# Entry points are imported on first access, so that loading a backbone does not import the
+# detection, segmentation, depth and text code
+_ENTRY_POINTS = {
+    "dinov3_convnext_base": "dinov3.hub.backbones",
+    "dinov3_convnext_large": "dinov3.hub.backbones",
+    "dinov3_convnext_small": "dinov3.hub.backbones",
+    "dinov3_convnext_tiny": "dinov3.hub.backbones",
+    "dinov3_vit7b16": "dinov3.hub.backbones",
+    "dinov3_vitb16": "dinov3.hub.backbones",
+    "dinov3_vith16plus": "dinov3.hub.backbones",
+    "dinov3_vitl16": "dinov3.hub.backbones",
+    "dinov3_vitl16plus": "dinov3.hub.backbones",
+    "dinov3_vits16": "dinov3.hub.backbones",
+    "dinov3_vits16plus": "dinov3.hub.backbones",
+    "dinov3_vit7b16_lc": "dinov3.hub.classifiers",
+    "dinov3_vit7b16_de": "dinov3.hub.detectors",
+    "dinov3_vitl16_dinotxt_tet1280d20h24l": "dinov3.hub.dinotxt",
+    "dinov3_vit7b16_ms": "dinov3.hub.segmentors",
+    "dinov3_vit7b16_dd": "dinov3.hub.depthers",
+}
+
+
+def __getattr__(name: str):
+    if name not in _ENTRY_POINTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    entry_point = getattr(importlib.import_module(_ENTRY_POINTS[name]), name)
+    globals()[name] = entry_point
+    return entry_point
+
+
+def __dir__():
+    # torch.hub looks up entry points in dir(hubconf)
+    return sorted(set(globals()) | set(_ENTRY_POINTS))
@@ -0,0 +1,53 @@
+import sys
+import os
+import argparse
+
+# Análise de mudanças entre dois voos da mesma área
+# ========================================================================
+mmseg_local_path = '/home/lades/computer_vision/wesley/mae-soja/mmsegmentation'
+if mmseg_local_path not in sys.path:
+    sys.path.insert(0, mmseg_local_path)
+    print(f"✓ Usando mmsegmentation LOCAL: {mmseg_local_path}")
+
+from models.load import get_mmsegmentation_model
+from prediction.change_orthophoto import change_analysis, predict_tiles_mmseg
+from utils.autotune import autotune
+
+config_file = '/home/lades/computer_vision/wesley/mae-soja/models/modelo_final/mae-base_upernet_8xb2-amp-20k_daninhas-256x256.py'
+checkpoint_file = '/home/lades/computer_vision/wesley/mae-soja/models/modelo_final/iter_40000.pth'
+device = 'cuda:0'
+
+patch_size = 256
+step = patch_size // 2
+
+parser = argparse.ArgumentParser(description='Análise de mudanças entre dois voos de uma área')
+parser.add_argument('--anterior', required=True, help='Ortofoto do voo anterior (TIF)')
+parser.add_argument('--atual', required=True, help='Ortofoto do voo atual (TIF)')
+parser.add_argument('--shapefile', required=True, help='Shapefile dos talhões')
+parser.add_argument('--output', required=True, help='Diretório de saída')
+parser.add_argument('--cache', default='/home/lades/computer_vision/wesley/mae-soja/data/output/cache_tiles.sqlite',
+                    help='Cache de predições por tile (compartilhado entre voos e execuções)')
+parser.add_argument('--batch-size', type=int, default=None,
+                    help='Tamanho do lote (padrão: calibrado automaticamente no dispositivo)')
+parser.add_argument('--num-readers', type=int, default=None,
+                    help='Threads de leitura dos tiles (padrão: calibrado automaticamente no dispositivo)')
+args = parser.parse_args()
+
+model = get_mmsegmentation_model(config_file, checkpoint_file, device)
+
+# O cache é invalidado automaticamente se o checkpoint ou o tamanho do tile mudar
+model_tag = f'{checkpoint_file}:{os.path.getmtime(checkpoint_file)}:{patch_size}'
+
+tuning = {'batch_size': args.batch_size, 'num_readers': args.num_readers}
+if None in tuning.values():
+    tuned = autotune(predict_tiles_mmseg, model, os.path.basename(checkpoint_file), patch_size, device)
+    tuning = {k: tuned[k] if v is None else v for k, v in tuning.items()}
+
+print("---------------------------- Iniciando análise de mudanças ---------------------------- ")
+results = change_analysis(args.shapefile, args.anterior, args.atual, model, patch_size, step,
+                          args.output, args.cache, model_tag, batch_size=tuning['batch_size'],
+                          num_readers=tuning['num_readers'])
+
+cache_info = results['metadata']['cache']
+print(f"\n✅ Análise concluída: {args.output}")
+print(f"♻️ Tiles do cache: {cache_info['hits']} | inferidos: {cache_info['misses']}")
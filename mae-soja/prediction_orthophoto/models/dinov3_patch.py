@@ -0,0 +1,83 @@
+import pickle
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+# Mesma normalização usada no treino do classificador (foreground_segmentation_soja.ipynb)
+SATELLITE_MEAN = (0.430, 0.411, 0.296)
+SATELLITE_STD = (0.213, 0.156, 0.143)
+
+
+def load_patch_head(head_path, embed_dim):
+    # Aceita o LogisticRegression do sklearn salvo em .pkl (soja_foreground_classifier.pkl)
+    # ou um state dict {'weight': (C, D), 'bias': (C,)} de uma cabeça linear
+    if head_path.endswith('.pkl'):
+        with open(head_path, 'rb') as f:
+            clf = pickle.load(f)
+        coef = torch.as_tensor(clf.coef_, dtype=torch.float32)
+        intercept = torch.as_tensor(clf.intercept_, dtype=torch.float32)
+        if coef.shape[0] == 1:
+            # Binário: sigmoid(z) == softmax([0, z])[1]
+            coef = torch.cat([torch.zeros_like(coef), coef])
+            intercept = torch.cat([torch.zeros_like(intercept), intercept])
+        state = {'weight': coef, 'bias': intercept}
+    else:
+        state = torch.load(head_path, map_location='cpu')
+
+    if state['weight'].shape[1] != embed_dim:
+        raise ValueError(f"Cabeça {head_path} espera features de dimensão {state['weight'].shape[1]}, "
+                         f"mas o backbone gera features de dimensão {embed_dim}")
+    head = nn.Linear(embed_dim, state['weight'].shape[0])
+    head.load_state_dict(state)
+    return head
+
+
+class DinoV3PatchSegmenter(nn.Module):
+    # Backbone DINOv3 congelado + cabeça linear aplicada a cada x_norm_patchtokens.
+    # O grid de patches (H/16 x W/16) é reamostrado para a resolução do tile.
+
+    def __init__(self, backbone, head, mean=SATELLITE_MEAN, std=SATELLITE_STD):
+        super().__init__()
+        self.backbone = backbone
+        self.head = head
+        self.patch_size = backbone.patch_size
+        self.register_buffer('mean', torch.tensor(mean).view(1, 3, 1, 1) * 255, persistent=False)
+        self.register_buffer('std', torch.tensor(std).view(1, 3, 1, 1) * 255, persistent=False)
+
+    @property
+    def device(self):
+        return self.mean.device
+
+    @torch.inference_mode()
+    def forward(self, x):
+        # x: uint8 (B, H, W, 3) RGB -> probabilidades (B, C, H, W)
+        B, H, W, _ = x.shape
+        x = x.permute(0, 3, 1, 2).float()
+        x = (x - self.mean) / self.std
+
+        pad_h = (-H) % self.patch_size
+        pad_w = (-W) % self.patch_size
+        if pad_h or pad_w:
+            x = F.pad(x, (0, pad_w, 0, pad_h))
+        h, w = x.shape[2] // self.patch_size, x.shape[3] // self.patch_size
+
+        with torch.autocast(device_type=self.device.type, dtype=torch.float16, enabled=self.device.type == 'cuda'):
+            tokens = self.backbone.forward_features(x)['x_norm_patchtokens']
+        logits = self.head(tokens.float())
+        logits = logits.transpose(1, 2).reshape(B, -1, h, w)
+        logits = F.interpolate(logits, size=(h * self.patch_size, w * self.patch_size),
+                               mode='bilinear', align_corners=False)
+        return logits[:, :, :H, :W].softmax(dim=1)
+
+
+def predict_probs_dinov3(model, imgs):
+    batch = torch.from_numpy(np.stack(imgs)).to(model.device, non_blocking=True)
+    probs = model(batch)
+    return list(probs.cpu().numpy())
+
+
+def predict_tiles_dinov3(model, imgs):
+    batch = torch.from_numpy(np.stack(imgs)).to(model.device, non_blocking=True)
+    return list(model(batch).argmax(dim=1).to(torch.uint8).cpu().numpy())
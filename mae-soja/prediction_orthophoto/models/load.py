@@ -13,4 +13,17 @@ def get_mmsegmentation_model(config_file, checkpoint_file, device):
     
     # build the model from a config file and a checkpoint file
     model = init_model(config_file, checkpoint_file, device=device)
-    return model
\ No newline at end of file
+    return model
+
+def get_dinov3_patch_model(repo_dir, model_name, weights, head_path, device):
+    import torch
+    from models.dinov3_patch import DinoV3PatchSegmenter, load_patch_head
+
+    # Backbone carregado do repositório local do dinov3 (mesmo fluxo dos notebooks do dino-soja)
+    backbone = torch.hub.load(repo_dir, model_name, source='local', weights=weights)
+    head = load_patch_head(head_path, backbone.embed_dim)
+    print(f"✓ Carregando {model_name} + cabeça linear ({head.out_features} classes)")
+
+    model = DinoV3PatchSegmenter(backbone, head).to(device)
+    model.eval()
+    return model
@@ -0,0 +1,286 @@
+from utils.tif import AlignedReader, shared_grid, aligned_dataset, grid_positions, read_patches
+from utils.tile_cache import TileCache
+
+import json
+import os
+from datetime import datetime
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio.features import rasterize
+from tqdm import tqdm
+
+CLASS_NAMES = {
+    0: 'Background',
+    1: 'Gramínea Porte Alto',
+    2: 'Gramínea Porte Baixo',
+    3: 'Outras Folhas Largas',
+    4: 'Trepadeira'
+}
+
+# Categorias do raster de mudança (banda 1)
+SEM_MUDANCA = 0
+NOVA_INFESTACAO = 1
+DANINHA_ELIMINADA = 2
+TROCA_DANINHA = 3
+NODATA = 255
+
+
+def predict_tiles_mmseg(model, imgs):
+    # Import local: os engines alternativos (DINOv3) não dependem do mmseg
+    from mmseg.apis import inference_model
+
+    results = inference_model(model, [img[:, :, [2, 1, 0]] for img in imgs])
+    return [r.pred_sem_seg.data.cpu().numpy()[0].astype(np.uint8) for r in results]
+
+
+def rasterize_plots(gpd_talhoes, grid):
+    # ID do talhão (index + 1) por pixel da grade comum, 0 fora dos talhões
+    shapes = ((geom, i + 1) for i, geom in enumerate(gpd_talhoes.geometry) if geom is not None)
+    return rasterize(shapes, out_shape=(grid['height'], grid['width']),
+                     transform=grid['transform'], fill=0, dtype='int32')
+
+
+def predict_flight(dataset, plot_ids, model, cache, patch_size, step, batch_size=32,
+                   predict_fn=predict_tiles_mmseg, num_readers=1, open_fn=None):
+    height, width = plot_ids.shape
+    classes = np.zeros((height, width), dtype=np.uint8)
+    valid = np.zeros((height, width), dtype=bool)
+
+    rows = grid_positions(height, patch_size, step)
+    cols = grid_positions(width, patch_size, step)
+    pending = []
+
+    def paint(pred, img, row, col, r0, r1, c0, c1):
+        classes[r0:r1, c0:c1] = pred[r0-row:r1-row, c0-col:c1-col]
+        valid[r0:r1, c0:c1] = img[r0-row:r1-row, c0-col:c1-col].any(axis=2)
+
+    def flush():
+        preds = predict_fn(model, [p[1] for p in pending])
+        for (key, img, *window), pred in zip(pending, preds):
+            cache.put(key, pred)
+            paint(pred, img, *window)
+        pending.clear()
+        cache.commit()
+
+    # Só infere tiles cuja região útil cai dentro de algum talhão
+    windows = [(row, col, r0, r1, c0, c1) for row, r0, r1 in rows for col, c0, c1 in cols
+               if plot_ids[r0:r1, c0:c1].any()]
+
+    patches = read_patches(dataset, [w[:2] for w in windows], patch_size, num_readers, open_fn)
+    for window, img in tqdm(zip(windows, patches), total=len(windows)):
+        if img is None or not img.any():
+            continue
+
+        key = cache.key(img)
+        pred = cache.get(key)
+        if pred is not None:
+            paint(pred, img, *window)
+            continue
+
+        pending.append((key, img, *window))
+        if len(pending) >= batch_size:
+            flush()
+
+    if len(pending) > 0:
+        flush()
+
+    return classes, valid
+
+
+def plot_transitions(classes_a, classes_b, plot_ids, valid, num_classes, num_plots, rows_per_chunk=1024):
+    # Tabela cruzada (talhão, classe anterior, classe atual) com um único
+    # bincount por faixa de linhas; o índice 0 acumula pixels fora dos talhões
+    counts = np.zeros((num_plots + 1) * num_classes * num_classes, dtype=np.int64)
+    for r in range(0, plot_ids.shape[0], rows_per_chunk):
+        rs = slice(r, r + rows_per_chunk)
+        ids = np.where(valid[rs], plot_ids[rs], 0).astype(np.int64)
+        idx = (ids * num_classes + classes_a[rs]) * num_classes + classes_b[rs]
+        counts += np.bincount(idx.ravel(), minlength=counts.size)
+    return counts.reshape(num_plots + 1, num_classes, num_classes)
+
+
+def change_raster(classes_a, classes_b, valid, num_classes):
+    # Banda 1: categoria da mudança; banda 2: transição codificada como
+    # classe_anterior * num_classes + classe_atual
+    transition = classes_a.astype(np.uint8) * num_classes + classes_b
+    a, b = np.divmod(np.arange(num_classes * num_classes), num_classes)
+    lut = np.full(num_classes * num_classes, SEM_MUDANCA, dtype=np.uint8)
+    lut[(a == 0) & (b > 0)] = NOVA_INFESTACAO
+    lut[(a > 0) & (b == 0)] = DANINHA_ELIMINADA
+    lut[(a > 0) & (b > 0) & (a != b)] = TROCA_DANINHA
+
+    change = lut[transition]
+    change[~valid] = NODATA
+    transition[~valid] = NODATA
+    return np.stack([change, transition])
+
+
+def class_statistics(pixels_per_class, pixel_area_m2):
+    # Mesmo formato de calculate_area_statistics (ortofoto_inference_advanced)
+    total_pixels = pixels_per_class.sum()
+    statistics = {}
+    for class_id, count in enumerate(pixels_per_class):
+        if count == 0:
+            continue
+        area_m2 = count * pixel_area_m2
+        statistics[CLASS_NAMES.get(class_id, f'Classe {class_id}')] = {
+            'class_id': int(class_id),
+            'pixels': int(count),
+            'area_m2': float(area_m2),
+            'area_ha': float(area_m2 / 10000),
+            'percentage': float(count / total_pixels * 100)
+        }
+    return statistics
+
+
+def plot_deltas(matrix, pixel_area_m2):
+    pixels_a = matrix.sum(axis=1)
+    pixels_b = matrix.sum(axis=0)
+    total = max(int(matrix.sum()), 1)
+
+    variacao = {}
+    for class_id in range(matrix.shape[0]):
+        diff = int(pixels_b[class_id]) - int(pixels_a[class_id])
+        variacao[CLASS_NAMES.get(class_id, f'Classe {class_id}')] = {
+            'class_id': class_id,
+            'pixels': diff,
+            'area_ha': float(diff * pixel_area_m2 / 10000),
+            'percentage': float(diff / total * 100)
+        }
+
+    weeds = matrix[1:, 1:]
+    transitions = {
+        'nova_infestacao': int(matrix[0, 1:].sum()),
+        'daninha_eliminada': int(matrix[1:, 0].sum()),
+        'troca_daninha': int(weeds.sum() - np.trace(weeds)),
+    }
+    transicoes = {
+        name: {
+            'pixels': pixels,
+            'area_ha': float(pixels * pixel_area_m2 / 10000),
+            'percentage': float(pixels / total * 100)
+        }
+        for name, pixels in transitions.items()
+    }
+    transicoes['matriz'] = matrix.tolist()
+
+    return (class_statistics(pixels_a, pixel_area_m2), class_statistics(pixels_b, pixel_area_m2),
+            variacao, transicoes)
+
+
+def plot_attributes(row, columns):
+    info = {}
+    for col in columns:
+        if col == 'geometry' or not pd.notna(row[col]):
+            continue
+        value = row[col]
+        info[col] = value.item() if hasattr(value, 'item') else str(value)
+    return info
+
+
+def create_change_shapefile(gpd_talhoes, results, output_path):
+    # Colunas no mesmo padrão do shapefile de resultados por talhão
+    # ({classe}_ha / {classe}_pct do voo atual) mais as variações
+    results_gdf = gpd_talhoes.copy()
+    for class_id, class_name in CLASS_NAMES.items():
+        results_gdf[f'{class_name.replace(" ", "_")}_ha'] = 0.0
+        results_gdf[f'{class_name.replace(" ", "_")}_pct'] = 0.0
+        results_gdf[f'var_{class_id}_ha'] = 0.0
+        results_gdf[f'var_{class_id}_pct'] = 0.0
+    results_gdf['nova_inf'] = 0.0
+    results_gdf['eliminada'] = 0.0
+    results_gdf['troca'] = 0.0
+
+    for i, idx in enumerate(results_gdf.index):
+        talhao = results['talhoes'].get(f'talhao_{i:03d}')
+        if talhao is None:
+            continue
+        for class_name, data in talhao['estatisticas'].items():
+            results_gdf.loc[idx, f'{class_name.replace(" ", "_")}_ha'] = data['area_ha']
+            results_gdf.loc[idx, f'{class_name.replace(" ", "_")}_pct'] = data['percentage']
+        for data in talhao['variacao'].values():
+            results_gdf.loc[idx, f'var_{data["class_id"]}_ha'] = data['area_ha']
+            results_gdf.loc[idx, f'var_{data["class_id"]}_pct'] = data['percentage']
+        results_gdf.loc[idx, 'nova_inf'] = talhao['transicoes']['nova_infestacao']['percentage']
+        results_gdf.loc[idx, 'eliminada'] = talhao['transicoes']['daninha_eliminada']['percentage']
+        results_gdf.loc[idx, 'troca'] = talhao['transicoes']['troca_daninha']['percentage']
+
+    results_gdf.to_file(output_path)
+
+
+def change_analysis(shp_path, tif_path_a, tif_path_b, model, patch_size, step, output_dir,
+                    cache_path, model_tag, batch_size=32, num_classes=len(CLASS_NAMES),
+                    predict_fn=predict_tiles_mmseg, num_readers=1):
+    os.makedirs(output_dir, exist_ok=True)
+    cache = TileCache(cache_path, model_tag)
+
+    with rasterio.open(tif_path_a) as src_a, rasterio.open(tif_path_b) as src_b:
+        grid = shared_grid(src_a, src_b)
+        print(f"📐 Grade comum: {grid['width']} x {grid['height']} pixels")
+
+        gpd_talhoes = gpd.read_file(shp_path).to_crs(grid['crs'])
+        plot_ids = rasterize_plots(gpd_talhoes, grid)
+
+        flights = []
+        for name, src in (('anterior', src_a), ('atual', src_b)):
+            hits, misses = cache.hits, cache.misses
+            print(f"🛩️ Voo {name}: {src.name}")
+            with aligned_dataset(src, grid) as vrt:
+                # Cada thread de leitura abre a própria ortofoto e VRT alinhado
+                open_fn = lambda path=src.name: AlignedReader(path, grid)
+                flights.append(predict_flight(vrt, plot_ids, model, cache, patch_size, step,
+                                              batch_size, predict_fn, num_readers, open_fn))
+            print(f"   ♻️ Tiles reaproveitados do cache: {cache.hits - hits}, inferidos: {cache.misses - misses}")
+
+    (classes_a, valid_a), (classes_b, valid_b) = flights
+    valid = valid_a & valid_b
+
+    change_path = os.path.join(output_dir, 'mudancas.tif')
+    with rasterio.open(change_path, 'w', driver='GTiff', height=grid['height'], width=grid['width'],
+                       count=2, dtype='uint8', crs=grid['crs'], transform=grid['transform'],
+                       nodata=NODATA, tiled=True, compress='lzw') as dst:
+        dst.write(change_raster(classes_a, classes_b, valid, num_classes))
+        dst.set_band_description(1, 'mudanca')
+        dst.set_band_description(2, 'transicao')
+
+    counts = plot_transitions(classes_a, classes_b, plot_ids, valid, num_classes, len(gpd_talhoes))
+    pixel_area_m2 = abs(grid['transform'].a * grid['transform'].e)
+
+    results = {
+        'metadata': {
+            'ortofoto_anterior': str(tif_path_a),
+            'ortofoto_atual': str(tif_path_b),
+            'shapefile': str(shp_path),
+            'processamento': datetime.now().isoformat(),
+            'total_talhoes': len(gpd_talhoes),
+            'pixel_area_m2': pixel_area_m2,
+            'crs': str(grid['crs']),
+            'cache': {'hits': cache.hits, 'misses': cache.misses}
+        },
+        'talhoes': {}
+    }
+    cache.close()
+
+    for i, (idx, row) in enumerate(gpd_talhoes.iterrows()):
+        matrix = counts[i + 1]
+        if matrix.sum() == 0:
+            continue
+        stats_a, stats_b, variacao, transicoes = plot_deltas(matrix, pixel_area_m2)
+        talhao_info = {'index': i}
+        talhao_info.update(plot_attributes(row, gpd_talhoes.columns))
+        talhao_info['estatisticas'] = stats_b
+        talhao_info['estatisticas_anterior'] = stats_a
+        talhao_info['variacao'] = variacao
+        talhao_info['transicoes'] = transicoes
+        results['talhoes'][f'talhao_{i:03d}'] = talhao_info
+
+    with open(os.path.join(output_dir, 'mudancas_talhoes.json'), 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+
+    create_change_shapefile(gpd_talhoes, results, os.path.join(output_dir, 'mudancas_talhoes.shp'))
+
+    print(f"📊 Talhões com mudanças calculadas: {len(results['talhoes'])}/{len(gpd_talhoes)}")
+    return results
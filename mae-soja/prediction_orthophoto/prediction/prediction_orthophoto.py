@@ -1,4 +1,4 @@
-from utils.tif import get_image_patch
+from utils.tif import read_patches
 from utils.shp2img import get_img
 from utils.img2shp import polygons_from_binary_image
 
@@ -8,9 +8,16 @@ import rasterio
 import numpy as np
 from tqdm import tqdm
 import torch.nn.functional as F
-from mmseg.apis import inference_model
 
-def prediction_in_plot(gpd_talhoes, index, dataset, model, patch_size, step, min_img_size=256, batch_size=32):
+def predict_probs_mmseg(model, imgs):
+    # Import local: os engines alternativos (DINOv3) não dependem do mmseg
+    from mmseg.apis import inference_model
+
+    results_all = inference_model(model, [img[:, :, [2, 1, 0]] for img in imgs])
+    return [F.softmax(r.seg_logits.data, dim=0).cpu().numpy() for r in results_all]
+
+def prediction_in_plot(gpd_talhoes, index, dataset, model, patch_size, step, min_img_size=256, batch_size=32,
+                       predict_fn=predict_probs_mmseg, num_readers=1):
     mask, (min_x, min_y, max_x, max_y), (min_lat, max_lat, min_lon, max_lon) = get_img(gpd_talhoes, dataset.index, index=index, min_img_size=min_img_size)
     min_x, min_y, max_x, max_y = int(min_x), int(min_y), int(max_x), int(max_y)
     width, height = int(max_x-min_x), int(max_y-min_y)
@@ -29,7 +36,32 @@ def prediction_in_plot(gpd_talhoes, index, dataset, model, patch_size, step, min
     # Inicializar results_probs como None para detecção dinâmica de classes
     results_probs = None
 
-    for x in tqdm(range(min_x, max_x-1, step)):
+    def flush():
+        nonlocal results_probs
+        # predict_fn recebe os tiles em RGB e devolve probabilidades (C, H, W) por tile
+        probs_all = predict_fn(model, imgs)
+
+        for i in range(len(probs_all)):
+            x1, x2, y1, y2, discard_x1, discard_x2, discard_y1, discard_y2, x, y = positions[i]
+            patch_daninha = probs_all[i][:, int(patch_size*discard_x1):int(patch_size*discard_x2), int(patch_size*discard_y1):int(patch_size*discard_y2)]
+
+            # Inicializa results_probs dinamicamente baseado no número de classes
+            if results_probs is None:
+                num_classes = patch_daninha.shape[0]
+                try:
+                    results_probs = np.zeros((num_classes, width, height), dtype=np.float32)
+                    print(f"📊 Detectadas {num_classes} classes no modelo")
+                except (MemoryError, np.core._exceptions._ArrayMemoryError) as e:
+                    print(f"❌ Erro de memória ao alocar array para {num_classes} classes: {e}")
+                    raise MemoryError(f"Não foi possível alocar memória para {num_classes} classes")
+
+            results_probs[:, x1:x2, y1:y2] = results_probs[:, x1:x2, y1:y2] + patch_daninha
+        imgs.clear()
+        positions.clear()
+
+    # Posições dos tiles que tocam o talhão (a leitura acontece depois, possivelmente em paralelo)
+    candidates = []
+    for x in range(min_x, max_x-1, step):
         discard_x1, discard_x2 = 0.1, 0.9
         if x == min_x:
             discard_x1 = 0.
@@ -53,55 +85,21 @@ def prediction_in_plot(gpd_talhoes, index, dataset, model, patch_size, step, min
             if np.sum(mask_patch) == 0:
                 continue
 
-            img = get_image_patch(dataset, x, y, patch_size, patch_size)
-            if img is None:
-                continue
+            candidates.append([x1, x2, y1, y2, discard_x1, discard_x2, discard_y1, discard_y2, x, y])
 
-            img = img[:, :, [2, 1, 0]]
-            imgs.append(img)
-            positions.append([x1, x2, y1, y2, discard_x1, discard_x2, discard_y1, discard_y2, x, y])
-
-            if len(imgs) >= batch_size:
-                results_all = inference_model(model, imgs)
-
-                for i in range(len(results_all)):
-                    x1, x2, y1, y2, discard_x1, discard_x2, discard_y1, discard_y2, x, y = positions[i]
-                    patch_daninha = F.softmax(results_all[i].seg_logits.data, dim=0).cpu().numpy()
-                    patch_daninha = patch_daninha[:, int(patch_size*discard_x1):int(patch_size*discard_x2), int(patch_size*discard_y1):int(patch_size*discard_y2)]
-                    
-                    # Inicializa results_probs dinamicamente baseado no número de classes
-                    if results_probs is None:
-                        num_classes = patch_daninha.shape[0]
-                        try:
-                            results_probs = np.zeros((num_classes, width, height), dtype=np.float32)
-                            print(f"📊 Detectadas {num_classes} classes no modelo")
-                        except (MemoryError, np.core._exceptions._ArrayMemoryError) as e:
-                            print(f"❌ Erro de memória ao alocar array para {num_classes} classes: {e}")
-                            raise MemoryError(f"Não foi possível alocar memória para {num_classes} classes")
-                    
-                    results_probs[:, x1:x2, y1:y2] = results_probs[:, x1:x2, y1:y2] + patch_daninha
-                imgs = []
-                positions = []
+    patches = read_patches(dataset, [(p[8], p[9]) for p in candidates], patch_size, num_readers)
+    for position, img in tqdm(zip(candidates, patches), total=len(candidates)):
+        if img is None:
+            continue
 
-    if len(imgs) > 0:
-        results_all = inference_model(model, imgs)
+        imgs.append(img)
+        positions.append(position)
 
-        for i in range(len(results_all)):
-            x1, x2, y1, y2, discard_x1, discard_x2, discard_y1, discard_y2, x, y = positions[i]
-            patch_daninha = F.softmax(results_all[i].seg_logits.data, dim=0).cpu().numpy()
-            patch_daninha = patch_daninha[:, int(patch_size*discard_x1):int(patch_size*discard_x2), int(patch_size*discard_y1):int(patch_size*discard_y2)]
-            
-            # Inicializa results_probs dinamicamente se ainda não foi criado
-            if results_probs is None:
-                num_classes = patch_daninha.shape[0]
-                try:
-                    results_probs = np.zeros((num_classes, width, height), dtype=np.float32)
-                    print(f"📊 Detectadas {num_classes} classes no modelo")
-                except (MemoryError, np.core._exceptions._ArrayMemoryError) as e:
-                    print(f"❌ Erro de memória ao alocar array para {num_classes} classes: {e}")
-                    raise MemoryError(f"Não foi possível alocar memória para {num_classes} classes")
-                                    
-            results_probs[:, x1:x2, y1:y2] = results_probs[:, x1:x2, y1:y2] + patch_daninha
+        if len(imgs) >= batch_size:
+            flush()
+
+    if len(imgs) > 0:
+        flush()
 
     results = np.argmax(results_probs, axis=0).astype(np.uint8)   
     if mask is not None:
@@ -110,7 +108,7 @@ def prediction_in_plot(gpd_talhoes, index, dataset, model, patch_size, step, min
     results_shp = polygons_from_binary_image(results, dataset.transform, dataset.crs, min_x=min_x, min_y=min_y)
     return results, results_shp
     
-def prediction(shp_path, tif_path, model, patch_size, step):
+def prediction(shp_path, tif_path, model, patch_size, step, predict_fn=predict_probs_mmseg, batch_size=32, num_readers=1):
     gpd_talhoes = gpd.read_file(shp_path)
     dataset = rasterio.open(tif_path)
     gpd_talhoes = gpd_talhoes.to_crs(dataset.crs)
@@ -121,7 +119,9 @@ def prediction(shp_path, tif_path, model, patch_size, step):
     for i, index in enumerate(range(len(gpd_talhoes))):
         print(f'\tProcessando talhão: {i+1}/{len(gpd_talhoes)}')
         try:
-            _, results_shp = prediction_in_plot(gpd_talhoes, index, dataset, model, patch_size, step)
+            _, results_shp = prediction_in_plot(gpd_talhoes, index, dataset, model, patch_size, step,
+                                                batch_size=batch_size, predict_fn=predict_fn,
+                                                num_readers=num_readers)
             shp_all_talhoes.append(results_shp)
             talhoes_processados += 1
         except MemoryError as e:
@@ -0,0 +1,70 @@
+import os
+
+# Detector rápido de primeira passada: backbone DINOv3 (vitl16 SAT-493M) + cabeça linear
+# sobre os patch tokens, usando a mesma leitura por janelas do pipeline mmseg
+# ========================================================================
+from models.load import get_dinov3_patch_model
+from models.dinov3_patch import predict_probs_dinov3
+from utils.files import find_subfolders_in_folder, find_tif_shp_in_folder
+from prediction.prediction_orthophoto import prediction
+from utils.autotune import autotune
+
+dinov3_repo = '/home/lades/computer_vision/wesley/dino-soja/dinov3'
+# A cabeça foi ajustada (foreground_segmentation_soja.ipynb) sobre os patch tokens do vitl16 SAT-493M:
+# backbone, pesos e cabeça devem ser trocados juntos
+model_name = 'dinov3_vitl16'
+weights = '/home/lades/computer_vision/wesley/dino-soja/dinov3/weights/dinov3_vitl16_pretrain_sat493m-eadcf0ff.pth'
+head_file = '/home/lades/computer_vision/wesley/dino-soja/soja_foreground_classifier.pkl'
+device = 'cuda:0'
+
+patch_size = 256
+step = patch_size // 2
+
+path_folder = '/home/lades/computer_vision/wesley/mae-soja/data/input/ortofotos_soja/'
+
+model = get_dinov3_patch_model(dinov3_repo, model_name, weights, head_file, device)
+
+# Calibra batch_size e threads de leitura no dispositivo (resultado reaproveitado nas próximas execuções)
+tuning = autotune(predict_probs_dinov3, model, f'{model_name}+{os.path.basename(head_file)}', patch_size, device)
+
+orto_paths = find_subfolders_in_folder(path_folder, extensions=['.tif', '.shp'])
+
+print("---------------------------- Iniciando processamento (DINOv3) ---------------------------- ")
+print(f"Total de ortofotos as serem processados: {len(orto_paths)}\n")
+
+ortofotos_processadas = 0
+ortofotos_com_erro = 0
+
+for o, orto_path in enumerate(orto_paths):
+    print(f'Processando ortofoto: {(o+1)}/{len(orto_paths)}: {orto_path}')
+    filename_orto = os.path.basename(orto_path)[:-4]
+    tif_path, shp_path = find_tif_shp_in_folder(orto_path)
+
+    if tif_path is None or shp_path is None:
+        print(f'Arquivos .tif/.shp não encontrados em {orto_path}')
+        continue
+
+    try:
+        shp = prediction(shp_path, tif_path, model, patch_size, step, predict_fn=predict_probs_dinov3,
+                         batch_size=tuning['batch_size'], num_readers=tuning['num_readers'])
+
+        if len(shp) > 0:
+            output_file = os.path.join(orto_path, f'./prediction_dinov3_{filename_orto}.shp')
+            shp.to_file(output_file)
+            print(f"✅ Ortofoto processada com sucesso: {filename_orto}")
+            print(f"📊 Resultados salvos: {len(shp)} polígonos em {output_file}")
+            ortofotos_processadas += 1
+        else:
+            print(f"⚠️ Nenhum resultado gerado para: {filename_orto} (todos os talhões foram pulados)")
+
+    except Exception as e:
+        print(f"❌ Erro ao processar ortofoto {filename_orto}: {e}")
+        ortofotos_com_erro += 1
+        continue
+
+print("\n" + "=" * 70)
+print("RESUMO FINAL DO PROCESSAMENTO")
+print("=" * 70)
+print(f"📂 Total de ortofotos: {len(orto_paths)}")
+print(f"✅ Ortofotos processadas: {ortofotos_processadas}")
+print(f"❌ Ortofotos com erro: {ortofotos_com_erro}")
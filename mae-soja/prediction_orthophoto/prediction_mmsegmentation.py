@@ -10,7 +10,8 @@ if mmseg_local_path not in sys.path:
 
 from models.load import get_mmsegmentation_model
 from utils.files import find_subfolders_in_folder, find_tif_shp_in_folder
-from prediction.prediction_orthophoto import prediction
+from prediction.prediction_orthophoto import prediction, predict_probs_mmseg
+from utils.autotune import autotune
 
 import os
 
@@ -25,6 +26,9 @@ path_folder = '/home/lades/computer_vision/wesley/mae-soja/data/input/ortofotos_
 
 model = get_mmsegmentation_model(config_file, checkpoint_file, device)
 
+# Calibra batch_size e threads de leitura no dispositivo (resultado reaproveitado nas próximas execuções)
+tuning = autotune(predict_probs_mmseg, model, os.path.basename(checkpoint_file), patch_size, device)
+
 orto_paths = find_subfolders_in_folder(path_folder, extensions=['.tif', '.shp'])  
 
 print("---------------------------- Iniciando processamento ---------------------------- ")
@@ -48,7 +52,8 @@ for o, orto_path in enumerate(orto_paths):
         continue
 
     try:
-        shp = prediction(shp_path, tif_path, model, patch_size, step)
+        shp = prediction(shp_path, tif_path, model, patch_size, step,
+                         batch_size=tuning['batch_size'], num_readers=tuning['num_readers'])
         
         if len(shp) > 0:
             output_file = os.path.join(orto_path, f'./prediction_{filename_orto}.shp')
@@ -0,0 +1,140 @@
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from utils.tif import read_patches
+
+DEFAULT_CACHE = os.path.expanduser('~/.cache/mae-soja/autotune.json')
+
+
+def device_tag(device):
+    device = torch.device(device)
+    if device.type == 'cuda':
+        props = torch.cuda.get_device_properties(device)
+        return f'{props.name}:{props.total_memory // 2**20}MiB'
+    return f'cpu:{os.cpu_count()}'
+
+
+def synthetic_orthophoto(path, tile_size, n_tiles=8):
+    # GeoTIFF sintético (tiled + lzw, como as ortofotos) para medir a leitura real por janelas
+    import rasterio
+    from rasterio.transform import from_origin
+
+    size = tile_size * n_tiles
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 255, (3, size // 8, size // 8), dtype=np.uint8)
+    data = data.repeat(8, axis=1).repeat(8, axis=2)
+    with rasterio.open(path, 'w', driver='GTiff', height=size, width=size, count=3, dtype='uint8',
+                       crs='EPSG:32722', transform=from_origin(0, 0, 0.01, 0.01),
+                       tiled=True, blockxsize=256, blockysize=256, compress='lzw') as dst:
+        dst.write(data)
+    return [(x, y) for x in range(0, size, tile_size) for y in range(0, size, tile_size)]
+
+
+def is_oom(e):
+    return isinstance(e, torch.cuda.OutOfMemoryError) or 'out of memory' in str(e)
+
+
+def probe_batch_size(predict_fn, model, device, tile_size, batch_sizes, memory_cap, n_batches):
+    # Testa lotes crescentes; para no primeiro OOM ou ao passar do limite de memória
+    device = torch.device(device)
+    total_memory = torch.cuda.get_device_properties(device).total_memory if device.type == 'cuda' else None
+    rng = np.random.default_rng(0)
+    probes = []
+    for batch_size in sorted(batch_sizes):
+        imgs = list(rng.integers(0, 255, (batch_size, tile_size, tile_size, 3), dtype=np.uint8))
+        try:
+            if total_memory is not None:
+                torch.cuda.empty_cache()
+                torch.cuda.reset_peak_memory_stats(device)
+            predict_fn(model, imgs)  # warmup
+            if total_memory is not None:
+                torch.cuda.synchronize(device)
+            start = time.perf_counter()
+            for _ in range(n_batches):
+                predict_fn(model, imgs)
+            if total_memory is not None:
+                torch.cuda.synchronize(device)
+            elapsed = time.perf_counter() - start
+        except RuntimeError as e:
+            if not is_oom(e):
+                raise
+            print(f"   • batch_size={batch_size}: sem memória")
+            torch.cuda.empty_cache()
+            break
+
+        memory = torch.cuda.max_memory_allocated(device) / total_memory if total_memory is not None else 0.
+        tiles_per_second = batch_size * n_batches / elapsed
+        print(f"   • batch_size={batch_size}: {tiles_per_second:.1f} tiles/s, memória {memory * 100:.0f}%")
+        if memory > memory_cap:
+            break
+        probes.append((tiles_per_second, batch_size))
+
+    if not probes:
+        return min(batch_sizes), 0.
+    tiles_per_second, batch_size = max(probes)
+    return batch_size, tiles_per_second
+
+
+def probe_readers(predict_fn, model, tile_size, batch_size, reader_counts):
+    # Pipeline completo (leitura por janelas + inferência) sobre uma ortofoto sintética
+    import rasterio
+
+    probes = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sintetica.tif')
+        coords = synthetic_orthophoto(path, tile_size)
+        with rasterio.open(path) as dataset:
+            for num_readers in reader_counts:
+                start = time.perf_counter()
+                imgs = []
+                for img in read_patches(dataset, coords, tile_size, num_readers):
+                    imgs.append(img)
+                    if len(imgs) == batch_size:
+                        predict_fn(model, imgs)
+                        imgs = []
+                if imgs:
+                    predict_fn(model, imgs)
+                tiles_per_second = len(coords) / (time.perf_counter() - start)
+                print(f"   • num_readers={num_readers}: {tiles_per_second:.1f} tiles/s")
+                probes.append((tiles_per_second, -num_readers))
+
+    tiles_per_second, num_readers = max(probes)
+    return -num_readers, tiles_per_second
+
+
+def autotune(predict_fn, model, model_tag, tile_size, device, batch_sizes=(4, 8, 16, 32, 64),
+             reader_counts=(1, 2, 4, 8), memory_cap=0.85, n_batches=3, cache_path=DEFAULT_CACHE, force=False):
+    # Escolhe (batch_size, num_readers) com maior throughput abaixo de memory_cap
+    # (fração da VRAM) e guarda o resultado por (dispositivo, modelo, tamanho do tile)
+    key = f'{device_tag(device)}|{model_tag}|{tile_size}'
+    cache = {}
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            cache = json.load(f)
+    if key in cache and not force:
+        config = cache[key]
+        print(f"⚙️ Configuração calibrada (cache): batch_size={config['batch_size']}, num_readers={config['num_readers']}")
+        return config
+
+    print(f"⚙️ Calibrando batch_size e num_readers para {key}")
+    batch_size, _ = probe_batch_size(predict_fn, model, device, tile_size, batch_sizes, memory_cap, n_batches)
+    num_readers, tiles_per_second = probe_readers(predict_fn, model, tile_size, batch_size, reader_counts)
+
+    config = {
+        'batch_size': batch_size,
+        'num_readers': num_readers,
+        'tiles_per_second': tiles_per_second,
+        'memory_cap': memory_cap,
+        'calibrado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    cache[key] = config
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    with open(cache_path, 'w') as f:
+        json.dump(cache, f, indent=2)
+    print(f"⚙️ Escolhido: batch_size={batch_size}, num_readers={num_readers} ({tiles_per_second:.1f} tiles/s)")
+    return config
@@ -11,4 +11,114 @@ def get_image_patch(dataset, x, y, w, h):
         if nw == 0 or nh == 0:
             return None
         img[0:nw, 0:nh, i] = band
-    return img
\ No newline at end of file
+    return img
+
+def shared_grid(dataset_ref, dataset_other):
+    # Grade comum (CRS, transform e tamanho da ortofoto de referência) restrita
+    # à interseção das duas ortofotos
+    from rasterio.warp import transform_bounds
+    from rasterio.windows import from_bounds
+
+    left, bottom, right, top = dataset_ref.bounds
+    o_left, o_bottom, o_right, o_top = transform_bounds(dataset_other.crs, dataset_ref.crs, *dataset_other.bounds)
+    left, bottom = max(left, o_left), max(bottom, o_bottom)
+    right, top = min(right, o_right), min(top, o_top)
+    if right <= left or top <= bottom:
+        raise ValueError('As ortofotos não se sobrepõem')
+
+    window = from_bounds(left, bottom, right, top, transform=dataset_ref.transform)
+    window = window.round_offsets().round_lengths()
+    return {
+        'crs': dataset_ref.crs,
+        'transform': dataset_ref.window_transform(window),
+        'width': int(window.width),
+        'height': int(window.height),
+    }
+
+
+def aligned_dataset(dataset, grid):
+    # Visão da ortofoto reamostrada pixel a pixel na grade comum
+    from rasterio.enums import Resampling
+    from rasterio.vrt import WarpedVRT
+
+    return WarpedVRT(dataset, crs=grid['crs'], transform=grid['transform'],
+                     width=grid['width'], height=grid['height'], resampling=Resampling.nearest)
+
+
+class AlignedReader:
+    # Ortofoto + VRT alinhado na grade comum, num handle próprio para as threads
+    # de read_patches; close() fecha os dois
+    def __init__(self, path, grid):
+        import rasterio
+
+        self.src = rasterio.open(path)
+        self.vrt = aligned_dataset(self.src, grid)
+
+    def read(self, *args, **kwargs):
+        return self.vrt.read(*args, **kwargs)
+
+    def close(self):
+        self.vrt.close()
+        self.src.close()
+
+
+def grid_positions(size, patch_size, step):
+    # Posições dos tiles ao longo de um eixo e a faixa [inicio, fim) que cada
+    # tile escreve no resultado final (o centro do tile, descartando as bordas)
+    positions = list(range(0, max(size - patch_size, 0) + 1, step))
+    if positions[-1] + patch_size < size:
+        positions.append(size - patch_size)
+
+    margin = (patch_size - step) // 2
+    owned = []
+    start = 0
+    for i, pos in enumerate(positions):
+        end = size if i == len(positions) - 1 else min(pos + margin + step, size)
+        owned.append((pos, start, end))
+        start = end
+    return owned
+
+
+def read_patches(dataset, coords, patch_size, num_readers=1, open_fn=None):
+    # Lê os tiles (x, y) em ordem. Com num_readers > 1 cada thread abre seu
+    # próprio handle (datasets do rasterio não são thread-safe) e mantém até
+    # 2 * num_readers leituras adiantadas enquanto o modelo processa o lote atual
+    if num_readers <= 1:
+        for x, y in coords:
+            yield get_image_patch(dataset, x, y, patch_size, patch_size)
+        return
+
+    import threading
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor
+
+    import rasterio
+
+    if open_fn is None:
+        open_fn = lambda: rasterio.open(dataset.name)
+    local = threading.local()
+    handles = []
+
+    def read(x, y):
+        if not hasattr(local, 'dataset'):
+            local.dataset = open_fn()
+            handles.append(local.dataset)
+        return get_image_patch(local.dataset, x, y, patch_size, patch_size)
+
+    try:
+        with ThreadPoolExecutor(max_workers=num_readers) as pool:
+            pending = deque()
+            coords = iter(coords)
+            for x, y in coords:
+                pending.append(pool.submit(read, x, y))
+                if len(pending) >= 2 * num_readers:
+                    break
+            while pending:
+                img = pending.popleft().result()
+                for x, y in coords:
+                    pending.append(pool.submit(read, x, y))
+                    break
+                yield img
+    finally:
+        for handle in handles:
+            handle.close()
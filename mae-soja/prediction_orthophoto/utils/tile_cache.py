@@ -0,0 +1,53 @@
+import hashlib
+import os
+import sqlite3
+import zlib
+
+import numpy as np
+
+
+class TileCache:
+    # Cache de predições por tile em um único arquivo sqlite.
+    # A chave é o hash dos pixels do tile + identificação do modelo, então
+    # qualquer tile com entrada idêntica (mesmo voo reprocessado, regiões sem
+    # dados, sobrevoos repetidos) reaproveita a predição já calculada.
+
+    def __init__(self, path, model_tag):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.model_tag = model_tag.encode()
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS tiles (key TEXT PRIMARY KEY, shape TEXT, data BLOB)'
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, img):
+        h = hashlib.blake2b(self.model_tag, digest_size=20)
+        h.update(str(img.shape).encode())
+        h.update(np.ascontiguousarray(img).data)
+        return h.hexdigest()
+
+    def get(self, key):
+        row = self.conn.execute('SELECT shape, data FROM tiles WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        shape = tuple(int(s) for s in row[0].split(','))
+        return np.frombuffer(zlib.decompress(row[1]), dtype=np.uint8).reshape(shape)
+
+    def put(self, key, pred):
+        pred = np.ascontiguousarray(pred, dtype=np.uint8)
+        self.conn.execute(
+            'INSERT OR REPLACE INTO tiles (key, shape, data) VALUES (?, ?, ?)',
+            (key, ','.join(str(s) for s in pred.shape), zlib.compress(pred.tobytes(), 1)),
+        )
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
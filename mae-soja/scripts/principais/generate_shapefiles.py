@@ -23,6 +23,10 @@ import argparse
 from shapely.geometry import mapping
 import traceback
 
+# Saída consolidada por área (mosaico + tabela de estatísticas)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+from area_mosaic import AreaMosaicWriter
+
 def load_model():
     """Carrega o modelo de segmentação."""
     try:
@@ -52,8 +56,13 @@ def load_model():
         print(f"✗ Erro ao carregar o modelo: {e}")
         return None
 
-def process_single_plot(model, ortofoto_path, plot_geometry, plot_info, output_dir):
-    """Processa um único talhão usando sliding window."""
+def process_single_plot(model, ortofoto_path, plot_geometry, plot_info, output_dir, mosaic=None, plot_id=None):
+    """
+    Processa um único talhão usando sliding window.
+
+    Sem mosaic grava GeoTIFF, JSON e PNG de debug do talhão; com um
+    AreaMosaicWriter a máscara e as estatísticas vão para a saída da área.
+    """
     talhao_id = plot_info.get('FID', f"plot_{plot_info.get('index', 'unknown')}")
     print(f"  Processando talhão: {talhao_id}")
     
@@ -91,7 +100,8 @@ def process_single_plot(model, ortofoto_path, plot_geometry, plot_info, output_d
     overlap = 64  # Overlap para evitar artefatos nas bordas
     
     # Aplica sliding window para segmentação
-    pred_mask = apply_sliding_window_segmentation(model, plot_image, tile_size, overlap, output_dir, talhao_id)
+    debug_dir = output_dir if mosaic is None else None
+    pred_mask = apply_sliding_window_segmentation(model, plot_image, tile_size, overlap, debug_dir, talhao_id)
     
     if pred_mask is None:
         print(f"    ✗ Falha na segmentação do talhão")
@@ -151,25 +161,37 @@ def process_single_plot(model, ortofoto_path, plot_geometry, plot_info, output_d
         'has_weeds': len(weed_stats) > 0
     }
     
-    # Salva GeoTIFF da máscara
-    geotiff_path = os.path.join(output_dir, f'talhao_{talhao_id}_segmentation.tif')
-    with rasterio.open(
-        geotiff_path, 'w',
-        driver='GTiff',
-        height=pred_mask.shape[0],
-        width=pred_mask.shape[1],
-        count=1,
-        dtype=pred_mask.dtype,
-        crs=masked_crs,
-        transform=masked_transform,
-        compress='lzw'
-    ) as dst:
-        dst.write(pred_mask, 1)
-    
-    # Salva estatísticas JSON
-    stats_path = os.path.join(output_dir, f'talhao_{talhao_id}_stats.json')
-    with open(stats_path, 'w') as f:
-        json.dump(stats, f, indent=2)
+    if mosaic is not None:
+        # Mosaico da área: máscara + linha na tabela de estatísticas
+        window = mosaic.add_plot(plot_id, pred_mask, masked_transform, geom[0])
+        row = {'plot_id': plot_id, **window}
+        row.update({k: v for k, v in stats.items() if k != 'weed_classes'})
+        for class_id, class_name in weed_classes.items():
+            class_stats = stats['weed_classes'].get(class_name, {})
+            row[f'pixels_{class_id}'] = class_stats.get('pixels', 0)
+            row[f'percentage_{class_id}'] = class_stats.get('percentage', 0.0)
+        mosaic.add_stats(row)
+        geotiff_path = mosaic.output_path
+    else:
+        # Salva GeoTIFF da máscara
+        geotiff_path = os.path.join(output_dir, f'talhao_{talhao_id}_segmentation.tif')
+        with rasterio.open(
+            geotiff_path, 'w',
+            driver='GTiff',
+            height=pred_mask.shape[0],
+            width=pred_mask.shape[1],
+            count=1,
+            dtype=pred_mask.dtype,
+            crs=masked_crs,
+            transform=masked_transform,
+            compress='lzw'
+        ) as dst:
+            dst.write(pred_mask, 1)
+
+        # Salva estatísticas JSON
+        stats_path = os.path.join(output_dir, f'talhao_{talhao_id}_stats.json')
+        with open(stats_path, 'w') as f:
+            json.dump(stats, f, indent=2)
     
     # Adiciona estatísticas à geometria para o shapefile (apenas se houver daninhas)
     plot_info_enhanced = plot_info.copy()
@@ -319,8 +341,13 @@ def process_single_plot(model, ortofoto_path, plot_geometry, plot_info, output_d
     
     return plot_info_enhanced, stats
 
-def process_area(area_path, output_base_dir):
-    """Processa uma área completa (ortofoto + shapefile)."""
+def process_area(area_path, output_base_dir, output_mode='talhoes'):
+    """
+    Processa uma área completa (ortofoto + shapefile).
+
+    output_mode='talhoes' grava arquivos por talhão; output_mode='mosaico' grava
+    um único GeoTIFF da área (bandas classe e talhao_id) e uma tabela Parquet.
+    """
     area_name = os.path.basename(area_path)
     print(f"\n{'='*60}")
     print(f"PROCESSANDO ÁREA: {area_name}")
@@ -360,23 +387,37 @@ def process_area(area_path, output_base_dir):
         print(f"✗ Erro ao ler shapefile: {e}")
         return None
     
+    mosaic = None
+    if output_mode == 'mosaico':
+        with rasterio.open(ortofoto_path) as src:
+            gdf = gdf.to_crs(src.crs)
+            mosaic = AreaMosaicWriter(
+                os.path.join(output_dir, f'{safe_area_name}_mosaico.tif'),
+                os.path.join(output_dir, f'{safe_area_name}_estatisticas.parquet'),
+                src.crs, src.transform, src.width, src.height
+            )
+    
     # Processa cada talhão
     all_stats = []
     enhanced_plots = []
     
     start_time = time.time()
     
-    for idx, row in tqdm(gdf.iterrows(), total=len(gdf), desc="Processando talhões"):
+    for position, (idx, row) in enumerate(tqdm(gdf.iterrows(), total=len(gdf), desc="Processando talhões")):
         plot_info = row.to_dict()
         plot_info['index'] = idx  # Adiciona índice
         plot_geometry = row.geometry
         
-        result = process_single_plot(model, ortofoto_path, plot_geometry, plot_info, output_dir)
+        result = process_single_plot(model, ortofoto_path, plot_geometry, plot_info, output_dir,
+                                     mosaic=mosaic, plot_id=position + 1)
         if result:
             enhanced_info, stats = result
             enhanced_plots.append(enhanced_info)
             all_stats.append(stats)
     
+    if mosaic is not None:
+        mosaic.close()
+    
     # Cria shapefile com resultados (FORA do loop)
     if enhanced_plots:
         try:
@@ -424,6 +465,7 @@ def process_area(area_path, output_base_dir):
         'processed_plots': len(all_stats),
         'processing_time_seconds': time.time() - start_time,
         'output_directory': output_dir,
+        'output_mode': output_mode,
         'class_summary': {},
         'plots': all_stats
     }
@@ -590,6 +632,8 @@ def main():
     parser = argparse.ArgumentParser(description='Processa ortofotos com segmentação por talhões')
     parser.add_argument('--area', type=str, help='Nome da área específica para processar')
     parser.add_argument('--all', action='store_true', help='Processa todas as áreas')
+    parser.add_argument('--output-mode', choices=['talhoes', 'mosaico'], default='talhoes',
+                       help='talhoes: arquivos por talhão; mosaico: um GeoTIFF + tabela Parquet por área')
     parser.add_argument('--output', type=str, default='/home/lades/computer_vision/wesley/mae-soja/data/output/resultados_segmentacao_talhoes',
                        help='Diretório base de saída')
     
@@ -613,7 +657,7 @@ def main():
         # Processa área específica
         if args.area in areas:
             area_path = os.path.join(base_path, args.area)
-            process_area(area_path, args.output)
+            process_area(area_path, args.output, args.output_mode)
         else:
             print(f"❌ Área '{args.area}' não encontrada. Áreas disponíveis:")
             for area in areas:
@@ -629,7 +673,7 @@ def main():
         
         for area in areas:
             area_path = os.path.join(base_path, area)
-            summary = process_area(area_path, args.output)
+            summary = process_area(area_path, args.output, args.output_mode)
             if summary:
                 all_summaries.append(summary)
         
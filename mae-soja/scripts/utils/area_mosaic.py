@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Saída consolidada por área: um único GeoTIFF com duas bandas (classe e ID do
+talhão) e uma tabela colunar (Parquet) com as estatísticas de todos os talhões.
+
+A tabela guarda a janela (row_off, col_off, height, width) de cada talhão no
+mosaico e funciona como índice: read_plot() lê apenas essa janela, sem varrer
+diretórios com centenas de GeoTIFFs pequenos.
+"""
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio.features import geometry_mask
+from rasterio.windows import Window
+
+BAND_CLASSE = 1
+BAND_TALHAO = 2
+
+
+class AreaMosaicWriter:
+    """
+    Acumula as segmentações dos talhões na grade da ortofoto e grava o mosaico
+    no fechamento.
+
+    As bandas ficam em arrays memmap temporários no disco durante o
+    processamento, então a memória usada não depende do tamanho da área; o
+    GeoTIFF final é escrito uma única vez, em faixas, já tiled e comprimido.
+    """
+
+    def __init__(self, output_path, stats_path, crs, transform, width, height):
+        self.output_path = str(output_path)
+        self.stats_path = str(stats_path)
+        self.crs = crs
+        self.transform = transform
+        self.width = width
+        self.height = height
+        self.rows = []
+
+        self.scratch_dir = tempfile.mkdtemp(prefix='mosaico_', dir=os.path.dirname(os.path.abspath(self.output_path)))
+        self.classes = np.lib.format.open_memmap(os.path.join(self.scratch_dir, 'classes.npy'), mode='w+',
+                                                 dtype=np.uint8, shape=(height, width))
+        self.plot_ids = np.lib.format.open_memmap(os.path.join(self.scratch_dir, 'talhoes.npy'), mode='w+',
+                                                  dtype=np.uint16, shape=(height, width))
+
+    def add_plot(self, plot_id, pred_mask, plot_transform, geometry):
+        """
+        Copia a máscara de um talhão para o mosaico (somente pixels dentro da geometria).
+
+        Args:
+            plot_id: ID do talhão no mosaico (1..65535, 0 = fora dos talhões)
+            pred_mask: Máscara de segmentação do recorte do talhão
+            plot_transform: Transform do recorte (rasterio.mask com crop=True)
+            geometry: Geometria do talhão (GeoJSON-like)
+
+        Returns:
+            dict: Janela do talhão no mosaico (row_off, col_off, height, width)
+        """
+        col_off, row_off = ~self.transform * (plot_transform.c, plot_transform.f)
+        col_off, row_off = int(round(col_off)), int(round(row_off))
+        h, w = pred_mask.shape
+
+        inside = geometry_mask([geometry], out_shape=(h, w), transform=plot_transform, invert=True)
+
+        # Recorta o que eventualmente cair fora da ortofoto
+        r0, c0 = max(row_off, 0), max(col_off, 0)
+        r1, c1 = min(row_off + h, self.height), min(col_off + w, self.width)
+        if r1 <= r0 or c1 <= c0:
+            return {'row_off': r0, 'col_off': c0, 'height': 0, 'width': 0}
+        local = (slice(r0 - row_off, r1 - row_off), slice(c0 - col_off, c1 - col_off))
+        inside = inside[local]
+
+        classes = self.classes[r0:r1, c0:c1]
+        classes[inside] = pred_mask[local][inside]
+        plot_ids = self.plot_ids[r0:r1, c0:c1]
+        plot_ids[inside] = plot_id
+
+        return {'row_off': r0, 'col_off': c0, 'height': r1 - r0, 'width': c1 - c0}
+
+    def add_stats(self, row):
+        """Adiciona uma linha (dicionário plano) à tabela de estatísticas."""
+        self.rows.append(row)
+
+    def close(self, strip_height=1024):
+        try:
+            with rasterio.open(
+                self.output_path, 'w',
+                driver='GTiff',
+                height=self.height,
+                width=self.width,
+                count=2,
+                dtype='uint16',
+                crs=self.crs,
+                transform=self.transform,
+                tiled=True,
+                blockxsize=512,
+                blockysize=512,
+                compress='deflate',
+                BIGTIFF='IF_SAFER'
+            ) as dst:
+                dst.set_band_description(BAND_CLASSE, 'classe')
+                dst.set_band_description(BAND_TALHAO, 'talhao_id')
+                for r in range(0, self.height, strip_height):
+                    n = min(strip_height, self.height - r)
+                    window = Window(0, r, self.width, n)
+                    dst.write(self.classes[r:r + n].astype(np.uint16), BAND_CLASSE, window=window)
+                    dst.write(self.plot_ids[r:r + n], BAND_TALHAO, window=window)
+        finally:
+            del self.classes, self.plot_ids
+            shutil.rmtree(self.scratch_dir, ignore_errors=True)
+
+        pd.DataFrame(self.rows).to_parquet(self.stats_path, index=False)
+        print(f"🗺️  Mosaico da área: {self.output_path}")
+        print(f"📋 Tabela de estatísticas: {self.stats_path} ({len(self.rows)} talhões)")
+
+
+def read_plot(mosaic_path, stats_path, plot_id):
+    """
+    Lê a segmentação de um talhão a partir do mosaico usando a janela indexada.
+
+    Args:
+        mosaic_path: GeoTIFF gerado por AreaMosaicWriter
+        stats_path: Tabela Parquet do mesmo mosaico
+        plot_id: ID do talhão no mosaico
+
+    Returns:
+        tuple: (máscara de classes com 255 fora do talhão, transform da janela)
+    """
+    index = pd.read_parquet(stats_path, columns=['plot_id', 'row_off', 'col_off', 'height', 'width'])
+    row = index.loc[index['plot_id'] == plot_id].iloc[0]
+    window = Window(int(row['col_off']), int(row['row_off']), int(row['width']), int(row['height']))
+
+    with rasterio.open(mosaic_path) as src:
+        classes, plot_ids = src.read([BAND_CLASSE, BAND_TALHAO], window=window)
+        transform = src.window_transform(window)
+
+    classes = classes.astype(np.uint8)
+    classes[plot_ids != plot_id] = 255
+    return classes, transform
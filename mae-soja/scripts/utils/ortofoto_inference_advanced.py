@@ -48,6 +48,8 @@ from pathlib import Path
 import warnings
 warnings.filterwarnings('ignore')
 
+from area_mosaic import AreaMosaicWriter
+
 # Configurações do modelo (podem ser alteradas se necessário)
 DEFAULT_CHECKPOINT = '/home/lades/computer_vision/wesley/mae-soja/output_mae_soja-prof-wesley-17062025_200-epochs_mmsegmentation_5classes-40000iterations/iter_40000.pth'
 DEFAULT_CONFIG = '/home/lades/computer_vision/wesley/mae-soja/mmsegmentation/configs/mae/mae-base_upernet_8xb2-amp-20k_daninhas-256x256.py'
@@ -243,7 +245,8 @@ def calculate_area_statistics(segmentation_mask, pixel_area_m2, class_names=None
 
 def process_with_plots(ortofoto_path, shapefile_path, output_dir=None, 
                       checkpoint_path=DEFAULT_CHECKPOINT, config_path=DEFAULT_CONFIG,
-                      tile_size=256, overlap=32, device='cuda' if torch.cuda.is_available() else 'cpu'):
+                      tile_size=256, overlap=32, device='cuda' if torch.cuda.is_available() else 'cpu',
+                      output_mode='talhoes'):
     """
     Processa ortofoto usando informações dos talhões.
     
@@ -256,6 +259,8 @@ def process_with_plots(ortofoto_path, shapefile_path, output_dir=None,
         tile_size (int): Tamanho dos tiles
         overlap (int): Overlap entre tiles
         device (str): Dispositivo para inferência
+        output_mode (str): 'talhoes' (um GeoTIFF por talhão + talhoes_ids.tif) ou
+            'mosaico' (segmentacao_talhoes.tif com bandas classe/talhao_id + estatisticas_talhoes.parquet)
         
     Returns:
         dict: Resultados do processamento
@@ -302,8 +307,13 @@ def process_with_plots(ortofoto_path, shapefile_path, output_dir=None,
             image_data = ((image_data - image_data.min()) / (image_data.max() - image_data.min()) * 255).astype(np.uint8)
         
         # Inicializar máscaras de resultado
-        full_segmentation = np.zeros((src.height, src.width), dtype=np.uint8)
-        plots_mask = np.zeros((src.height, src.width), dtype=np.uint8)
+        mosaic = None
+        if output_mode == 'mosaico':
+            mosaic = AreaMosaicWriter(output_dir / "segmentacao_talhoes.tif",
+                                      output_dir / "estatisticas_talhoes.parquet",
+                                      src.crs, src.transform, src.width, src.height)
+        else:
+            plots_mask = np.zeros((src.height, src.width), dtype=np.uint8)
         
         # Processar cada talhão
         results = {
@@ -375,28 +385,39 @@ def process_with_plots(ortofoto_path, shapefile_path, output_dir=None,
                     stats = calculate_area_statistics(talhao_segmentation, pixel_area_m2)
                     talhao_info['estatisticas'] = stats
                     
-                    # Salvar máscara do talhão individual
-                    talhao_output_path = output_dir / f"talhao_{idx:03d}_segmentacao.tif"
-                    with rasterio.open(
-                        talhao_output_path,
-                        'w',
-                        driver='GTiff',
-                        height=talhao_segmentation.shape[0],
-                        width=talhao_segmentation.shape[1],
-                        count=1,
-                        dtype=talhao_segmentation.dtype,
-                        crs=src.crs,
-                        transform=masked_transform,
-                        compress='lzw'
-                    ) as dst:
-                        dst.write(talhao_segmentation, 1)
-                    
-                    # Atualizar máscara global (rasterizar de volta)
-                    full_geom_mask = geometry_mask(geom, 
-                                                  out_shape=(src.height, src.width),
-                                                  transform=src.transform,
-                                                  invert=True)
-                    plots_mask[full_geom_mask] = idx + 1  # ID do talhão
+                    if mosaic is not None:
+                        # Mosaico da área + linha na tabela de estatísticas
+                        window = mosaic.add_plot(idx + 1, talhao_segmentation, masked_transform, geom[0])
+                        row_stats = {'plot_id': idx + 1, 'talhao': f'talhao_{idx:03d}', **window}
+                        for class_id, class_name in CLASS_NAMES.items():
+                            class_stats = stats.get(class_name, {})
+                            row_stats[f'pixels_{class_id}'] = class_stats.get('pixels', 0)
+                            row_stats[f'area_ha_{class_id}'] = class_stats.get('area_ha', 0.0)
+                            row_stats[f'percentage_{class_id}'] = class_stats.get('percentage', 0.0)
+                        mosaic.add_stats(row_stats)
+                    else:
+                        # Salvar máscara do talhão individual
+                        talhao_output_path = output_dir / f"talhao_{idx:03d}_segmentacao.tif"
+                        with rasterio.open(
+                            talhao_output_path,
+                            'w',
+                            driver='GTiff',
+                            height=talhao_segmentation.shape[0],
+                            width=talhao_segmentation.shape[1],
+                            count=1,
+                            dtype=talhao_segmentation.dtype,
+                            crs=src.crs,
+                            transform=masked_transform,
+                            compress='lzw'
+                        ) as dst:
+                            dst.write(talhao_segmentation, 1)
+                        
+                        # Atualizar máscara global (rasterizar de volta)
+                        full_geom_mask = geometry_mask(geom, 
+                                                      out_shape=(src.height, src.width),
+                                                      transform=src.transform,
+                                                      invert=True)
+                        plots_mask[full_geom_mask] = idx + 1  # ID do talhão
                     
                     print(f"   ✅ Talhão {idx}: {talhao_segmentation.shape[0]}x{talhao_segmentation.shape[1]} pixels processados")
                     
@@ -410,21 +431,24 @@ def process_with_plots(ortofoto_path, shapefile_path, output_dir=None,
                 print(f"   ❌ Erro geral no talhão {idx}: {e}")
                 continue
         
-        # Salvar máscara de IDs dos talhões
-        plots_id_path = output_dir / "talhoes_ids.tif"
-        with rasterio.open(
-            plots_id_path,
-            'w',
-            driver='GTiff',
-            height=src.height,
-            width=src.width,
-            count=1,
-            dtype=plots_mask.dtype,
-            crs=src.crs,
-            transform=src.transform,
-            compress='lzw'
-        ) as dst:
-            dst.write(plots_mask, 1)
+        if mosaic is not None:
+            mosaic.close()
+        else:
+            # Salvar máscara de IDs dos talhões
+            plots_id_path = output_dir / "talhoes_ids.tif"
+            with rasterio.open(
+                plots_id_path,
+                'w',
+                driver='GTiff',
+                height=src.height,
+                width=src.width,
+                count=1,
+                dtype=plots_mask.dtype,
+                crs=src.crs,
+                transform=src.transform,
+                compress='lzw'
+            ) as dst:
+                dst.write(plots_mask, 1)
         
         # Salvar resultados em JSON
         results_json_path = output_dir / "resultados_talhoes.json"
@@ -436,8 +460,12 @@ def process_with_plots(ortofoto_path, shapefile_path, output_dir=None,
         
         print(f"\n✅ Processamento por talhões concluído!")
         print(f"📁 Resultados salvos em: {output_dir}")
-        print(f"   • Máscaras individuais: talhao_XXX_segmentacao.tif")
-        print(f"   • IDs dos talhões: talhoes_ids.tif")
+        if mosaic is not None:
+            print(f"   • Mosaico (classe + ID do talhão): segmentacao_talhoes.tif")
+            print(f"   • Tabela por talhão: estatisticas_talhoes.parquet")
+        else:
+            print(f"   • Máscaras individuais: talhao_XXX_segmentacao.tif")
+            print(f"   • IDs dos talhões: talhoes_ids.tif")
         print(f"   • Estatísticas: resultados_talhoes.json")
         print(f"   • Shapefile: talhoes_resultados.shp")
         
@@ -629,6 +657,8 @@ def main():
                        help='Overlap entre tiles (padrão: 32)')
     parser.add_argument('--device', type=str, default='auto',
                        help='Dispositivo (auto, cuda, cpu)')
+    parser.add_argument('--output-mode', choices=['talhoes', 'mosaico'], default='talhoes',
+                       help='Saída por talhão ou mosaico único da área (padrão: talhoes)')
     
     args = parser.parse_args()
     
@@ -671,7 +701,8 @@ def main():
         if mode == 'plots':
             results = process_with_plots(
                 ortofoto_path, shapefile_path, args.output_dir,
-                args.checkpoint, args.config, args.tile_size, args.overlap, device
+                args.checkpoint, args.config, args.tile_size, args.overlap, device,
+                args.output_mode
             )
         else:
             results = process_global(